@@ -0,0 +1,42 @@
+"""Otolith embeddings shared by the similarity index
+
+Revision ID: 5b8d0f3e6a21
+Revises: d41e7b2c9a05
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8d0f3e6a21'
+down_revision: Union[str, Sequence[str], None] = 'd41e7b2c9a05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if sa.inspect(op.get_bind()).has_table('otolith_embeddings'):
+        return
+    op.create_table('otolith_embeddings',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('object_name', sa.String(), nullable=False),
+    sa.Column('species', sa.String(), nullable=False),
+    sa.Column('version', sa.String(length=64), nullable=False),
+    sa.Column('vector', sa.LargeBinary(), nullable=False),
+    sa.Column('generation', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('object_name')
+    )
+    op.create_index('idx_otolith_embeddings_generation', 'otolith_embeddings', ['generation'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_otolith_embeddings_generation', table_name='otolith_embeddings')
+    op.drop_table('otolith_embeddings')
@@ -0,0 +1,283 @@
+"""Sightings indexes, eDNA tables and analysis tables
+
+Revision ID: 9c2f4e7a1b3d
+Revises: 64bcc71b9495
+Create Date: 2026-10-17 10:00:00.000000
+
+Indexes for the sightings hot paths:
+  - GiST on location (bbox filters: /api/sightings, map, tiles, chat context)
+  - btree (sighting_date, id) for ORDER BY sighting_date DESC and keyset paging
+  - BRIN on sighting_date for date-range scans over append-ordered data
+  - btree (species_id, sighting_date) for per-species filters and the FK
+
+It also brings the tables that so far only existed through create_all under
+Alembic: edna_sequences (with the packed/hash columns), edna_kmers,
+species_env_stats, data_generations, correlation_findings and the
+species_correlations materialized view, and backfills species_env_stats
+from the existing sightings once. Every step is guarded, so databases that
+already got some of these from create_all upgrade cleanly. The tables,
+view and sightings indexes this revision actually creates are recorded in
+its own bookkeeping table, migration_created_objects, and downgrade only
+drops those: objects that predate it, and the eDNA and statistics data in
+them, are left in place.
+
+Sightings indexes are built CONCURRENTLY so a large table stays writable.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2f4e7a1b3d'
+down_revision: Union[str, Sequence[str], None] = '64bcc71b9495'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Frozen copy of app.core.env_stats.CORRELATION_VIEW_SQL at this revision.
+CORRELATION_VIEW_SQL = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS species_correlations AS
+WITH long AS (
+  SELECT species_id, n, 'sea_surface_temp_c' AS variable, n_sst AS k, sum_sst AS sx, sumsq_sst AS sxx FROM species_env_stats
+  UNION ALL
+  SELECT species_id, n, 'salinity_psu', n_sal, sum_sal, sumsq_sal FROM species_env_stats
+  UNION ALL
+  SELECT species_id, n, 'chlorophyll_mg_m3', n_chl, sum_chl, sumsq_chl FROM species_env_stats
+),
+totals AS (
+  SELECT variable, SUM(k)::float8 AS big_n, SUM(sx) AS big_s, SUM(sxx) AS big_ss
+  FROM long GROUP BY variable HAVING SUM(k) > 0
+),
+scored AS (
+  SELECT l.species_id, l.variable, l.n, l.k AS n_obs, t.big_n::bigint AS n_total,
+         (l.sx / t.big_n - (t.big_s / t.big_n) * (l.k / t.big_n))
+         / NULLIF(sqrt(GREATEST(t.big_ss / t.big_n - (t.big_s / t.big_n) ^ 2, 0))
+                  * sqrt((l.k / t.big_n) * (1 - l.k / t.big_n)), 0) AS correlation
+  FROM long l JOIN totals t USING (variable)
+)
+SELECT species_id, variable, n, n_obs, n_total, correlation,
+       correlation * sqrt((n_total - 2) / NULLIF(1 - correlation ^ 2, 0)) AS t_stat,
+       RANK() OVER (ORDER BY abs(correlation) DESC) AS rank
+FROM scored
+WHERE correlation IS NOT NULL
+"""
+
+# Frozen copy of app.core.env_stats.rebuild()'s statement at this revision.
+ENV_STATS_BACKFILL_SQL = """
+INSERT INTO species_env_stats (species_id, n, n_sst, sum_sst, sumsq_sst, n_sal, sum_sal, sumsq_sal,
+                               n_chl, sum_chl, sumsq_chl)
+SELECT species_id, COUNT(*),
+       COUNT(sea_surface_temp_c), COALESCE(SUM(sea_surface_temp_c), 0),
+       COALESCE(SUM(sea_surface_temp_c::float8 * sea_surface_temp_c::float8), 0),
+       COUNT(salinity_psu), COALESCE(SUM(salinity_psu), 0),
+       COALESCE(SUM(salinity_psu::float8 * salinity_psu::float8), 0),
+       COUNT(chlorophyll_mg_m3), COALESCE(SUM(chlorophyll_mg_m3), 0),
+       COALESCE(SUM(chlorophyll_mg_m3::float8 * chlorophyll_mg_m3::float8), 0)
+FROM sightings
+WHERE species_id IS NOT NULL
+GROUP BY species_id
+"""
+
+SIGHTINGS_INDEXES = [
+    # (name, columns, postgresql_using)
+    ('idx_sightings_location', ['location'], 'gist'),
+    ('idx_sightings_date_id', ['sighting_date', 'id'], 'btree'),
+    ('idx_sightings_date_brin', ['sighting_date'], 'brin'),
+    ('idx_sightings_species_date', ['species_id', 'sighting_date'], 'btree'),
+]
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def _has_table(name: str) -> bool:
+    return _inspector().has_table(name)
+
+
+def _columns(table: str) -> set:
+    return {c['name'] for c in _inspector().get_columns(table)}
+
+
+# Tables upgrade() creates only when missing, in creation order.
+GUARDED_TABLES = ['edna_sequences', 'edna_kmers', 'species_env_stats', 'data_generations', 'correlation_findings']
+# What this revision created, so downgrade() never drops an object that predates it.
+BOOKKEEPING_TABLE = 'migration_created_objects'
+
+
+def _record_created(kind: str, names):
+    for name in names:
+        op.get_bind().execute(
+            sa.text(f"INSERT INTO {BOOKKEEPING_TABLE} (revision, kind, name) VALUES (:revision, :kind, :name) "
+                    "ON CONFLICT DO NOTHING"),
+            {'revision': revision, 'kind': kind, 'name': name},
+        )
+
+
+def _created(kind: str) -> set:
+    if not _has_table(BOOKKEEPING_TABLE):
+        return set()
+    rows = op.get_bind().execute(
+        sa.text(f"SELECT name FROM {BOOKKEEPING_TABLE} WHERE revision = :revision AND kind = :kind"),
+        {'revision': revision, 'kind': kind},
+    )
+    return {row[0] for row in rows}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    created = [name for name in GUARDED_TABLES if not _has_table(name)]
+    view_created = 'species_correlations' not in _inspector().get_materialized_view_names()
+    existing_indexes = {index['name'] for index in _inspector().get_indexes('sightings')}
+    indexes_created = [name for name, _, _ in SIGHTINGS_INDEXES if name not in existing_indexes]
+
+    if not _has_table(BOOKKEEPING_TABLE):
+        op.create_table(BOOKKEEPING_TABLE,
+        sa.Column('revision', sa.String(length=32), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.PrimaryKeyConstraint('revision', 'kind', 'name')
+        )
+    _record_created('table', created)
+    _record_created('view', ['species_correlations'] if view_created else [])
+    _record_created('index', indexes_created)
+
+    # --- eDNA ---
+    if 'edna_sequences' in created:
+        op.create_table('edna_sequences',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('header', sa.Text(), nullable=False),
+        sa.Column('sequence', sa.Text(), nullable=True),
+        sa.Column('species_name', sa.String(), nullable=True),
+        sa.Column('sequence_packed', sa.LargeBinary(), nullable=True),
+        sa.Column('sequence_length', sa.Integer(), nullable=True),
+        sa.Column('sequence_exceptions', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('sequence_hash', sa.String(length=64), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    else:
+        # Created by an older create_all: add the packed / hash columns and drop the
+        # full-text btree indexes (they fail on sequences longer than ~2.7 kB).
+        existing = _columns('edna_sequences')
+        for column in (
+            sa.Column('sequence_packed', sa.LargeBinary(), nullable=True),
+            sa.Column('sequence_length', sa.Integer(), nullable=True),
+            sa.Column('sequence_exceptions', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+            sa.Column('sequence_hash', sa.String(length=64), nullable=True),
+        ):
+            if column.name not in existing:
+                op.add_column('edna_sequences', column)
+        op.alter_column('edna_sequences', 'sequence', existing_type=sa.Text(), nullable=True)
+        op.execute('DROP INDEX IF EXISTS idx_sequence_text')
+        op.execute('DROP INDEX IF EXISTS ix_edna_sequences_sequence')
+    op.create_index('ix_edna_sequences_id', 'edna_sequences', ['id'], unique=False, if_not_exists=True)
+    op.create_index('idx_edna_sequence_hash', 'edna_sequences', ['sequence_hash'], unique=False, if_not_exists=True)
+
+    if 'edna_kmers' in created:
+        op.create_table('edna_kmers',
+        sa.Column('kmer', sa.BigInteger(), nullable=False),
+        sa.Column('sequence_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['sequence_id'], ['edna_sequences.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('kmer', 'sequence_id')
+        )
+
+    # --- Analysis ---
+    if 'species_env_stats' in created:
+        op.create_table('species_env_stats',
+        sa.Column('species_id', sa.Integer(), nullable=False),
+        sa.Column('n', sa.BigInteger(), nullable=False),
+        sa.Column('n_sst', sa.BigInteger(), nullable=False),
+        sa.Column('sum_sst', sa.Float(), nullable=False),
+        sa.Column('sumsq_sst', sa.Float(), nullable=False),
+        sa.Column('n_sal', sa.BigInteger(), nullable=False),
+        sa.Column('sum_sal', sa.Float(), nullable=False),
+        sa.Column('sumsq_sal', sa.Float(), nullable=False),
+        sa.Column('n_chl', sa.BigInteger(), nullable=False),
+        sa.Column('sum_chl', sa.Float(), nullable=False),
+        sa.Column('sumsq_chl', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['species_id'], ['species.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('species_id')
+        )
+
+    if 'data_generations' in created:
+        op.create_table('data_generations',
+        sa.Column('name', sa.String(length=32), nullable=False),
+        sa.Column('generation', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+        )
+
+    # One-time species_env_stats backfill from the existing sightings; the marker
+    # row tells app.core.env_stats.ensure_backfilled that it is done.
+    done = op.get_bind().execute(
+        sa.text("SELECT generation FROM data_generations WHERE name = 'env_stats_backfill'")
+    ).scalar()
+    if not done:
+        op.execute('LOCK TABLE species_env_stats IN EXCLUSIVE MODE')
+        op.execute('DELETE FROM species_env_stats')
+        op.execute(ENV_STATS_BACKFILL_SQL)
+        op.execute("INSERT INTO data_generations (name, generation) VALUES ('env_stats_backfill', 1) "
+                   "ON CONFLICT (name) DO UPDATE SET generation = data_generations.generation + 1")
+    op.execute(CORRELATION_VIEW_SQL)
+    op.execute('REFRESH MATERIALIZED VIEW species_correlations')
+    op.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_species_correlations_key ON species_correlations (species_id, variable)')
+    op.execute('CREATE INDEX IF NOT EXISTS idx_species_correlations_rank ON species_correlations (rank)')
+
+    if 'correlation_findings' in created:
+        op.create_table('correlation_findings',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('scope', sa.String(length=16), nullable=False),
+        sa.Column('cell', sa.String(length=12), nullable=True),
+        sa.Column('month', sa.Integer(), nullable=True),
+        sa.Column('species_id', sa.Integer(), nullable=False),
+        sa.Column('variable', sa.String(), nullable=False),
+        sa.Column('n', sa.Integer(), nullable=False),
+        sa.Column('n_total', sa.Integer(), nullable=False),
+        sa.Column('correlation', sa.Float(), nullable=False),
+        sa.Column('strength', sa.Float(), nullable=False),
+        sa.Column('p_value', sa.Float(), nullable=False),
+        sa.Column('q_value', sa.Float(), nullable=False),
+        sa.Column('rank', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['species_id'], ['species.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+        )
+    op.create_index('idx_correlation_findings_partition', 'correlation_findings',
+                    ['scope', 'cell', 'month', 'rank'], unique=False, if_not_exists=True)
+    op.create_index('idx_correlation_findings_scope_rank', 'correlation_findings',
+                    ['scope', 'rank', 'q_value', sa.text('strength DESC')], unique=False, if_not_exists=True)
+
+    # --- Sightings ---
+    with op.get_context().autocommit_block():
+        for name, columns, using in SIGHTINGS_INDEXES:
+            op.create_index(name, 'sightings', columns, unique=False, if_not_exists=True,
+                            postgresql_using=using, postgresql_concurrently=True)
+    op.execute('ANALYZE sightings')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    created_indexes = _created('index')
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(SIGHTINGS_INDEXES):
+            if name in created_indexes:
+                op.drop_index(name, table_name='sightings', if_exists=True, postgresql_concurrently=True)
+    if 'species_correlations' in _created('view'):
+        op.execute('DROP MATERIALIZED VIEW IF EXISTS species_correlations')
+
+    created = _created('table')
+    for name in reversed(GUARDED_TABLES):
+        if name in created:
+            op.drop_table(name)
+    if 'data_generations' not in created and 'species_env_stats' in created and _has_table('data_generations'):
+        op.execute("DELETE FROM data_generations WHERE name = 'env_stats_backfill'")
+
+    if _has_table(BOOKKEEPING_TABLE):
+        op.get_bind().execute(sa.text(f"DELETE FROM {BOOKKEEPING_TABLE} WHERE revision = :revision"),
+                              {'revision': revision})
+        if not op.get_bind().execute(sa.text(f"SELECT EXISTS (SELECT 1 FROM {BOOKKEEPING_TABLE})")).scalar():
+            op.drop_table(BOOKKEEPING_TABLE)
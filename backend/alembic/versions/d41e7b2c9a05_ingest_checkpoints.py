@@ -0,0 +1,42 @@
+"""Ingest checkpoints table for bulk_upload.py
+
+Revision ID: d41e7b2c9a05
+Revises: 9c2f4e7a1b3d
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41e7b2c9a05'
+down_revision: Union[str, Sequence[str], None] = '9c2f4e7a1b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if sa.inspect(op.get_bind()).has_table('ingest_checkpoints'):
+        return
+    op.create_table('ingest_checkpoints',
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('mtime', sa.Float(), nullable=False),
+    sa.Column('chunksize', sa.Integer(), nullable=False),
+    sa.Column('byte_offset', sa.BigInteger(), nullable=False),
+    sa.Column('chunks_committed', sa.Integer(), nullable=False),
+    sa.Column('rows_committed', sa.BigInteger(), nullable=False),
+    sa.Column('sightings_added', sa.BigInteger(), nullable=False),
+    sa.Column('species_added', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('source')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('ingest_checkpoints')
@@ -1,164 +1,45 @@
 import os
-import json
 import math
 import logging
 from sqlalchemy.sql import text
 from sqlalchemy.orm import Session
-import redis
 from typing import Optional, Dict, Any
 from sqlalchemy import select, func
 
+from app import models
+from app.core import env_stats, versioned_cache
+
 
 
 logger = logging.getLogger(__name__)
 
-# ---------------- Redis Setup ----------------
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+# ---------------- Cache ----------------
 REDIS_TTL_SECONDS = int(os.getenv("HYPOTHESIS_CACHE_TTL", 600))  # 10 min default
 
-try:
-    redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
-    _ = redis_client.ping()
-    logger.info("Connected to Redis for caching")
-except Exception:
-    redis_client = None
-    logger.info("Redis not available — caching disabled")
-
-
-def _cache_get(key: str):
-    if not redis_client:
-        return None
-    try:
-        raw = redis_client.get(key)
-        if raw:
-            return json.loads(raw)
-    except Exception as e:
-        logger.warning("Redis GET failed: %s", e)
-    return None
-
-
-def _cache_set(key: str, value: dict, ttl: int = REDIS_TTL_SECONDS):
-    if not redis_client:
-        return
-    try:
-        redis_client.setex(key, ttl, json.dumps(value))
-    except Exception as e:
-        logger.warning("Redis SET failed: %s", e)
+# Keyed by the sightings data generation, so an ingest invalidates it immediately.
+correlation_cache = versioned_cache.VersionedCache("correlation", ttl=REDIS_TTL_SECONDS)
 
 
-# ---------------- Core SQL Logic ----------------
-def _run_sql_correlation(db: Session, min_count: int) -> dict:
+# ---------------- Core Logic ----------------
+def correlation_table(db: Session, top: Optional[int] = None, min_count: int = 0, variable: Optional[str] = None) -> list:
     """
-    Run one SQL pass to compute strongest correlation above min_count.
-    Returns dict {correlation, variable, species_id}.
+    The ranked species x variable correlation table from the species_correlations
+    materialized view (built over species_env_stats, refreshed after ingest;
+    backfilled once at startup by env_stats.ensure_backfilled).
     """
-    sql = text("""
-    WITH stats AS (
-      SELECT
-        COUNT(*)::float AS N,
-        AVG(sea_surface_temp_c)::double precision AS mean_sst,
-        STDDEV_POP(sea_surface_temp_c)::double precision AS std_sst,
-        AVG(salinity_psu)::double precision AS mean_sal,
-        STDDEV_POP(salinity_psu)::double precision AS std_sal,
-        AVG(chlorophyll_mg_m3)::double precision AS mean_chl,
-        STDDEV_POP(chlorophyll_mg_m3)::double precision AS std_chl
-      FROM sightings
-      WHERE sea_surface_temp_c IS NOT NULL OR salinity_psu IS NOT NULL OR chlorophyll_mg_m3 IS NOT NULL
-    ),
-    per_species AS (
-      SELECT species_id::int as species_id,
-             COUNT(*)::float AS cnt,
-             SUM(sea_surface_temp_c) FILTER (WHERE sea_surface_temp_c IS NOT NULL) AS sum_sst,
-             SUM(salinity_psu) FILTER (WHERE salinity_psu IS NOT NULL) AS sum_sal,
-             SUM(chlorophyll_mg_m3) FILTER (WHERE chlorophyll_mg_m3 IS NOT NULL) AS sum_chl
-      FROM sightings
-      GROUP BY species_id
-    )
-    SELECT
-      per_species.species_id,
-      per_species.cnt,
-      CASE
-        WHEN stats.std_sst IS NULL OR stats.std_sst = 0 OR per_species.cnt = 0 OR per_species.cnt = stats.N THEN NULL
-        ELSE (per_species.sum_sst / stats.N - stats.mean_sst * (per_species.cnt / stats.N)) / (stats.std_sst * sqrt((per_species.cnt / stats.N) * (1 - per_species.cnt / stats.N)))
-      END AS corr_sst,
-      CASE
-        WHEN stats.std_sal IS NULL OR stats.std_sal = 0 OR per_species.cnt = 0 OR per_species.cnt = stats.N THEN NULL
-        ELSE (per_species.sum_sal / stats.N - stats.mean_sal * (per_species.cnt / stats.N)) / (stats.std_sal * sqrt((per_species.cnt / stats.N) * (1 - per_species.cnt / stats.N)))
-      END AS corr_sal,
-      CASE
-        WHEN stats.std_chl IS NULL OR stats.std_chl = 0 OR per_species.cnt = 0 OR per_species.cnt = stats.N THEN NULL
-        ELSE (per_species.sum_chl / stats.N - stats.mean_chl * (per_species.cnt / stats.N)) / (stats.std_chl * sqrt((per_species.cnt / stats.N) * (1 - per_species.cnt / stats.N)))
-      END AS corr_chl
-    FROM per_species CROSS JOIN stats
-    WHERE per_species.cnt >= :min_count
-    ORDER BY GREATEST(
-      COALESCE(ABS(
-        CASE
-          WHEN stats.std_sst IS NULL OR stats.std_sst = 0 OR per_species.cnt = 0 OR per_species.cnt = stats.N THEN NULL
-          ELSE (per_species.sum_sst / stats.N - stats.mean_sst * (per_species.cnt / stats.N)) / (stats.std_sst * sqrt((per_species.cnt / stats.N) * (1 - per_species.cnt / stats.N)))
-        END
-      ), 0),
-      COALESCE(ABS(
-        CASE
-          WHEN stats.std_sal IS NULL OR stats.std_sal = 0 OR per_species.cnt = 0 OR per_species.cnt = stats.N THEN NULL
-          ELSE (per_species.sum_sal / stats.N - stats.mean_sal * (per_species.cnt / stats.N)) / (stats.std_sal * sqrt((per_species.cnt / stats.N) * (1 - per_species.cnt / stats.N)))
-        END
-      ), 0),
-      COALESCE(ABS(
-        CASE
-          WHEN stats.std_chl IS NULL OR stats.std_chl = 0 OR per_species.cnt = 0 OR per_species.cnt = stats.N THEN NULL
-          ELSE (per_species.sum_chl / stats.N - stats.mean_chl * (per_species.cnt / stats.N)) / (stats.std_chl * sqrt((per_species.cnt / stats.N) * (1 - per_species.cnt / stats.N)))
-        END
-      ), 0)
-    ) DESC
-    LIMIT 1;
-    """)
-
-    result = db.execute(sql, {"min_count": min_count})
-    row = result.mappings().first()
-
-    if not row:
-        return {"correlation": 0.0, "variable": None, "species_id": None}
-
-    # Choose best correlation
-    candidates = {}
-    if row.get("corr_sst") is not None:
-        candidates["sea_surface_temp_c"] = float(row["corr_sst"])
-    if row.get("corr_sal") is not None:
-        candidates["salinity_psu"] = float(row["corr_sal"])
-    if row.get("corr_chl") is not None:
-        candidates["chlorophyll_mg_m3"] = float(row["corr_chl"])
-
-    if not candidates:
-        return {"correlation": 0.0, "variable": None, "species_id": None}
-
-    best_var = max(candidates.keys(), key=lambda k: abs(candidates[k]))
-    best_corr = float(candidates[best_var])
-
-    return {"correlation": best_corr, "variable": best_var, "species_id": int(row["species_id"])}
+    return env_stats.ranked_correlations(db, top=top, min_count=min_count, variable=variable)
 
 
 # ---------------- Public API ----------------
 def find_strongest_correlation(db: Session, use_cache: bool = True) -> dict:
-    cache_key = "tattva:correlation:latest"
-
-    if use_cache:
-        cached = _cache_get(cache_key)
-        if cached:
-            return cached
-
-    # Retry strategy with decreasing min_count thresholds
-    for min_count in [30, 20, 10, 5]:
-        result = _run_sql_correlation(db, min_count)
-        if result["correlation"] != 0.0:
-            _cache_set(cache_key, result)
-            return result
-
-    # If still nothing meaningful
-    fallback = {"correlation": 0.0, "variable": None, "species_id": None}
-    _cache_set(cache_key, fallback)
-    return fallback
+    # All min_count thresholds (30, 20, 10, 5) are answered from one ranked table.
+    def compute():
+        return env_stats.strongest(correlation_table(db, min_count=5))
+
+    if not use_cache:
+        return compute()
+    # The caller gets its own copy; /api/hypotheses edits the finding in place.
+    return dict(correlation_cache.get_or_compute(versioned_cache.data_generation(db), "latest", compute))
 
 
 
@@ -0,0 +1,220 @@
+# app/core/analytics_engine.py
+import io
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+
+from app.core import versioned_cache
+
+logger = logging.getLogger(__name__)
+
+# On-disk columnar snapshots of sightings, stored as Parquet.
+SNAPSHOT_DIR = os.getenv("ANALYTICS_CACHE_DIR", "local_data/analytics")
+
+VARIABLES = ("sea_surface_temp_c", "salinity_psu", "chlorophyll_mg_m3")
+SNAPSHOT_QUERY = """
+    SELECT species_id,
+           sighting_date,
+           sea_surface_temp_c::float8,
+           salinity_psu::float8,
+           chlorophyll_mg_m3::float8,
+           ST_Y(location) AS lat,
+           ST_X(location) AS lon
+    FROM sightings
+"""
+SNAPSHOT_COLUMNS = ("species_id", "sighting_date") + VARIABLES + ("lat", "lon")
+
+_memo: Dict[str, object] = {"version": None, "columns": None}
+_memo_lock = threading.Lock()
+
+
+# ---------------- Snapshot ----------------
+def snapshot_version(db: Session) -> str:
+    """
+    Cheap change marker: the sightings data generation bumped by ingest, plus
+    the highest sighting id so a recreated database never matches an old file.
+    """
+    max_id = db.execute(text("SELECT COALESCE(MAX(id), 0) FROM sightings")).scalar()
+    return f"{int(max_id)}-g{versioned_cache.data_generation(db)}"
+
+
+def fetch_columns(db: Session) -> Dict[str, np.ndarray]:
+    """One bulk COPY of the analytical columns, parsed straight into NumPy arrays."""
+    buffer = io.StringIO()
+    raw = db.connection().connection
+    with raw.cursor() as cur:
+        cur.copy_expert(f"COPY ({SNAPSHOT_QUERY}) TO STDOUT WITH (FORMAT csv)", buffer)
+    buffer.seek(0)
+    frame = pd.read_csv(
+        buffer,
+        header=None,
+        names=list(SNAPSHOT_COLUMNS),
+        dtype={c: "float64" for c in SNAPSHOT_COLUMNS if c != "sighting_date"},
+        parse_dates=["sighting_date"],
+    )
+    return _from_frame(frame)
+
+
+def _from_frame(frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+    columns = {c: frame[c].to_numpy(dtype="float64") for c in SNAPSHOT_COLUMNS if c != "sighting_date"}
+    columns["species_id"] = np.nan_to_num(columns["species_id"], nan=-1).astype(np.int64)
+    columns["sighting_date"] = frame["sighting_date"].to_numpy(dtype="datetime64[D]")
+    return columns
+
+
+def _snapshot_path(version: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"sightings_{version}.parquet")
+
+
+def _write_snapshot(path: str, columns: Dict[str, np.ndarray]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    pd.DataFrame(columns).to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    # Older snapshots are never read again.
+    for name in os.listdir(os.path.dirname(path)):
+        old = os.path.join(os.path.dirname(path), name)
+        if name.startswith("sightings_") and old != path:
+            os.remove(old)
+
+
+def _read_snapshot(path: str) -> Dict[str, np.ndarray]:
+    return _from_frame(pd.read_parquet(path))
+
+
+def load_snapshot(db: Session, version: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    Columnar sightings for the current data version: from memory, else from
+    the on-disk snapshot, else one bulk fetch from Postgres (then written to disk).
+    """
+    version = version or snapshot_version(db)
+    with _memo_lock:
+        if _memo["version"] == version:
+            return _memo["columns"]
+        path = _snapshot_path(version)
+        started = time.perf_counter()
+        if os.path.exists(path):
+            columns = _read_snapshot(path)
+            source = "disk"
+        else:
+            columns = fetch_columns(db)
+            _write_snapshot(path, columns)
+            source = "postgres"
+        logger.info("Loaded %d sightings from %s in %.2fs", len(columns["species_id"]), source, time.perf_counter() - started)
+        _memo.update(version=version, columns=columns)
+        return columns
+
+
+# ---------------- Analyses ----------------
+def correlation_matrix(columns: Dict[str, np.ndarray], variables=VARIABLES + ("lat", "lon")) -> dict:
+    """Pearson correlation between every pair of variables over pairwise-complete rows."""
+    data = np.vstack([columns[v] for v in variables])
+    present = ~np.isnan(data)
+    values = np.where(present, data, 0.0)
+    # Pairwise sums via matrix products: n_ij, sum_i over rows where both i and j are present, ...
+    p = present.astype(np.float64)
+    n = p @ p.T
+    sx = values @ p.T
+    sxx = (values * values) @ p.T
+    sxy = values @ values.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy / n - (sx / n) * (sx.T / n)
+        var_x = sxx / n - (sx / n) ** 2
+        r = cov / np.sqrt(var_x * var_x.T)
+    r = np.clip(r, -1.0, 1.0)
+    return {
+        "variables": list(variables),
+        "matrix": [[None if np.isnan(x) else round(float(x), 4) for x in row] for row in r],
+        "pairs_counted": n.astype(int).tolist(),
+    }
+
+
+def species_zscores(columns: Dict[str, np.ndarray], min_count: int = 5) -> List[dict]:
+    """
+    For each species and variable: its mean, and how many standard errors it
+    sits from the all-species mean (z = (mean_s - mean) / (std / sqrt(n_s))).
+    Group sums use bincount, so this is a handful of passes over the arrays.
+    """
+    species = columns["species_id"]
+    valid = species >= 0
+    ids, inverse = np.unique(species[valid], return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(ids))
+    results = {int(s): {"species_id": int(s), "n": int(c)} for s, c in zip(ids, counts) if c >= min_count}
+
+    for variable in VARIABLES:
+        x = columns[variable][valid]
+        present = ~np.isnan(x)
+        n_all = present.sum()
+        if n_all < 2:
+            continue
+        mean, std = x[present].mean(), x[present].std()
+        n_s = np.bincount(inverse[present], minlength=len(ids))
+        sum_s = np.bincount(inverse[present], weights=x[present], minlength=len(ids))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_s = sum_s / n_s
+            z = (mean_s - mean) / (std / np.sqrt(n_s))
+        for i, species_id in enumerate(ids):
+            row = results.get(int(species_id))
+            if row is not None and n_s[i] > 0:
+                row[variable] = {
+                    "mean": round(float(mean_s[i]), 4),
+                    "z": round(float(z[i]), 3) if np.isfinite(z[i]) else None,
+                    "n": int(n_s[i]),
+                }
+    return sorted(results.values(), key=lambda r: -r["n"])
+
+
+def seasonal_stats(columns: Dict[str, np.ndarray], species_id: Optional[int] = None, window: int = 3) -> dict:
+    """
+    Month-of-year sighting counts and variable means, plus a centred rolling
+    mean over `window` months that wraps December into January.
+    """
+    mask = np.ones(len(columns["species_id"]), dtype=bool)
+    if species_id is not None:
+        mask = columns["species_id"] == species_id
+    months = columns["sighting_date"][mask].astype("datetime64[M]").astype(np.int64) % 12
+    result = {"month": list(range(1, 13)), "count": np.bincount(months, minlength=12).tolist()}
+
+    kernel = np.ones(window) / window
+    half = window // 2
+    for variable in VARIABLES:
+        x = columns[variable][mask]
+        present = ~np.isnan(x)
+        n = np.bincount(months[present], minlength=12)
+        sums = np.bincount(months[present], weights=x[present], minlength=12)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            monthly = sums / n
+        # Rolling mean of the monthly sums / counts, circular over the year.
+        padded_sums = np.concatenate([sums[-half:], sums, sums[:half]]) if half else sums
+        padded_n = np.concatenate([n[-half:], n, n[:half]]) if half else n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rolling = np.convolve(padded_sums, kernel, "valid") / np.convolve(padded_n, kernel, "valid")
+        result[variable] = {
+            "mean": [None if np.isnan(v) else round(float(v), 4) for v in monthly],
+            "rolling_mean": [None if np.isnan(v) else round(float(v), 4) for v in rolling],
+        }
+    return result
+
+
+def environment_overview(db: Session, species_id: Optional[int] = None, min_count: int = 5) -> dict:
+    started = time.perf_counter()
+    columns = load_snapshot(db)
+    loaded = time.perf_counter()
+    overview = {
+        "rows": int(len(columns["species_id"])),
+        "correlation_matrix": correlation_matrix(columns),
+        "species_zscores": species_zscores(columns, min_count=min_count),
+        "seasonal": seasonal_stats(columns, species_id=species_id),
+    }
+    overview["timing_ms"] = {
+        "snapshot": round((loaded - started) * 1000, 1),
+        "analysis": round((time.perf_counter() - loaded) * 1000, 1),
+    }
+    return overview
@@ -0,0 +1,332 @@
+# app/core/edna_index.py
+import io
+import os
+import logging
+import itertools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy.sql import text
+from sqlalchemy.orm import Session
+
+from app.core.sequence_codec import AMBIGUOUS, encode_codes, sequence_hash, unpack_codes
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Index Parameters ----------------
+# (k, w) minimizers: one representative k-mer per window of w consecutive k-mers.
+KMER_SIZE = 15
+WINDOW_SIZE = 10
+# Candidates pulled from the inverted index before alignment, and the extra
+# diagonal band (in bases) allowed on top of the length difference.
+CANDIDATE_LIMIT = 50
+ALIGN_BAND = 16
+
+# Batch matching: reads per candidate query, and alignment worker processes.
+MATCH_BATCH_SIZE = 256
+MATCH_WORKERS = int(os.getenv("EDNA_MATCH_WORKERS", os.cpu_count() or 1))
+_pool = None
+
+_HASH_MULT = np.uint64(0x9E3779B97F4A7C15)
+_HASH_MASK = np.uint64((1 << 62) - 1)  # keep hashes positive for a Postgres BIGINT
+_NO_HASH = np.iinfo(np.int64).max
+_BIG = 1 << 28
+
+# Reference rows are read with these columns so packed and plain rows decode the same way.
+REFERENCE_COLUMNS = "id, header, species_name, sequence, sequence_packed, sequence_length, sequence_exceptions"
+
+
+def reference_codes(row) -> np.ndarray:
+    """Base codes of an edna_sequences row selected with REFERENCE_COLUMNS, packed or not."""
+    if row[4] is not None:
+        return unpack_codes(bytes(row[4]), row[5], row[6])
+    return encode_codes(row[3])
+
+
+# ---------------- Minimizers ----------------
+def _kmer_hashes(codes: np.ndarray, k: int) -> np.ndarray:
+    """Hash every k-mer of a code array; k-mers containing an ambiguous base get _NO_HASH."""
+    if len(codes) < k:
+        return np.empty(0, dtype=np.int64)
+    windows = sliding_window_view(codes, k)
+    valid = (windows < AMBIGUOUS).all(axis=1)
+    powers = np.uint64(4) ** np.arange(k - 1, -1, -1, dtype=np.uint64)
+    values = (windows.astype(np.uint64) * powers).sum(axis=1, dtype=np.uint64)
+    # Multiplicative mixing so low-complexity k-mers (poly-A etc.) do not always win the minimum.
+    hashes = values * _HASH_MULT
+    hashes ^= hashes >> np.uint64(29)
+    hashes = (hashes & _HASH_MASK).astype(np.int64)
+    hashes[~valid] = _NO_HASH
+    return hashes
+
+
+def minimizers(codes: np.ndarray, k: int = KMER_SIZE, w: int = WINDOW_SIZE) -> np.ndarray:
+    """Return the sorted, unique minimizer hashes of an encoded sequence."""
+    hashes = _kmer_hashes(codes, k)
+    if len(hashes) == 0:
+        return hashes
+    if len(hashes) < w:
+        picked = hashes
+    else:
+        windows = sliding_window_view(hashes, w)
+        picked = hashes[windows.argmin(axis=1) + np.arange(len(windows))]
+    return np.unique(picked[picked != _NO_HASH])
+
+
+# ---------------- Banded Alignment ----------------
+def banded_identity(query: np.ndarray, targets: List[np.ndarray], band: int = ALIGN_BAND) -> np.ndarray:
+    """
+    Banded global edit distance of `query` against every target at once,
+    returned as percent identity (100 * (1 - edits / longer length)).
+
+    Rows of the DP walk the query; all targets advance together as one
+    (targets x band) NumPy slab. Insertions are resolved per row with a
+    running minimum, so nothing loops over individual cells in Python.
+    """
+    n, count = len(query), len(targets)
+    if count == 0 or n == 0:
+        return np.zeros(count)
+
+    lengths = np.array([len(t) for t in targets], dtype=np.int64)
+    m = int(lengths.max())
+    padded = np.full((count, m), 255, dtype=np.uint8)
+    for c, t in enumerate(targets):
+        padded[c, : len(t)] = t
+    # Ambiguous query bases never match anything.
+    q = np.where(query >= AMBIGUOUS, 254, query).astype(np.uint8)
+
+    width = (band + np.abs(lengths - n))[:, None]
+    wmax = int(width.max())
+    cols = np.arange(m + 1)
+    dist = np.where(cols <= width, cols, _BIG).astype(np.int32)
+
+    for i in range(1, n + 1):
+        lo, hi = max(0, i - wmax), min(m, i + wmax)
+        j = cols[lo : hi + 1]
+        cand = np.empty((count, len(j)), dtype=np.int32)
+        start = 0
+        if lo == 0:
+            cand[:, 0] = np.where(width[:, 0] >= i, i, _BIG)
+            start = 1
+        jj = j[start:]
+        mismatch = padded[:, jj - 1] != q[i - 1]
+        cand[:, start:] = np.minimum(dist[:, jj - 1] + mismatch, dist[:, jj] + 1)
+        row = np.minimum.accumulate(cand - j, axis=1) + j
+        row[np.abs(j - i) > width] = _BIG
+        dist[:, lo : hi + 1] = row
+
+    edits = dist[np.arange(count), lengths].astype(np.float64)
+    identity = 100.0 * (1.0 - edits / np.maximum(lengths, n))
+    return np.clip(identity, 0.0, 100.0)
+
+
+# ---------------- Inverted Index (edna_kmers) ----------------
+def index_sequences(db: Session, records: Iterable[Tuple[int, object]]) -> int:
+    """
+    Add (sequence_id, sequence string or base codes) pairs to the edna_kmers
+    inverted index via COPY. Runs in the caller's transaction. Returns the
+    number of postings written.
+    """
+    buffer = io.StringIO()
+    postings = 0
+    for sequence_id, sequence in records:
+        codes = sequence if isinstance(sequence, np.ndarray) else encode_codes(sequence)
+        for value in minimizers(codes):
+            buffer.write(f"{value}\t{sequence_id}\n")
+            postings += 1
+    if not postings:
+        return 0
+    buffer.seek(0)
+    raw = db.connection().connection
+    with raw.cursor() as cur:
+        cur.copy_expert("COPY edna_kmers (kmer, sequence_id) FROM STDIN", buffer)
+    return postings
+
+
+def rebuild_index(db: Session, batch_size: int = 10_000) -> int:
+    """Rebuild edna_kmers from scratch over every row of edna_sequences."""
+    db.execute(text("TRUNCATE edna_kmers"))
+    total, last_id = 0, 0
+    while True:
+        rows = db.execute(
+            text(f"SELECT {REFERENCE_COLUMNS} FROM edna_sequences WHERE id > :last_id ORDER BY id LIMIT :n"),
+            {"last_id": last_id, "n": batch_size},
+        ).all()
+        if not rows:
+            break
+        total += index_sequences(db, [(r[0], reference_codes(r)) for r in rows])
+        last_id = rows[-1][0]
+        logger.info("Indexed eDNA sequences up to id %d (%d postings)", last_id, total)
+    return total
+
+
+def find_candidates(db: Session, query_minimizers: np.ndarray, limit: int = CANDIDATE_LIMIT) -> List[Tuple[int, int]]:
+    """Return (sequence_id, shared_minimizers) for the references sharing the most minimizers."""
+    if len(query_minimizers) == 0:
+        return []
+    rows = db.execute(
+        text("""
+        SELECT sequence_id, COUNT(*) AS shared
+        FROM edna_kmers
+        WHERE kmer = ANY(:kmers)
+        GROUP BY sequence_id
+        ORDER BY shared DESC
+        LIMIT :limit
+        """),
+        {"kmers": [int(v) for v in query_minimizers], "limit": limit},
+    ).all()
+    return [(int(r[0]), int(r[1])) for r in rows]
+
+
+def find_candidates_batch(db: Session, read_minimizers: List[np.ndarray], limit: int = CANDIDATE_LIMIT) -> List[List[Tuple[int, int]]]:
+    """find_candidates for many reads in one round-trip; returns one candidate list per read."""
+    read_idx, kmers = [], []
+    for idx, values in enumerate(read_minimizers):
+        read_idx.extend([idx] * len(values))
+        kmers.extend(int(v) for v in values)
+    candidates = [[] for _ in read_minimizers]
+    if not kmers:
+        return candidates
+    rows = db.execute(
+        text("""
+        WITH q AS (
+          SELECT * FROM unnest(CAST(:read_idx AS int[]), CAST(:kmers AS bigint[])) AS q(read_idx, kmer)
+        ),
+        hits AS (
+          SELECT q.read_idx, k.sequence_id, COUNT(*) AS shared
+          FROM q JOIN edna_kmers k ON k.kmer = q.kmer
+          GROUP BY q.read_idx, k.sequence_id
+        ),
+        ranked AS (
+          SELECT read_idx, sequence_id, shared,
+                 ROW_NUMBER() OVER (PARTITION BY read_idx ORDER BY shared DESC) AS rn
+          FROM hits
+        )
+        SELECT read_idx, sequence_id, shared FROM ranked WHERE rn <= :limit
+        """),
+        {"read_idx": read_idx, "kmers": kmers, "limit": limit},
+    ).all()
+    for idx, sequence_id, shared in rows:
+        candidates[idx].append((int(sequence_id), int(shared)))
+    return candidates
+
+
+def _rank_hits(rows, identities, shared: dict, top_n: int, min_identity: float) -> List[dict]:
+    """Turn (id, header, species_name, ...) rows plus their identities into sorted hit dicts."""
+    hits = [
+        {
+            "sequence_id": r[0],
+            "header": r[1],
+            "species_name": r[2],
+            "identity": round(float(identity), 2),
+            "shared_kmers": shared.get(r[0], 0),
+        }
+        for r, identity in zip(rows, identities)
+        if identity >= min_identity
+    ]
+    hits.sort(key=lambda h: (h["identity"], h["shared_kmers"]), reverse=True)
+    return hits[:top_n]
+
+
+# ---------------- Public API ----------------
+def search(db: Session, sequence: str, top_n: int = 5, min_identity: float = 0.0) -> List[dict]:
+    """
+    Approximate nearest-sequence search: minimizer candidates from the
+    inverted index, then banded alignment of the query against all of them.
+    Returns up to top_n hits sorted by identity.
+    """
+    query = encode_codes(sequence)
+    candidates = find_candidates(db, minimizers(query))
+    if not candidates:
+        # Too short (or too ambiguous) to have minimizers: fall back to exact lookup.
+        rows = db.execute(
+            text("SELECT id, header, species_name FROM edna_sequences WHERE sequence_hash = :hash LIMIT :n"),
+            {"hash": sequence_hash(sequence), "n": top_n},
+        ).all()
+        return [
+            {"sequence_id": r[0], "header": r[1], "species_name": r[2], "identity": 100.0, "shared_kmers": 0}
+            for r in rows
+        ]
+
+    shared = dict(candidates)
+    rows = db.execute(
+        text(f"SELECT {REFERENCE_COLUMNS} FROM edna_sequences WHERE id = ANY(:ids)"),
+        {"ids": list(shared)},
+    ).all()
+    identities = banded_identity(query, [reference_codes(r) for r in rows])
+    return _rank_hits(rows, identities, shared, top_n, min_identity)
+
+
+def _score_read(query: np.ndarray, targets: List[np.ndarray]) -> np.ndarray:
+    # Top-level so the process pool can pickle it; arguments are compact uint8 code arrays.
+    return banded_identity(query, targets)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the API server is threaded and forking it can copy held locks.
+        _pool = ProcessPoolExecutor(max_workers=MATCH_WORKERS, mp_context=mp.get_context("spawn"))
+    return _pool
+
+
+def batch_search(
+    db: Session,
+    reads: Iterable[Tuple[str, str]],
+    top_n: int = 5,
+    min_identity: float = 0.0,
+    batch_size: int = MATCH_BATCH_SIZE,
+) -> Iterator[dict]:
+    """
+    Match many (read_id, sequence) pairs. Reads are taken batch_size at a
+    time: candidates and reference sequences for the whole batch come from
+    one query each, alignments run on the process pool, and a result dict is
+    yielded for each read as soon as its alignment finishes.
+    """
+    pool = _get_pool()
+    read_iter = iter(reads)
+    while True:
+        batch = list(itertools.islice(read_iter, batch_size))
+        if not batch:
+            return
+
+        codes = [encode_codes(sequence) for _, sequence in batch]
+        candidates = find_candidates_batch(db, [minimizers(c) for c in codes])
+
+        # Reads without minimizers fall back to exact lookup, all in one query.
+        exact = {}
+        short = [sequence_hash(sequence) for (_, sequence), cands in zip(batch, candidates) if not cands]
+        if short:
+            for row in db.execute(
+                text("SELECT id, header, species_name, sequence_hash FROM edna_sequences WHERE sequence_hash = ANY(:hashes)"),
+                {"hashes": short},
+            ):
+                exact.setdefault(row[3], []).append(row)
+
+        wanted = {sequence_id for cands in candidates for sequence_id, _ in cands}
+        references = {}
+        if wanted:
+            for row in db.execute(
+                text(f"SELECT {REFERENCE_COLUMNS} FROM edna_sequences WHERE id = ANY(:ids)"),
+                {"ids": list(wanted)},
+            ):
+                references[row[0]] = (row, reference_codes(row))
+
+        futures = {}
+        for idx, ((read_id, sequence), cands) in enumerate(zip(batch, candidates)):
+            if not cands:
+                rows = exact.get(sequence_hash(sequence), [])[:top_n]
+                hits = _rank_hits(rows, [100.0] * len(rows), {}, top_n, min_identity)
+                yield {"read_id": read_id, "matched": bool(hits), "matches": hits}
+                continue
+            rows = [references[sequence_id][0] for sequence_id, _ in cands if sequence_id in references]
+            targets = [references[r[0]][1] for r in rows]
+            futures[pool.submit(_score_read, codes[idx], targets)] = (read_id, rows, dict(cands))
+
+        for future in as_completed(futures):
+            read_id, rows, shared = futures[future]
+            hits = _rank_hits(rows, future.result(), shared, top_n, min_identity)
+            yield {"read_id": read_id, "matched": bool(hits), "matches": hits}
@@ -0,0 +1,280 @@
+# app/core/edna_service.py
+import io
+import os
+import gzip
+import json
+import time
+import logging
+from typing import BinaryIO, Callable, Iterator, List, Optional, TextIO, Tuple
+
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+
+from app import models
+from app.database import SessionLocal
+from app.core.minio_client import StreamingUpload, TeeReader
+from app.core import edna_index
+from app.core.sequence_codec import normalize_sequence, pack_sequence, sequence_hash
+
+logger = logging.getLogger(__name__)
+
+# A FASTA upload is COPYed in batches of at most this many records / bases.
+EDNA_BATCH_SIZE = 5000
+EDNA_BATCH_BASES = 32 * 1024 * 1024
+
+# Store new uploads 2-bit packed (sequence column left NULL) instead of as raw text.
+EDNA_PACKED_STORAGE = os.getenv("EDNA_PACKED_STORAGE", "false").lower() == "true"
+
+
+# ---------------- Parsing ----------------
+def parse_species_name(header: str) -> Optional[str]:
+    """Extract the species name if the header contains "species=<name>"."""
+    if "species=" not in header:
+        return None
+    try:
+        return header.split("species=")[1].split()[0]
+    except Exception:
+        return None
+
+
+# ---------------- Storage ----------------
+def sequence_columns(sequence: str, packed: bool = EDNA_PACKED_STORAGE) -> dict:
+    """EdnaSequence column values for a sequence, in plain or 2-bit packed form."""
+    columns = {"sequence_hash": sequence_hash(sequence)}
+    if packed:
+        data, length, exceptions = pack_sequence(sequence)
+        columns.update(
+            sequence=None,
+            sequence_packed=data,
+            sequence_length=length,
+            sequence_exceptions=exceptions or None,
+        )
+    else:
+        columns.update(sequence=sequence, sequence_length=len(sequence))
+    return columns
+
+
+def convert_existing(db: Session, packed: bool = True, batch_size: int = 5000) -> int:
+    """
+    Backfill sequence_hash on older rows and, if packed, move their text into
+    the packed columns. Commits per batch. Returns the number of rows updated.
+    """
+    updated = 0
+    # Converted rows drop out of this filter, so the loop ends once nothing is left.
+    query = db.query(models.EdnaSequence).filter(models.EdnaSequence.sequence.isnot(None))
+    if not packed:
+        query = query.filter(models.EdnaSequence.sequence_hash.is_(None))
+    while True:
+        rows = (
+            query
+            .order_by(models.EdnaSequence.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return updated
+        for row in rows:
+            for column, value in sequence_columns(row.sequence, packed=packed).items():
+                setattr(row, column, value)
+        db.commit()
+        updated += len(rows)
+        logger.info("Converted %d eDNA rows", updated)
+
+
+def storage_report(db: Session) -> dict:
+    """Bytes used by the plain vs packed sequence columns and by the exact-match indexes."""
+    row = db.execute(text("""
+        SELECT
+          COUNT(*) FILTER (WHERE sequence IS NOT NULL) AS plain_rows,
+          COUNT(*) FILTER (WHERE sequence_packed IS NOT NULL) AS packed_rows,
+          COALESCE(SUM(pg_column_size(sequence)), 0) AS plain_bytes,
+          COALESCE(SUM(pg_column_size(sequence_packed)), 0)
+            + COALESCE(SUM(pg_column_size(sequence_exceptions)), 0) AS packed_bytes,
+          COALESCE(SUM(sequence_length) FILTER (WHERE sequence_packed IS NOT NULL), 0) AS packed_bases,
+          COALESCE(SUM(sequence_length) FILTER (WHERE sequence IS NOT NULL), 0) AS plain_bases,
+          pg_total_relation_size('edna_sequences') AS table_bytes
+        FROM edna_sequences
+    """)).mappings().one()
+    indexes = db.execute(text("""
+        SELECT indexrelname, pg_relation_size(indexrelid) AS bytes
+        FROM pg_stat_user_indexes WHERE relname = 'edna_sequences'
+    """)).all()
+    report = {k: int(v) for k, v in row.items()}
+    report["bytes_per_base_plain"] = round(report["plain_bytes"] / report["plain_bases"], 3) if report["plain_bases"] else None
+    report["bytes_per_base_packed"] = round(report["packed_bytes"] / report["packed_bases"], 3) if report["packed_bases"] else None
+    report["index_bytes"] = {name: int(size) for name, size in indexes}
+    return report
+
+
+# ---------------- Reads ----------------
+FASTA_EXTENSIONS = (".fasta", ".fa", ".fasta.gz", ".fa.gz")
+
+
+def is_fasta_filename(filename: str) -> bool:
+    return filename.lower().endswith(FASTA_EXTENSIONS)
+
+
+def open_fasta_text(stream: BinaryIO, filename: str) -> TextIO:
+    """Text view over a (possibly gzipped) binary FASTA stream, decompressed on the fly."""
+    if filename.lower().endswith(".gz"):
+        stream = gzip.GzipFile(fileobj=stream)
+    return io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+
+
+def iter_fasta_reads(path: str, filename: str = "", delete: bool = True) -> Iterator[Tuple[str, str]]:
+    """Yield (record id, normalized sequence) from a FASTA file, removing the file afterwards if asked."""
+    try:
+        with open(path, "rb") as raw:
+            for title, sequence in SimpleFastaParser(open_fasta_text(raw, filename or path)):
+                yield title.split(None, 1)[0] if title else "", normalize_sequence(sequence)
+    finally:
+        if delete and os.path.exists(path):
+            os.remove(path)
+
+
+# ---------------- COPY Loader ----------------
+COPY_COLUMNS = (
+    "id",
+    "header",
+    "sequence",
+    "species_name",
+    "sequence_packed",
+    "sequence_length",
+    "sequence_exceptions",
+    "sequence_hash",
+)
+
+
+def _csv_field(value) -> str:
+    # Unquoted empty means NULL in COPY ... (FORMAT csv); every string is quoted.
+    if value is None:
+        return ""
+    if isinstance(value, int):
+        return str(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def copy_edna_batch(db: Session, batch: List[Tuple[str, str]]) -> int:
+    """
+    COPY one batch of (header, sequence) records into edna_sequences and the
+    edna_kmers index. Ids are reserved from the table's sequence up front so
+    the index postings can be written without reading the rows back.
+    """
+    if not batch:
+        return 0
+    ids = db.execute(
+        text("SELECT nextval(pg_get_serial_sequence('edna_sequences', 'id')) FROM generate_series(1, :n)"),
+        {"n": len(batch)},
+    ).scalars().all()
+
+    buffer = io.StringIO()
+    for sequence_id, (header, sequence) in zip(ids, batch):
+        columns = sequence_columns(sequence)
+        packed = columns.get("sequence_packed")
+        exceptions = columns.get("sequence_exceptions")
+        buffer.write(",".join(_csv_field(v) for v in (
+            sequence_id,
+            header,
+            columns["sequence"],
+            parse_species_name(header),
+            "\\x" + packed.hex() if packed is not None else None,
+            columns["sequence_length"],
+            json.dumps(exceptions) if exceptions else None,
+            columns["sequence_hash"],
+        )))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    raw = db.connection().connection
+    with raw.cursor() as cur:
+        cur.copy_expert(f"COPY edna_sequences ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    edna_index.index_sequences(db, zip(ids, (sequence for _, sequence in batch)))
+    return len(batch)
+
+
+def ingest_fasta(
+    db: Session,
+    handle: TextIO,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Stream every record of a FASTA text stream into edna_sequences and the
+    edna_kmers match index, COPYing bounded batches (by record count and by
+    bases) so memory does not grow with the file. Everything runs in the
+    caller's transaction; the caller commits.
+    """
+    started = time.perf_counter()
+    inserted = 0
+    batch, batch_bases = [], 0
+
+    def flush():
+        nonlocal inserted, batch, batch_bases
+        inserted += copy_edna_batch(db, batch)
+        batch, batch_bases = [], 0
+        if progress:
+            elapsed = time.perf_counter() - started
+            progress({"inserted": inserted, "records_per_second": round(inserted / elapsed, 1) if elapsed > 0 else None})
+
+    for header, sequence in SimpleFastaParser(handle):
+        batch.append((header, sequence))
+        batch_bases += len(sequence)
+        if len(batch) >= EDNA_BATCH_SIZE or batch_bases >= EDNA_BATCH_BASES:
+            flush()
+    if batch:
+        flush()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "inserted": inserted,
+        "elapsed_seconds": round(elapsed, 3),
+        "records_per_second": round(inserted / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+# ---------------- Background Job ----------------
+def run_edna_upload_job(report: Callable[[dict], None], path: str, filename: str, minio_path: str) -> dict:
+    """
+    Job body for /api/upload/edna. The file is read once: every byte the
+    parser consumes is also fed to a multipart MinIO upload running in
+    parallel, and records are COPYed in batches as they are parsed. The rows
+    are committed once, after the backup has completed, so a failed upload
+    leaves neither a partial FASTA in the table nor a partial object.
+    Runs on the job_queue worker pool with its own session; deletes `path` when done.
+    """
+    db = SessionLocal()
+    try:
+        file_size = os.path.getsize(path)
+        content_type = "application/gzip" if filename.lower().endswith(".gz") else "text/plain"
+        with open(path, "rb") as raw, StreamingUpload("edna", minio_path, content_type=content_type) as upload:
+            tee = TeeReader(raw, upload)
+
+            def progress(stats: dict):
+                bytes_read = min(tee.bytes_read, file_size)
+                report({
+                    "stage": "load",
+                    **stats,
+                    "bytes_read": bytes_read,
+                    "bytes_total": file_size,
+                    "percent": round(100.0 * bytes_read / file_size, 1) if file_size else 100.0,
+                })
+
+            handle = open_fasta_text(io.BufferedReader(tee, buffer_size=1024 * 1024), filename)
+            stats = ingest_fasta(db, handle, progress=progress)
+            # Forward anything the parser did not need (e.g. gzip trailer) so the backup is complete.
+            while tee.read(1024 * 1024):
+                pass
+        try:
+            db.commit()
+        except Exception:
+            upload.client.remove_object("edna", minio_path)
+            raise
+        report({"stage": "done", **stats, "bytes_read": file_size, "bytes_total": file_size, "percent": 100.0})
+
+        return {"success": True, "inserted": stats["inserted"], "minio_path": minio_path}
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        os.remove(path)
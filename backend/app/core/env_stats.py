@@ -0,0 +1,287 @@
+# app/core/env_stats.py
+import math
+import logging
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from scipy import stats as scipy_stats
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from sqlalchemy.dialects.postgresql import insert
+
+from app import models
+from app.core import versioned_cache
+
+logger = logging.getLogger(__name__)
+
+# sightings column -> suffix used in species_env_stats
+VARIABLES = {
+    "sea_surface_temp_c": "sst",
+    "salinity_psu": "sal",
+    "chlorophyll_mg_m3": "chl",
+}
+# Numeric scale of each sightings column; new values are rounded the same way Postgres stores them.
+SCALES = {"sst": 2, "sal": 2, "chl": 4}
+# data_generations row that records the one-time backfill (see ensure_backfilled).
+BACKFILL_MARKER = "env_stats_backfill"
+STAT_COLUMNS = ["n"] + [f"{kind}_{v}" for v in VARIABLES.values() for kind in ("n", "sum", "sumsq")]
+
+
+# ---------------- Maintenance ----------------
+def chunk_stats(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-species sufficient statistics of one batch of new sightings. `frame`
+    needs species_id plus the sightings variable columns (NaN for missing).
+    """
+    values = pd.DataFrame({"species_id": frame["species_id"].to_numpy(), "n": 1})
+    for column, suffix in VARIABLES.items():
+        x = np.round(pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype=float), SCALES[suffix])
+        present = ~np.isnan(x)
+        values[f"n_{suffix}"] = present.astype(np.int64)
+        values[f"sum_{suffix}"] = np.where(present, x, 0.0)
+        values[f"sumsq_{suffix}"] = np.where(present, x * x, 0.0)
+    return values.groupby("species_id", sort=True).sum().reset_index()
+
+
+def apply_stats(db: Session, stats: pd.DataFrame) -> int:
+    """
+    Add a chunk_stats() frame to species_env_stats in the caller's transaction.
+    Rows are written in species_id order, so concurrent ingests lock them in
+    the same order and cannot deadlock each other.
+    """
+    if stats.empty:
+        return 0
+    stats = stats.sort_values("species_id")
+    rows = [
+        {"species_id": int(r.species_id), **{c: (int if c == "n" or c.startswith("n_") else float)(getattr(r, c)) for c in STAT_COLUMNS}}
+        for r in stats.itertuples(index=False)
+    ]
+    table = models.SpeciesEnvStats.__table__
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["species_id"],
+        set_={c: table.c[c] + stmt.excluded[c] for c in STAT_COLUMNS} | {"updated_at": text("now()")},
+    )
+    db.execute(stmt)
+    return len(rows)
+
+
+class PendingStats:
+    """
+    chunk_stats() of every batch of an ingest, merged in memory (one row per
+    species) and written with a single apply_stats() right before the commit.
+    Upserting per chunk would hold each species row lock from its first
+    chunk to the end of the transaction.
+    """
+
+    def __init__(self):
+        self.stats = pd.DataFrame(columns=["species_id"] + STAT_COLUMNS)
+
+    def add(self, frame: pd.DataFrame):
+        batch = chunk_stats(frame)
+        if self.stats.empty:
+            self.stats = batch
+        else:
+            self.stats = pd.concat([self.stats, batch]).groupby("species_id", sort=True).sum().reset_index()
+
+    def flush(self, db: Session) -> int:
+        written = apply_stats(db, self.stats)
+        self.stats = self.stats.iloc[0:0]
+        return written
+
+
+def rebuild(db: Session) -> int:
+    """
+    Recompute species_env_stats from sightings in one GROUP BY (backfill or
+    repair). The table lock makes concurrent ingests wait to write their
+    deltas until this commits, so none is counted twice or lost.
+    """
+    aggregates = ", ".join(
+        f"COUNT({column}), COALESCE(SUM({column}), 0), COALESCE(SUM({column}::float8 * {column}::float8), 0)"
+        for column in VARIABLES
+    )
+    db.execute(text("LOCK TABLE species_env_stats IN EXCLUSIVE MODE"))
+    db.execute(text("DELETE FROM species_env_stats"))
+    result = db.execute(text(f"""
+        INSERT INTO species_env_stats (species_id, {', '.join(STAT_COLUMNS)})
+        SELECT species_id, COUNT(*), {aggregates}
+        FROM sightings
+        WHERE species_id IS NOT NULL
+        GROUP BY species_id
+    """))
+    logger.info("Rebuilt species_env_stats for %d species", result.rowcount)
+    return result.rowcount
+
+
+def ensure_backfilled(bind) -> bool:
+    """
+    Build species_env_stats from the sightings already in the database, once.
+    Ingests only add their own rows, so a database that had sightings before
+    the table existed needs this before its first upload. Done is recorded as
+    the BACKFILL_MARKER data generation; True if this call did the backfill.
+    """
+    with Session(bind) as db:
+        # Serializes workers starting at the same time; only the first one rebuilds.
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": BACKFILL_MARKER})
+        if versioned_cache.data_generation(db, BACKFILL_MARKER):
+            return False
+        rebuild(db)
+        versioned_cache.bump_generation(db, BACKFILL_MARKER)
+        db.commit()
+        refresh_correlation_view(db)
+    return True
+
+
+def load(db: Session) -> Dict[str, np.ndarray]:
+    """The whole summary table as column arrays (one row per species)."""
+    rows = db.execute(text(f"SELECT species_id, {', '.join(STAT_COLUMNS)} FROM species_env_stats ORDER BY species_id")).all()
+    columns = ["species_id"] + STAT_COLUMNS
+    if not rows:
+        return {c: np.empty(0) for c in columns}
+    matrix = np.array(rows, dtype=float)
+    return {c: matrix[:, i] for i, c in enumerate(columns)}
+
+
+# ---------------- Correlations ----------------
+def correlations(stats: Dict[str, np.ndarray]) -> List[dict]:
+    """
+    Point-biserial correlation between "sighting is species s" and each
+    variable, for every species, from the sufficient statistics alone:
+    r = (S_s/N - mean * p) / (std * sqrt(p (1 - p))) with p = n_s / N,
+    where N, n_s count rows with that variable present. O(#species) per variable.
+    """
+    results = []
+    if not len(stats["species_id"]):
+        return results
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for column, suffix in VARIABLES.items():
+            n_s, sum_s, sumsq_s = stats[f"n_{suffix}"], stats[f"sum_{suffix}"], stats[f"sumsq_{suffix}"]
+            N = n_s.sum()
+            if N == 0:
+                continue
+            mean = sum_s.sum() / N
+            std = math.sqrt(max(sumsq_s.sum() / N - mean * mean, 0.0))
+            p = n_s / N
+            r = (sum_s / N - mean * p) / (std * np.sqrt(p * (1 - p)))
+            valid = (std > 0) & (p > 0) & (p < 1) & np.isfinite(r)
+            for i in np.flatnonzero(valid):
+                results.append({
+                    "species_id": int(stats["species_id"][i]),
+                    "variable": column,
+                    "n": int(stats["n"][i]),
+                    "n_obs": int(n_s[i]),
+                    "n_total": int(N),
+                    "correlation": float(np.clip(r[i], -1.0, 1.0)),
+                })
+    return results
+
+
+def strongest(results: List[dict], thresholds=(30, 20, 10, 5)) -> dict:
+    """
+    The strongest |r| among species with at least `threshold` sightings, for
+    the first threshold that yields a non-zero correlation, evaluated over
+    one precomputed result list.
+    """
+    ranked = sorted(results, key=lambda r: abs(r["correlation"]), reverse=True)
+    for min_count in thresholds:
+        for row in ranked:
+            if row["n"] >= min_count and row["correlation"] != 0.0:
+                return {"correlation": row["correlation"], "variable": row["variable"], "species_id": row["species_id"]}
+    return {"correlation": 0.0, "variable": None, "species_id": None}
+
+
+# ---------------- Materialized Ranking ----------------
+# Every species x variable correlation in one query over species_env_stats,
+# ranked by |r|, with the t statistic for significance. Refreshed after ingest.
+CORRELATION_VIEW_SQL = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS species_correlations AS
+WITH long AS (
+  SELECT species_id, n, 'sea_surface_temp_c' AS variable, n_sst AS k, sum_sst AS sx, sumsq_sst AS sxx FROM species_env_stats
+  UNION ALL
+  SELECT species_id, n, 'salinity_psu', n_sal, sum_sal, sumsq_sal FROM species_env_stats
+  UNION ALL
+  SELECT species_id, n, 'chlorophyll_mg_m3', n_chl, sum_chl, sumsq_chl FROM species_env_stats
+),
+totals AS (
+  SELECT variable, SUM(k)::float8 AS big_n, SUM(sx) AS big_s, SUM(sxx) AS big_ss
+  FROM long GROUP BY variable HAVING SUM(k) > 0
+),
+scored AS (
+  SELECT l.species_id, l.variable, l.n, l.k AS n_obs, t.big_n::bigint AS n_total,
+         (l.sx / t.big_n - (t.big_s / t.big_n) * (l.k / t.big_n))
+         / NULLIF(sqrt(GREATEST(t.big_ss / t.big_n - (t.big_s / t.big_n) ^ 2, 0))
+                  * sqrt((l.k / t.big_n) * (1 - l.k / t.big_n)), 0) AS correlation
+  FROM long l JOIN totals t USING (variable)
+)
+SELECT species_id, variable, n, n_obs, n_total, correlation,
+       correlation * sqrt((n_total - 2) / NULLIF(1 - correlation ^ 2, 0)) AS t_stat,
+       RANK() OVER (ORDER BY abs(correlation) DESC) AS rank
+FROM scored
+WHERE correlation IS NOT NULL
+"""
+
+
+def ensure_correlation_view(bind):
+    """Create the species_correlations materialized view (and the unique index REFRESH ... CONCURRENTLY needs)."""
+    with bind.begin() as conn:
+        conn.execute(text(CORRELATION_VIEW_SQL))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_species_correlations_key ON species_correlations (species_id, variable)"
+        ))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_species_correlations_rank ON species_correlations (rank)"))
+
+
+def refresh_correlation_view(db: Session):
+    """
+    Recompute the ranking after an ingest commit; readers keep the old rows
+    meanwhile. Failures are logged, not raised, so they never fail an ingest.
+    The data generation is bumped again with it, so nothing cached from the
+    old ranking between the ingest commit and the refresh outlives it.
+    """
+    try:
+        db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY species_correlations"))
+        versioned_cache.bump_generation(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning("Could not refresh species_correlations: %s", e)
+
+
+def p_value(t_stat, n_total):
+    """
+    Two-sided p-value of a correlation's t statistic, from Student's t with
+    n_total - 2 degrees of freedom (n_total = rows the r was computed over).
+    Scalars or arrays; a None t (|r| = 1) gives 0. Shared with region_sweep,
+    so /api/correlations and the sweep agree on significance.
+    """
+    if t_stat is None:
+        return 0.0
+    p = 2 * scipy_stats.t.sf(np.abs(t_stat), np.asarray(n_total) - 2)
+    return float(p) if np.ndim(p) == 0 else p
+
+
+def ranked_correlations(db: Session, top: int = None, min_count: int = 0, variable: str = None) -> List[dict]:
+    """Rows of species_correlations best first, with species names and a p-value."""
+    sql = """
+        SELECT c.species_id, sp.scientific_name, sp.common_name, c.variable, c.n, c.n_obs, c.n_total,
+               c.correlation, c.t_stat, c.rank
+        FROM species_correlations c JOIN species sp ON sp.id = c.species_id
+        WHERE c.n >= :min_count AND (CAST(:variable AS text) IS NULL OR c.variable = :variable)
+        ORDER BY c.rank
+    """
+    params = {"min_count": min_count, "variable": variable}
+    if top:
+        sql += " LIMIT :top"
+        params["top"] = top
+    rows = []
+    for row in db.execute(text(sql), params).mappings():
+        p = p_value(row["t_stat"], row["n_total"])
+        rows.append({
+            **row,
+            "correlation": float(row["correlation"]),
+            "t_stat": float(row["t_stat"]) if row["t_stat"] is not None else None,
+            "p_value": p,
+            "significant": p < 0.05,
+        })
+    return rows
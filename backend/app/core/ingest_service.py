@@ -0,0 +1,296 @@
+# app/core/ingest_service.py
+import io
+import os
+import csv
+import time
+import logging
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+
+from app import models
+from app.database import SessionLocal
+from app.core.minio_client import get_minio_client
+from app.core import env_stats, versioned_cache
+
+logger = logging.getLogger(__name__)
+
+# Rows parsed per pandas chunk. Memory use is bounded by this, not by the file size.
+INGEST_CHUNK_SIZE = 50_000
+
+# Column order written by COPY; must match the CSV produced in copy_sightings.
+COPY_COLUMNS = (
+    "species_id",
+    "sighting_date",
+    "sea_surface_temp_c",
+    "salinity_psu",
+    "chlorophyll_mg_m3",
+    "location",
+)
+
+SKIP_REASONS = ("malformed", "not_species", "missing_species", "bad_date", "bad_coordinates")
+
+
+# ---------------- Chunk Cleaning ----------------
+def sniff_separator(source: BinaryIO, filename: str) -> str:
+    """Detect the delimiter from the header line, like read_csv(sep=None) did, without its slow python engine."""
+    default = "\t" if filename.lower().endswith(".tsv") else ","
+    position = source.tell()
+    header = source.readline(64 * 1024).decode("utf-8", errors="ignore")
+    source.seek(position)
+    try:
+        return csv.Sniffer().sniff(header, delimiters=",\t;|").delimiter
+    except csv.Error:
+        return default
+
+
+class MalformedLines:
+    """
+    on_bad_lines hook for read_csv(engine="python"): drops lines with the
+    wrong number of fields, counting them so they show up as "malformed"
+    skips instead of vanishing. (The C engine's "skip" cannot count them.)
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, fields):
+        self.count += 1
+        return None
+
+    def take(self) -> int:
+        """Lines dropped since the previous call."""
+        count, self.count = self.count, 0
+        return count
+
+
+def _numeric_column(df: pd.DataFrame, column: str) -> pd.Series:
+    if column not in df:
+        return pd.Series(np.nan, index=df.index)
+    return pd.to_numeric(df[column], errors="coerce")
+
+
+def clean_sightings_chunk(
+    df: pd.DataFrame,
+    require_species_rank: bool = True,
+    dayfirst: bool = True,
+) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    Vectorized equivalent of the old per-row loop in /api/upload/csv.
+    Expects lower-cased GBIF column names. Returns the cleaned frame with
+    columns scientific_name, sighting_date, sst, sss, chl, location (EWKT)
+    plus a dict of skipped-row counts per reason.
+    """
+    skipped = dict.fromkeys(SKIP_REASONS, 0)
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+
+    if require_species_rank:
+        rank = df["taxonrank"].astype(str).str.strip().str.lower() if "taxonrank" in df else pd.Series("", index=df.index)
+        keep = rank == "species"
+        skipped["not_species"] = int((~keep).sum())
+        df = df[keep]
+
+    names = df["scientificname"] if "scientificname" in df else pd.Series(np.nan, index=df.index, dtype=object)
+    names = names.astype("string").str.strip()
+    keep = names.notna() & (names != "")
+    skipped["missing_species"] = int((~keep).sum())
+    df, names = df[keep], names[keep]
+
+    raw_dates = df["eventdate"].astype(str) if "eventdate" in df else pd.Series("", index=df.index)
+    dates = pd.to_datetime(raw_dates, dayfirst=dayfirst, errors="coerce", format="mixed")
+    keep = dates.notna()
+    skipped["bad_date"] = int((~keep).sum())
+    df, names, dates = df[keep], names[keep], dates[keep]
+
+    lat = _numeric_column(df, "decimallatitude")
+    lon = _numeric_column(df, "decimallongitude")
+    keep = lat.between(-90, 90) & lon.between(-180, 180)
+    skipped["bad_coordinates"] = int((~keep).sum())
+    df, names, dates, lat, lon = df[keep], names[keep], dates[keep], lat[keep], lon[keep]
+
+    cleaned = pd.DataFrame({
+        "scientific_name": names.astype(object),
+        "sighting_date": dates.dt.strftime("%Y-%m-%d"),
+        "sst": _numeric_column(df, "sst"),
+        "sss": _numeric_column(df, "sss"),
+        "chl": _numeric_column(df, "chlorophyll"),
+        # EWKT is accepted directly by the geometry input function, so COPY needs no Shapely objects.
+        "location": "SRID=4326;POINT(" + lon.astype(str) + " " + lat.astype(str) + ")",
+    })
+    return cleaned, skipped
+
+
+# ---------------- Species Resolution ----------------
+def load_species_map(db: Session) -> Dict[str, int]:
+    """Preload the scientific_name -> id map once per ingest."""
+    rows = db.query(models.Species.scientific_name, models.Species.id).all()
+    return {name: species_id for name, species_id in rows}
+
+
+def ensure_species(db: Session, names, species_map: Dict[str, int]) -> int:
+    """
+    Insert any names missing from species_map in one statement and update the map.
+    Returns the number of species actually created.
+    """
+    missing = sorted({n for n in names if n not in species_map})
+    if not missing:
+        return 0
+
+    stmt = (
+        insert(models.Species)
+        .values([{"scientific_name": n} for n in missing])
+        .on_conflict_do_nothing(index_elements=["scientific_name"])
+        .returning(models.Species.id, models.Species.scientific_name)
+    )
+    created = db.execute(stmt).all()
+    for species_id, name in created:
+        species_map[name] = species_id
+
+    # Names inserted concurrently by another upload are not returned above.
+    leftover = [n for n in missing if n not in species_map]
+    if leftover:
+        rows = db.query(models.Species.scientific_name, models.Species.id).filter(
+            models.Species.scientific_name.in_(leftover)
+        )
+        species_map.update({name: species_id for name, species_id in rows})
+    return len(created)
+
+
+# ---------------- COPY Writer ----------------
+def copy_sightings(db: Session, cleaned: pd.DataFrame, species_map: Dict[str, int],
+                   pending: env_stats.PendingStats) -> int:
+    """
+    Stream one cleaned chunk into sightings through COPY on the session's
+    connection and add it to `pending`; the caller flushes that into
+    species_env_stats in the same transaction, right before committing.
+    """
+    if cleaned.empty:
+        return 0
+
+    out = pd.DataFrame({
+        "species_id": cleaned["scientific_name"].map(species_map).astype("int64"),
+        "sighting_date": cleaned["sighting_date"],
+        "sea_surface_temp_c": cleaned["sst"],
+        "salinity_psu": cleaned["sss"],
+        "chlorophyll_mg_m3": cleaned["chl"],
+        "location": cleaned["location"],
+    })
+    buffer = io.StringIO()
+    out.to_csv(buffer, header=False, index=False, na_rep="")
+    buffer.seek(0)
+
+    raw = db.connection().connection
+    with raw.cursor() as cur:
+        cur.copy_expert(
+            f"COPY sightings ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    pending.add(out)
+    return len(out)
+
+
+# ---------------- Public API ----------------
+def ingest_sightings_csv(
+    db: Session,
+    source: BinaryIO,
+    sep: str = ",",
+    chunksize: int = INGEST_CHUNK_SIZE,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Stream a GBIF-style CSV/TSV into sightings chunk by chunk.
+    Everything runs in the caller's transaction; the caller commits.
+    species_env_stats is updated once, after the last chunk, so the running
+    statistics never disagree with the committed rows.
+    `progress`, if given, is called with the running stats after every chunk.
+    """
+    started = time.perf_counter()
+    species_map = load_species_map(db)
+    pending = env_stats.PendingStats()
+    stats = {
+        "rows_read": 0,
+        "species_added": 0,
+        "sightings_added": 0,
+        "rows_skipped": 0,
+        "skipped": dict.fromkeys(SKIP_REASONS, 0),
+    }
+
+    malformed = MalformedLines()
+    reader = pd.read_csv(source, sep=sep, chunksize=chunksize, dtype=str, engine="python", on_bad_lines=malformed)
+    for chunk in reader:
+        cleaned, skipped = clean_sightings_chunk(chunk)
+        skipped["malformed"] = malformed.take()
+        stats["species_added"] += ensure_species(db, cleaned["scientific_name"].unique(), species_map)
+        stats["sightings_added"] += copy_sightings(db, cleaned, species_map, pending)
+        stats["rows_read"] += len(chunk) + skipped["malformed"]
+        for reason, count in skipped.items():
+            stats["skipped"][reason] += count
+        stats["rows_skipped"] = sum(stats["skipped"].values())
+
+        elapsed = time.perf_counter() - started
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["rows_per_second"] = round(stats["rows_read"] / elapsed, 1) if elapsed > 0 else None
+        logger.info(
+            "Ingested %d rows (%d sightings, %d skipped) at %.0f rows/s",
+            stats["rows_read"], stats["sightings_added"], stats["rows_skipped"], stats["rows_per_second"] or 0,
+        )
+        if progress:
+            progress(stats)
+
+    pending.flush(db)
+    stats.setdefault("elapsed_seconds", round(time.perf_counter() - started, 3))
+    stats.setdefault("rows_per_second", None)
+    return stats
+
+
+# ---------------- Background Job ----------------
+def run_csv_upload_job(report: Callable[[dict], None], path: str, filename: str, minio_path: str) -> dict:
+    """
+    Job body for /api/upload/csv: back the file up to MinIO, then stream it into Postgres.
+    Runs on the job_queue worker pool with its own session; deletes `path` when done.
+    """
+    db = SessionLocal()
+    try:
+        file_size = os.path.getsize(path)
+        report({"stage": "backup", "bytes_total": file_size})
+        with open(path, "rb") as handle:
+            get_minio_client().put_object("sightings", minio_path, handle, file_size, content_type="text/csv")
+
+        with open(path, "rb") as handle:
+            sep = sniff_separator(handle, filename)
+
+            def progress(stats: dict):
+                bytes_read = min(handle.tell(), file_size)
+                report({
+                    "stage": "load",
+                    **stats,
+                    "bytes_read": bytes_read,
+                    "bytes_total": file_size,
+                    "percent": round(100.0 * bytes_read / file_size, 1) if file_size else 100.0,
+                })
+
+            stats = ingest_sightings_csv(db, handle, sep=sep, progress=progress)
+        # One bump per upload, taken last: the data_generations row is locked only for the commit.
+        versioned_cache.bump_generation(db)
+        db.commit()
+        env_stats.refresh_correlation_view(db)
+        report({"stage": "done", **stats, "bytes_read": file_size, "bytes_total": file_size, "percent": 100.0})
+
+        return {
+            "success": True,
+            "species_added": stats["species_added"],
+            "sightings_added": stats["sightings_added"],
+            "rows_skipped": stats["rows_skipped"],
+            "skipped": stats["skipped"],
+            "rows_per_second": stats["rows_per_second"],
+            "minio_path": minio_path,
+        }
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        os.remove(path)
@@ -0,0 +1,145 @@
+# app/core/job_queue.py
+import os
+import copy
+import json
+import time
+import uuid
+import shutil
+import tempfile
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Worker Pool ----------------
+JOB_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+JOB_TTL_SECONDS = int(os.getenv("INGEST_JOB_TTL", 24 * 3600))
+
+executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="ingest")
+
+_jobs: Dict[str, dict] = {}
+_lock = threading.Lock()
+
+# ---------------- Redis Setup ----------------
+# Job state is mirrored to Redis so any API worker can answer GET /api/jobs/{id}.
+try:
+    redis_client = redis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        decode_responses=True,
+    )
+    _ = redis_client.ping()
+except Exception:
+    redis_client = None
+    logger.info("Redis not available — job state kept in-process only")
+
+
+def _job_key(job_id: str) -> str:
+    return f"tattva:job:{job_id}"
+
+
+def _save(job: dict):
+    # Stored as a snapshot: the runner keeps mutating its own dict while readers serialize this one.
+    with _lock:
+        _jobs[job["id"]] = copy.deepcopy(job)
+    if not redis_client:
+        return
+    try:
+        redis_client.setex(_job_key(job["id"]), JOB_TTL_SECONDS, json.dumps(job, default=str))
+    except Exception as e:
+        logger.warning("Redis SET failed for job %s: %s", job["id"], e)
+
+
+def _expire_old_jobs():
+    cutoff = time.time() - JOB_TTL_SECONDS
+    with _lock:
+        for job_id in [j for j, job in _jobs.items() if (job.get("finished_at") or time.time()) < cutoff]:
+            del _jobs[job_id]
+
+
+# ---------------- Runner ----------------
+def _run(job_id: str, fn: Callable, args: tuple, kwargs: dict):
+    job = dict(get_job(job_id))
+    job["status"] = "running"
+    job["started_at"] = time.time()
+    _save(job)
+
+    def report(progress: Dict[str, Any]):
+        job["progress"] = dict(progress)
+        job["elapsed_seconds"] = round(time.time() - job["started_at"], 3)
+        _save(job)
+
+    try:
+        job["result"] = fn(report, *args, **kwargs)
+        job["status"] = "succeeded"
+    except Exception as e:
+        logger.error("Job %s (%s) failed: %s", job_id, job["kind"], e, exc_info=True)
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished_at"] = time.time()
+        job["elapsed_seconds"] = round(job["finished_at"] - job["started_at"], 3)
+        _save(job)
+
+
+# ---------------- Public API ----------------
+def persist_upload(upload: BinaryIO, suffix: str) -> str:
+    """
+    Copy an UploadFile's stream to a temp file that outlives the request.
+    The job that receives the path is responsible for deleting it.
+    """
+    upload.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        shutil.copyfileobj(upload, tmp, length=1024 * 1024)
+        return tmp.name
+
+
+def discard_upload(path: str):
+    """Delete a persist_upload() copy; a no-op if it is already gone."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def submit(kind: str, fn: Callable, *args, **kwargs) -> str:
+    """
+    Queue fn(report, *args, **kwargs) on the worker pool and return the job id.
+    fn calls report({...}) with progress counters; its return value becomes the job result.
+    """
+    _expire_old_jobs()
+    job_id = uuid.uuid4().hex
+    _save({
+        "id": job_id,
+        "kind": kind,
+        "status": "queued",
+        "progress": {},
+        "result": None,
+        "error": None,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "elapsed_seconds": None,
+    })
+    executor.submit(_run, job_id, fn, args, kwargs)
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """A copy of the job's current state, safe to serialize while the job keeps running."""
+    with _lock:
+        job = copy.deepcopy(_jobs.get(job_id))
+    if job is not None:
+        return job
+    if not redis_client:
+        return None
+    try:
+        raw = redis_client.get(_job_key(job_id))
+        return json.loads(raw) if raw else None
+    except Exception as e:
+        logger.warning("Redis GET failed for job %s: %s", job_id, e)
+        return None
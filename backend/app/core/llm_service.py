@@ -1,11 +1,12 @@
 # app/core/llm_service.py
 
 import os
+import calendar
 import google.generativeai as genai
-import redis
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from app import models
+from app.core.versioned_cache import VersionedCache
 import chromadb
 from chromadb.utils import embedding_functions
 
@@ -16,15 +17,18 @@ genai.configure(api_key=GEMINI_API_KEY)
 # Initialize the model
 model = genai.GenerativeModel('gemini-pro-latest')
 
-# Redis client
-redis_client = redis.Redis(
-    host=os.getenv("REDIS_HOST", "localhost"),
-    port=int(os.getenv("REDIS_PORT", 6379)),
-    decode_responses=True
-)
+# Hypotheses are cached per finding and data generation (see app.core.versioned_cache),
+# so only one request calls Gemini per new finding and the rest get the previous text meanwhile.
+HYPOTHESIS_CACHE_TTL = int(os.getenv("HYPOTHESIS_CACHE_TTL", 600))
+hypothesis_cache = VersionedCache("hypothesis", ttl=HYPOTHESIS_CACHE_TTL)
+
 
-def cached_hypothesis_key():
-    return "tattva:hypothesis:latest"
+def cached_hypothesis_key(finding: dict):
+    # One slot per finding; sweep findings are additionally scoped to their partition.
+    prefix = "latest"
+    if finding.get("scope"):
+        prefix = f"{finding['scope']}:{finding.get('cell') or '*'}:{finding.get('month') or '*'}"
+    return f"{prefix}:{finding.get('species_id')}:{finding.get('variable')}"
 
 # === Setup Chroma ===
 chroma_client = chromadb.HttpClient(host="localhost", port=8001)
@@ -39,18 +43,28 @@ collection = chroma_client.get_or_create_collection(
 # Hypothesis Generator
 # -----------------------
 
-def generate_hypothesis_from_finding(correlation_finding: dict) -> str:
-    cache_key = cached_hypothesis_key()
-    cached = redis_client.get(cache_key)
-    if cached:
-        return cached
-
+def generate_hypothesis_from_finding(correlation_finding: dict, generation: int = 0) -> str:
     if not correlation_finding or correlation_finding.get("error"):
         return "No significant correlations were found in the current dataset."
 
+    try:
+        return hypothesis_cache.get_or_compute(
+            generation, cached_hypothesis_key(correlation_finding), lambda: _generate_hypothesis(correlation_finding)
+        )
+    except Exception as e:
+        print(f"Error calling Gemini API: {e}")
+        return "Failed to generate hypothesis due to an API error."
+
+
+def _generate_hypothesis(correlation_finding: dict) -> str:
     correlation_value = correlation_finding.get("correlation", 0.0)
     variable = correlation_finding.get("variable") or "Unknown variable"
     species_name = correlation_finding.get("species_name") or "Unknown species"
+    scope_lines = ""
+    if correlation_finding.get("cell"):
+        scope_lines += f"\n    - Region: geohash cell {correlation_finding['cell']}"
+    if correlation_finding.get("month"):
+        scope_lines += f"\n    - Month: {calendar.month_name[correlation_finding['month']]}"
 
     prompt = f"""
     You are a marine biology research assistant. Your task is to translate a raw statistical finding into a concise, insightful scientific hypothesis.
@@ -58,7 +72,7 @@ def generate_hypothesis_from_finding(correlation_finding: dict) -> str:
     **Statistical Finding:**
     - Correlation Coefficient: {correlation_value:.2f}
     - Environmental Variable: {variable}
-    - Species: {species_name}
+    - Species: {species_name}{scope_lines}
 
     **Instructions:**
     1. Analyze the direction of the correlation (positive or negative).
@@ -69,14 +83,9 @@ def generate_hypothesis_from_finding(correlation_finding: dict) -> str:
     **Generate the hypothesis for the finding provided above:**
     """
 
-    try:
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        redis_client.setex(cache_key, 600, text)
-        return text
-    except Exception as e:
-        print(f"Error calling Gemini API: {e}")
-        return "Failed to generate hypothesis due to an API error."
+    # Errors propagate so a failed call is never cached.
+    response = model.generate_content(prompt)
+    return response.text.strip()
 
 
 # ------------------------
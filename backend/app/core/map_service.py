@@ -0,0 +1,274 @@
+# app/core/map_service.py
+import os
+import math
+import logging
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+
+from app.core import versioned_cache
+from app.core.sightings_service import sighting_filters
+from app.ml.prediction_cache import TieredCache
+
+logger = logging.getLogger(__name__)
+
+# From this zoom level on the map gets individual sightings instead of clusters...
+POINTS_MIN_ZOOM = int(os.getenv("MAP_POINTS_MIN_ZOOM", 11))
+# ...as long as the viewport holds at most this many; denser views stay clustered.
+MAX_POINTS = int(os.getenv("MAP_MAX_POINTS", 5000))
+# Approximate cluster size on screen: a 256 px tile is split into 4 x 4 cells.
+CELLS_PER_TILE = 4
+# Hard cap on grid cells per cluster response; wider views get a coarser grid.
+MAX_CLUSTER_CELLS = int(os.getenv("MAP_MAX_CLUSTER_CELLS", 4096))
+MAP_CACHE_TTL = int(os.getenv("MAP_CACHE_TTL", 300))
+
+# Vector tiles: extent and buffer in tile units, clustered below POINTS_MIN_ZOOM on a
+# TILE_GRID x TILE_GRID grid per tile. Rendered tiles are cached per data generation.
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+TILE_GRID = 32
+TILE_CACHE_SIZE = int(os.getenv("MAP_TILE_CACHE_SIZE", 2048))
+TILE_CACHE_TTL = int(os.getenv("MAP_TILE_CACHE_TTL", 24 * 3600))
+WEB_MERCATOR_WIDTH = 40075016.685578488  # metres
+
+# Cluster views repeat a lot (every client opens on the same world view), so
+# they are cached per data generation like the correlation results.
+cluster_cache = versioned_cache.VersionedCache("clusters", ttl=MAP_CACHE_TTL)
+
+# Tiles are binary, so they get their own non-decoding Redis client.
+try:
+    tile_redis = redis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+    )
+    _ = tile_redis.ping()
+except Exception:
+    tile_redis = None
+    logger.info("Redis not available — vector tiles cached in-process only")
+
+tile_cache = TieredCache(maxsize=TILE_CACHE_SIZE, ttl=TILE_CACHE_TTL, client=tile_redis, raw=True)
+
+BBox = Tuple[float, float, float, float]  # min_lon, min_lat, max_lon, max_lat
+
+
+def tile_size(zoom: int) -> float:
+    """Edge in degrees of a zoom-level tile on the lon/lat grid the clusters are built on."""
+    return 360.0 / (2 ** zoom)
+
+
+def cell_size(zoom: int) -> float:
+    """Grid cell edge in degrees for a web-map zoom level."""
+    return tile_size(zoom) / CELLS_PER_TILE
+
+
+def covering_tiles(zoom: int, bbox: Optional[BBox]) -> Tuple[int, int, int, int]:
+    """Range (x0, y0, x1, y1), end-exclusive, of zoom-level tiles covering bbox (the world if None)."""
+    size = tile_size(zoom)
+    min_lon, min_lat, max_lon, max_lat = bbox or (-180.0, -90.0, 180.0, 90.0)
+    columns, rows = 2 ** zoom, math.ceil(180.0 / size)
+    x0 = min(max(math.floor((min_lon + 180.0) / size), 0), columns - 1)
+    y0 = min(max(math.floor((min_lat + 90.0) / size), 0), rows - 1)
+    x1 = max(min(math.ceil((max_lon + 180.0) / size), columns), x0 + 1)
+    y1 = max(min(math.ceil((max_lat + 90.0) / size), rows), y0 + 1)
+    return x0, y0, x1, y1
+
+
+def tiles_bbox(zoom: int, tiles: Tuple[int, int, int, int]) -> BBox:
+    size = tile_size(zoom)
+    x0, y0, x1, y1 = tiles
+    return x0 * size - 180.0, y0 * size - 90.0, min(x1 * size - 180.0, 180.0), min(y1 * size - 90.0, 90.0)
+
+
+def cluster_grid(zoom: int, bbox: Optional[BBox]) -> Tuple[int, Tuple[int, int, int, int]]:
+    """
+    Zoom level of the cluster grid for a view and the tiles it covers: the
+    requested zoom, or the finest coarser one that keeps the view within
+    MAX_CLUSTER_CELLS cells. Views snapped to whole tiles share cache entries
+    while panning inside them.
+    """
+    while True:
+        tiles = covering_tiles(zoom, bbox)
+        cells = (tiles[2] - tiles[0]) * (tiles[3] - tiles[1]) * CELLS_PER_TILE ** 2
+        if zoom == 0 or cells <= MAX_CLUSTER_CELLS:
+            return zoom, tiles
+        zoom -= 1
+
+
+def _species_names(db: Session, ids) -> Dict[int, dict]:
+    ids = sorted({i for i in ids if i is not None})
+    if not ids:
+        return {}
+    rows = db.execute(
+        text("SELECT id, scientific_name, common_name FROM species WHERE id = ANY(:ids)"), {"ids": ids}
+    ).mappings()
+    return {row["id"]: {"scientific_name": row["scientific_name"], "common_name": row["common_name"]} for row in rows}
+
+
+def clusters(db: Session, zoom: int, bbox: Optional[BBox] = None, species_id: Optional[int] = None) -> List[dict]:
+    """
+    Sightings aggregated on a ST_SnapToGrid grid sized for `zoom`: count,
+    centroid, dominant species (mode) and mean SST per non-empty cell, in one
+    GROUP BY inside PostGIS.
+    """
+    where, params = sighting_filters(bbox=bbox, species_id=species_id)
+    params["size"] = cell_size(zoom)
+    rows = db.execute(text(f"""
+        SELECT COUNT(*) AS count,
+               AVG(lat) AS latitude,
+               AVG(lon) AS longitude,
+               mode() WITHIN GROUP (ORDER BY species_id) AS species_id,
+               AVG(sea_surface_temp_c)::float8 AS mean_sst
+        FROM (
+            SELECT ST_SnapToGrid(s.location, :size) AS cell,
+                   ST_Y(s.location) AS lat,
+                   ST_X(s.location) AS lon,
+                   s.species_id,
+                   s.sea_surface_temp_c
+            FROM sightings s
+            WHERE {where}
+        ) c
+        GROUP BY ST_X(cell), ST_Y(cell)
+    """), params).mappings().all()
+    return [
+        {
+            "count": int(row["count"]),
+            "latitude": round(float(row["latitude"]), 5),
+            "longitude": round(float(row["longitude"]), 5),
+            "species_id": row["species_id"],
+            "mean_sst": round(row["mean_sst"], 2) if row["mean_sst"] is not None else None,
+        }
+        for row in rows
+    ]
+
+
+def points(db: Session, bbox: Optional[BBox] = None, species_id: Optional[int] = None,
+           limit: int = MAX_POINTS) -> List[dict]:
+    """Individual sightings in the viewport, at most `limit` + 1 so callers can tell it was cut."""
+    where, params = sighting_filters(bbox=bbox, species_id=species_id)
+    params["limit"] = limit + 1
+    rows = db.execute(text(f"""
+        SELECT s.id, ST_Y(s.location) AS latitude, ST_X(s.location) AS longitude, s.species_id, s.sighting_date,
+               s.sea_surface_temp_c::float8 AS sea_surface_temp_c
+        FROM sightings s
+        WHERE {where}
+        ORDER BY s.sighting_date DESC
+        LIMIT :limit
+    """), params).mappings().all()
+    return [
+        {
+            "id": row["id"],
+            "latitude": row["latitude"],
+            "longitude": row["longitude"],
+            "species_id": row["species_id"],
+            "sighting_date": row["sighting_date"].isoformat(),
+            "sea_surface_temp_c": row["sea_surface_temp_c"],
+        }
+        for row in rows
+    ]
+
+
+def map_view(db: Session, zoom: int, bbox: Optional[BBox] = None, species_id: Optional[int] = None) -> dict:
+    """
+    What the map needs for one viewport: raw points once zoomed in far enough
+    (and the view holds at most MAX_POINTS), otherwise clusters over the
+    whole tiles covering the view, on a grid capped at MAX_CLUSTER_CELLS
+    cells. Species names are sent once in a side dictionary, not per feature.
+    """
+    if zoom >= POINTS_MIN_ZOOM:
+        rows = points(db, bbox, species_id)
+        if len(rows) <= MAX_POINTS:
+            return {
+                "mode": "points",
+                "zoom": zoom,
+                "points": rows,
+                "species": _species_names(db, (r["species_id"] for r in rows)),
+            }
+
+    grid_zoom, tiles = cluster_grid(zoom, bbox)
+    key = f"{grid_zoom}:{species_id}:{','.join(map(str, tiles))}"
+    generation = versioned_cache.data_generation(db)
+    cells = cluster_cache.get_or_compute(
+        generation, key, lambda: clusters(db, grid_zoom, tiles_bbox(grid_zoom, tiles), species_id)
+    )
+    return {
+        "mode": "clusters",
+        "zoom": zoom,
+        "grid_zoom": grid_zoom,
+        "cell_size_deg": cell_size(grid_zoom),
+        "total": sum(c["count"] for c in cells),
+        "clusters": cells,
+        "species": _species_names(db, (c["species_id"] for c in cells)),
+    }
+
+
+# ---------------- Vector Tiles ----------------
+def render_tile(db: Session, z: int, x: int, y: int, species_id: Optional[int] = None,
+                date_from: Optional[date] = None, date_to: Optional[date] = None) -> bytes:
+    """
+    One Mapbox Vector Tile built by PostGIS (ST_AsMVTGeom / ST_AsMVT). From
+    POINTS_MIN_ZOOM on it has a "sightings" layer with one feature per
+    sighting; below that a "clusters" layer of grid cells with count,
+    dominant species and mean SST, so low-zoom tiles stay small.
+    """
+    where, params = sighting_filters(species_id=species_id, date_from=date_from, date_to=date_to)
+    params.update(z=z, x=x, y=y, extent=TILE_EXTENT, buffer=TILE_BUFFER)
+    candidates = f"""
+        SELECT ST_Transform(s.location, 3857) AS geom, s.id, s.species_id, s.sighting_date,
+               s.sea_surface_temp_c::float8 AS sst
+        FROM sightings s, bounds b
+        WHERE s.location && ST_Transform(b.geom, 4326) AND {where}
+    """
+    if z >= POINTS_MIN_ZOOM:
+        sql = f"""
+            WITH bounds AS (SELECT ST_TileEnvelope(:z, :x, :y) AS geom),
+            candidates AS ({candidates})
+            SELECT ST_AsMVT(t, 'sightings', :extent, 'geom')
+            FROM (
+                SELECT ST_AsMVTGeom(c.geom, b.geom, :extent, :buffer, true) AS geom,
+                       c.id, c.species_id, c.sighting_date::text AS sighting_date, c.sst
+                FROM candidates c, bounds b
+            ) t
+            WHERE t.geom IS NOT NULL
+        """
+    else:
+        params["cell"] = WEB_MERCATOR_WIDTH / (2 ** z) / TILE_GRID
+        sql = f"""
+            WITH bounds AS (SELECT ST_TileEnvelope(:z, :x, :y) AS geom),
+            candidates AS ({candidates}),
+            cells AS (
+                SELECT ST_Centroid(ST_Collect(geom)) AS geom,
+                       COUNT(*) AS count,
+                       mode() WITHIN GROUP (ORDER BY species_id) AS species_id,
+                       AVG(sst) AS mean_sst
+                FROM candidates
+                GROUP BY ST_SnapToGrid(geom, :cell)
+            )
+            SELECT ST_AsMVT(t, 'clusters', :extent, 'geom')
+            FROM (
+                SELECT ST_AsMVTGeom(c.geom, b.geom, :extent, :buffer, true) AS geom,
+                       c.count, c.species_id, c.mean_sst
+                FROM cells c, bounds b
+            ) t
+            WHERE t.geom IS NOT NULL
+        """
+    tile = db.execute(text(sql), params).scalar()
+    return bytes(tile) if tile else b""
+
+
+def tile_key(generation: int, z: int, x: int, y: int, species_id: Optional[int],
+             date_from: Optional[date], date_to: Optional[date]) -> str:
+    return f"tattva:tile:sightings:g{generation}:{z}/{x}/{y}:{species_id}:{date_from}:{date_to}"
+
+
+def get_tile(db: Session, generation: int, z: int, x: int, y: int, species_id: Optional[int] = None,
+             date_from: Optional[date] = None, date_to: Optional[date] = None) -> bytes:
+    """render_tile() through the tile cache; a data generation bump makes every old key unreachable."""
+    key = tile_key(generation, z, x, y, species_id, date_from, date_to)
+    tile = tile_cache.get(key)
+    if tile is None:
+        tile = render_tile(db, z, x, y, species_id=species_id, date_from=date_from, date_to=date_to)
+        tile_cache.set(key, tile)
+    return tile
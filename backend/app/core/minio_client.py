@@ -1,5 +1,9 @@
+import io
 import os
+import queue
 import logging
+import threading
+from typing import BinaryIO, Optional
 from minio import Minio
 from minio.error import S3Error
 
@@ -39,3 +43,137 @@ def get_minio_client():
     """
     ensure_buckets_exist()
     return minio_client
+
+
+def put_if_absent(client: Minio, bucket: str, object_name: str, data: bytes,
+                  content_type: str = "application/octet-stream", metadata: Optional[dict] = None) -> bool:
+    """Store `data` unless the object already exists. Returns True when it was written."""
+    try:
+        client.stat_object(bucket, object_name)
+        return False
+    except S3Error as e:
+        if e.code not in ("NoSuchKey", "NoSuchObject"):
+            raise
+    client.put_object(bucket, object_name, io.BytesIO(data), len(data), content_type=content_type, metadata=metadata)
+    return True
+
+
+# ---------------- Streaming Uploads ----------------
+# Part size for multipart uploads of unknown length (MinIO minimum is 5 MiB).
+MULTIPART_PART_SIZE = int(os.getenv("MINIO_PART_SIZE", 16 * 1024 * 1024))
+
+
+class _QueueReader:
+    """File-like reader over a bounded queue of byte chunks, fed by StreamingUpload.write."""
+
+    def __init__(self, max_chunks: int):
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._buffer = bytearray()
+        self._eof = False
+
+    def put(self, chunk, timeout: float):
+        """Queue bytes, None for end-of-stream, or an exception to make the reader fail."""
+        self._queue.put(chunk, timeout=timeout)
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            chunk = self._queue.get()
+            if chunk is None:
+                self._eof = True
+            elif isinstance(chunk, BaseException):
+                raise chunk
+            else:
+                self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class StreamingUpload:
+    """
+    Upload an object of unknown length while it is being produced.
+    A background thread runs a multipart put_object that reads from a bounded
+    queue, so at most a few parts are held in memory at any time.
+
+        with StreamingUpload("edna", name) as upload:
+            upload.write(chunk)
+    """
+
+    def __init__(self, bucket: str, object_name: str, content_type: str = "application/octet-stream",
+                 client: Minio = None, max_chunks: int = 64):
+        self.bucket = bucket
+        self.object_name = object_name
+        self._reader = _QueueReader(max_chunks)
+        self._error = None
+        self.result = None
+        self.client = client or get_minio_client()
+        self._thread = threading.Thread(
+            target=self._run, args=(self.client, content_type), name=f"minio-upload-{object_name}", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, client: Minio, content_type: str):
+        try:
+            self.result = client.put_object(
+                self.bucket, self.object_name, self._reader, length=-1,
+                part_size=MULTIPART_PART_SIZE, content_type=content_type,
+            )
+        except Exception as e:
+            self._error = e
+
+    def _put(self, chunk: Optional[bytes]):
+        while True:
+            if self._error is not None:
+                raise RuntimeError(f"MinIO upload of {self.object_name} failed: {self._error}")
+            try:
+                self._reader.put(chunk, timeout=1.0)
+                return
+            except queue.Full:
+                if not self._thread.is_alive():
+                    raise RuntimeError(f"MinIO upload of {self.object_name} stopped unexpectedly")
+
+    def write(self, chunk: bytes):
+        if chunk:
+            self._put(bytes(chunk))
+
+    def close(self):
+        self._put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError(f"MinIO upload of {self.object_name} failed: {self._error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._thread.is_alive():
+            # Make the reader fail so put_object aborts instead of completing a partial object.
+            try:
+                self._reader.put(RuntimeError("upload aborted"), timeout=5.0)
+            except queue.Full:
+                pass
+        return False
+
+
+class TeeReader(io.RawIOBase):
+    """Binary reader that copies every chunk it returns into a StreamingUpload."""
+
+    def __init__(self, source: BinaryIO, sink: StreamingUpload):
+        self._source = source
+        self._sink = sink
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._source.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        self._sink.write(data)
+        self.bytes_read += n
+        return n
@@ -0,0 +1,329 @@
+# app/core/region_sweep.py
+import os
+import time
+import logging
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+
+from app import models
+from app.database import SessionLocal
+from app.core import analytics_engine, env_stats
+
+logger = logging.getLogger(__name__)
+
+# Geohash precision of the spatial cells (3 ~ 156 km x 156 km, 4 ~ 39 km x 20 km).
+GEOHASH_PRECISION = int(os.getenv("SWEEP_GEOHASH_PRECISION", 3))
+# region: one geohash cell, all year; season: one calendar month, everywhere; region_season: both.
+SCOPES = ("region", "season", "region_season")
+# Partitions with fewer sightings are skipped; species need MIN_SPECIES_COUNT within a partition.
+MIN_PARTITION_COUNT = int(os.getenv("SWEEP_MIN_PARTITION", 30))
+MIN_SPECIES_COUNT = int(os.getenv("SWEEP_MIN_SPECIES", 5))
+# False discovery rate of the stored findings: Benjamini-Hochberg adjusted p-values
+# (q_value) above this are not stored.
+MAX_P_VALUE = float(os.getenv("SWEEP_MAX_P_VALUE", 0.05))
+SWEEP_WORKERS = int(os.getenv("SWEEP_WORKERS", os.cpu_count() or 1))
+# Target rows per worker task; small sweeps run in-process.
+CHUNK_ROWS = 250_000
+
+_BASE32 = np.array(list("0123456789bcdefghjkmnpqrstuvwxyz"))
+
+
+# ---------------- Partitioning ----------------
+def geohash_codes(lat: np.ndarray, lon: np.ndarray, precision: int = GEOHASH_PRECISION) -> np.ndarray:
+    """
+    Geohash of every point as an integer (5 bits per character). Each axis is
+    quantized once and the bits interleaved, longitude first, which is the
+    same cell the usual bisection would give.
+    """
+    bits = 5 * precision
+    lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+    x = np.clip(((lon + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64), 0, (1 << lon_bits) - 1)
+    y = np.clip(((lat + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64), 0, (1 << lat_bits) - 1)
+    code = np.zeros(len(x), dtype=np.int64)
+    for i in range(bits):
+        # Bit i from the top: even positions come from longitude, odd from latitude.
+        if i % 2 == 0:
+            bit = (x >> (lon_bits - 1 - i // 2)) & 1
+        else:
+            bit = (y >> (lat_bits - 1 - i // 2)) & 1
+        code |= bit << (bits - 1 - i)
+    return code
+
+
+def geohash_strings(codes: np.ndarray, precision: int = GEOHASH_PRECISION) -> np.ndarray:
+    """Base32 text of geohash_codes() output."""
+    shifts = 5 * np.arange(precision - 1, -1, -1)
+    chars = _BASE32[(codes[:, None] >> shifts) & 31]
+    return np.ascontiguousarray(chars).view(f"<U{precision}").ravel()
+
+
+def partition_keys(columns: Dict[str, np.ndarray], scope: str, precision: int = GEOHASH_PRECISION) -> tuple:
+    """(key per row, cell text per row or None, month per row or None) for one scope."""
+    cells = months = None
+    if scope in ("region", "region_season"):
+        cells = geohash_codes(columns["lat"], columns["lon"], precision)
+    if scope in ("season", "region_season"):
+        months = columns["sighting_date"].astype("datetime64[M]").astype(np.int64) % 12 + 1
+    if scope == "region":
+        key = cells
+    elif scope == "season":
+        key = months
+    elif scope == "region_season":
+        key = cells * 16 + months
+    else:
+        raise ValueError(f"Unknown scope '{scope}', expected one of {SCOPES}")
+    return key, cells, months
+
+
+# ---------------- Worker ----------------
+def _sweep_chunk(partitions: np.ndarray, species: np.ndarray, values: Dict[str, np.ndarray],
+                 min_species: int, max_p: float) -> Tuple[List[dict], int]:
+    """
+    Correlations for every partition in one chunk of rows. `partitions` holds
+    chunk-local partition numbers 0..k-1. Per (partition, species) sufficient
+    statistics come from one bincount per column, and the point-biserial r of
+    env_stats.correlations() is evaluated for all partitions at once as a
+    (partition x species) array. Partitions can be small, so p comes from
+    Student's t with N - 2 degrees of freedom. Returns the findings with raw
+    p <= max_p and the number of tests run, for the sweep-wide correction.
+    Runs in a worker process.
+    """
+    species_ids, species_index = np.unique(species, return_inverse=True)
+    n_species = len(species_ids)
+    n_partitions = int(partitions.max()) + 1
+    group = partitions * n_species + species_index
+    size = n_partitions * n_species
+    counts = np.bincount(group, minlength=size).reshape(n_partitions, n_species)
+
+    findings, tests = [], 0
+    for column in env_stats.VARIABLES:
+        x = values[column]
+        present = ~np.isnan(x)
+        n_s = np.bincount(group[present], minlength=size).reshape(n_partitions, n_species).astype(float)
+        sum_s = np.bincount(group[present], weights=x[present], minlength=size).reshape(n_partitions, n_species)
+        sumsq_s = np.bincount(group[present], weights=x[present] ** 2, minlength=size).reshape(n_partitions, n_species)
+        N = n_s.sum(axis=1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = sum_s.sum(axis=1, keepdims=True) / N
+            std = np.sqrt(np.maximum(sumsq_s.sum(axis=1, keepdims=True) / N - mean * mean, 0.0))
+            p = n_s / N
+            r = (sum_s / N - mean * p) / (std * np.sqrt(p * (1 - p)))
+            t = r * np.sqrt((N - 2) / (1 - r * r))
+        tested = (counts >= min_species) & (N >= 3) & (std > 0) & (p > 0) & (p < 1) & (np.abs(r) < 1)
+        tests += int(tested.sum())
+        i, j = np.nonzero(tested)
+        p_values = env_stats.p_value(t[i, j], N[i, 0])
+        significant = p_values <= max_p
+        for i, j, p_value in zip(i[significant], j[significant], p_values[significant]):
+            findings.append({
+                "partition": int(i),
+                "species_id": int(species_ids[j]),
+                "variable": column,
+                "n": int(counts[i, j]),
+                "n_total": int(N[i, 0]),
+                "correlation": float(r[i, j]),
+                "strength": abs(float(r[i, j])),
+                "p_value": float(p_value),
+            })
+    return findings, tests
+
+
+def adjust_p_values(findings: List[dict], tests: int, max_q: float) -> List[dict]:
+    """
+    Benjamini-Hochberg over the whole sweep: sets q_value on every finding and
+    keeps those with q_value <= max_q. `findings` only needs the tests with
+    p <= max_q (q >= p, so the others can never pass); `tests` counts all of them.
+    """
+    findings = sorted(findings, key=lambda f: f["p_value"])
+    p = np.array([f["p_value"] for f in findings])
+    q = np.minimum.accumulate((p * tests / np.arange(1, len(p) + 1))[::-1])[::-1]
+    for finding, q_value in zip(findings, np.minimum(q, 1.0)):
+        finding["q_value"] = float(q_value)
+    return [f for f in findings if f["q_value"] <= max_q]
+
+
+def rank_findings(findings: List[dict]) -> List[dict]:
+    """Rank within each partition by adjusted significance, then |r|."""
+    findings.sort(key=lambda f: (f["scope"], f["cell"] or "", f["month"] or 0, f["q_value"], -f["strength"]))
+    rank, previous = 0, None
+    for finding in findings:
+        partition = (finding["scope"], finding["cell"], finding["month"])
+        rank = rank + 1 if partition == previous else 1
+        previous = partition
+        finding["rank"] = rank
+    return findings
+
+
+# ---------------- Sweep ----------------
+def sweep(columns: Dict[str, np.ndarray], scopes=SCOPES, precision: int = GEOHASH_PRECISION,
+          min_partition: int = MIN_PARTITION_COUNT, min_species: int = MIN_SPECIES_COUNT,
+          max_p: float = MAX_P_VALUE, workers: int = SWEEP_WORKERS) -> List[dict]:
+    """
+    Ranked significant species x variable correlations within every partition
+    of every scope. Rows are sorted by partition and cut into chunks on
+    partition boundaries, and the chunks are spread over a process pool.
+    The false discovery rate across all tests of the sweep is held at max_p.
+    """
+    valid = columns["species_id"] >= 0
+    columns = {c: a[valid] for c, a in columns.items()}
+    tasks = []
+    for scope in scopes:
+        key, cells, months = partition_keys(columns, scope, precision)
+        uniques, first, inverse, counts = np.unique(key, return_index=True, return_inverse=True, return_counts=True)
+        keep = counts >= min_partition
+        rows = np.flatnonzero(keep[inverse])
+        rows = rows[np.argsort(inverse[rows], kind="stable")]
+        if not len(rows):
+            continue
+        # Partition labels (cell text, month), looked up once per unique key.
+        kept = np.flatnonzero(keep)
+        labels = {
+            "cell": geohash_strings(cells[first[kept]], precision) if cells is not None else None,
+            "month": months[first[kept]] if months is not None else None,
+        }
+        # Chunk-local partition numbers 0..k-1, cut into chunks of ~CHUNK_ROWS.
+        local = np.searchsorted(kept, inverse[rows])
+        bounds = np.concatenate(([0], np.cumsum(counts[kept])))
+        edges = [0]
+        for target in range(CHUNK_ROWS, len(rows), CHUNK_ROWS):
+            edge = int(bounds[np.searchsorted(bounds, target)])
+            if edge > edges[-1] and edge < len(rows):
+                edges.append(edge)
+        edges.append(len(rows))
+        for start, stop in zip(edges[:-1], edges[1:]):
+            part = local[start:stop]
+            offset = int(part[0])
+            tasks.append({
+                "scope": scope,
+                "labels": labels,
+                "offset": offset,
+                "args": (
+                    part - offset,
+                    columns["species_id"][rows[start:stop]],
+                    {c: columns[c][rows[start:stop]] for c in env_stats.VARIABLES},
+                    min_species,
+                    max_p,
+                ),
+            })
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=mp.get_context("spawn")) as pool:
+            results = list(pool.map(_sweep_chunk, *zip(*[t["args"] for t in tasks])))
+    else:
+        results = [_sweep_chunk(*t["args"]) for t in tasks]
+
+    findings, tests = [], 0
+    for task, (chunk, chunk_tests) in zip(tasks, results):
+        labels = task["labels"]
+        tests += chunk_tests
+        for finding in chunk:
+            p = finding.pop("partition") + task["offset"]
+            findings.append({
+                "scope": task["scope"],
+                "cell": str(labels["cell"][p]) if labels["cell"] is not None else None,
+                "month": int(labels["month"][p]) if labels["month"] is not None else None,
+                **finding,
+            })
+    return rank_findings(adjust_p_values(findings, tests, max_p))
+
+
+# ---------------- Storage ----------------
+# Read order of stored findings: the stored per-partition rank first, so a
+# partition reads in rank order and a whole scope lists every partition's
+# rank-1 finding (best q, then |r|) before any rank-2 one. top_finding and
+# list_findings share it, so the hypothesis is always the first listed row.
+FINDINGS_ORDER = "f.rank, f.q_value, f.strength DESC, f.cell, f.month"
+
+FINDING_COLUMNS = ("scope", "cell", "month", "species_id", "variable", "n", "n_total", "correlation",
+                   "strength", "p_value", "q_value", "rank")
+
+
+def store_findings(db: Session, findings: List[dict], scopes=SCOPES) -> int:
+    """Replace the stored findings of `scopes` in the caller's transaction."""
+    table = models.CorrelationFinding.__table__
+    db.execute(table.delete().where(table.c.scope.in_(list(scopes))))
+    if findings:
+        db.execute(table.insert(), [{c: f[c] for c in FINDING_COLUMNS} for f in findings])
+    return len(findings)
+
+
+def top_finding(db: Session, scope: str, cell: Optional[str] = None, month: Optional[int] = None) -> Optional[dict]:
+    """
+    The rank-1 finding of one partition, or the most significant rank-1
+    finding of the whole scope when the partition is left open: the first
+    row list_findings returns. Both are a single index lookup.
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown scope '{scope}', expected one of {SCOPES}")
+    where, params = ["scope = :scope"], {"scope": scope}
+    if cell is not None:
+        where.append("cell = :cell")
+        params["cell"] = cell
+    if month is not None:
+        where.append("month = :month")
+        params["month"] = month
+    sql = f"""
+        SELECT scope, cell, month, species_id, variable, n, n_total, correlation, p_value, q_value, rank
+        FROM correlation_findings f
+        WHERE {' AND '.join(where)}
+        ORDER BY {FINDINGS_ORDER}
+        LIMIT 1
+    """
+    row = db.execute(text(sql), params).mappings().first()
+    return dict(row) if row else None
+
+
+def list_findings(db: Session, scope: str, cell: Optional[str] = None, month: Optional[int] = None,
+                  top: int = 50) -> List[dict]:
+    """Findings of one scope (optionally one partition) in FINDINGS_ORDER, with species names."""
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown scope '{scope}', expected one of {SCOPES}")
+    where, params = ["f.scope = :scope"], {"scope": scope, "top": top}
+    if cell is not None:
+        where.append("f.cell = :cell")
+        params["cell"] = cell
+    if month is not None:
+        where.append("f.month = :month")
+        params["month"] = month
+    sql = f"""
+        SELECT f.scope, f.cell, f.month, f.species_id, sp.scientific_name, sp.common_name, f.variable,
+               f.n, f.n_total, f.correlation, f.p_value, f.q_value, f.rank
+        FROM correlation_findings f JOIN species sp ON sp.id = f.species_id
+        WHERE {' AND '.join(where)}
+        ORDER BY {FINDINGS_ORDER}
+        LIMIT :top
+    """
+    return [dict(row) for row in db.execute(text(sql), params).mappings()]
+
+
+# ---------------- Job ----------------
+def run_sweep_job(report: Callable[[dict], None], scopes=SCOPES, precision: int = GEOHASH_PRECISION) -> dict:
+    """Job body for POST /api/analysis/sweep: snapshot, sweep on the process pool, replace stored findings."""
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        report({"stage": "snapshot"})
+        columns = analytics_engine.load_snapshot(db)
+        report({"stage": "sweep", "rows": int(len(columns["species_id"]))})
+        findings = sweep(columns, scopes=scopes, precision=precision)
+        report({"stage": "store", "findings": len(findings)})
+        store_findings(db, findings, scopes=scopes)
+        db.commit()
+        by_scope = {scope: sum(1 for f in findings if f["scope"] == scope) for scope in scopes}
+        logger.info("Correlation sweep stored %d findings in %.1fs", len(findings), time.perf_counter() - started)
+        return {
+            "success": True,
+            "rows": int(len(columns["species_id"])),
+            "findings": by_scope,
+            "geohash_precision": precision,
+        }
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
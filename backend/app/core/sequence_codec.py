@@ -0,0 +1,82 @@
+# app/core/sequence_codec.py
+import hashlib
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# A/C/G/T map to 0..3; anything else (N, IUPAC ambiguity codes, gaps) maps to AMBIGUOUS.
+AMBIGUOUS = 4
+
+_ENCODE_TABLE = np.full(256, AMBIGUOUS, dtype=np.uint8)
+for _code, _bases in enumerate(("Aa", "Cc", "Gg", "TtUu")):
+    for _base in _bases:
+        _ENCODE_TABLE[ord(_base)] = _code
+
+
+def normalize_sequence(sequence: str) -> str:
+    """Upper-case and strip whitespace/newlines from a pasted nucleotide sequence."""
+    return "".join(sequence.split()).upper()
+
+
+def encode_codes(sequence: str) -> np.ndarray:
+    """Map a nucleotide string to a uint8 array of 0..3 codes (AMBIGUOUS for non-ACGT)."""
+    raw = np.frombuffer(sequence.encode("ascii", errors="replace"), dtype=np.uint8)
+    return _ENCODE_TABLE[raw]
+
+
+# ---------------- 2-bit Packing ----------------
+# Packed layout: four bases per byte, first base in the high bits. U is
+# packed as T, the way encode_codes() reads it, so RNA reads match the same
+# whether a row is stored packed or plain. Every other character that is not
+# A/C/G/T (N, IUPAC codes, gaps) is stored as 0 in the packed bytes and
+# recorded in an exception list of [start, "run"] pairs, so unpacking is
+# lossless for upper-case DNA input.
+_DECODE_TABLE = np.frombuffer(b"ACGT", dtype=np.uint8)
+_SHIFTS = np.array([6, 4, 2, 0], dtype=np.uint8)
+_STRICT_TABLE = np.full(256, AMBIGUOUS, dtype=np.uint8)
+for _code, _base in enumerate("ACGT"):
+    _STRICT_TABLE[ord(_base)] = _code
+_STRICT_TABLE[ord("U")] = 3
+
+
+def sequence_hash(sequence: str) -> str:
+    """SHA-256 of the normalized sequence; used for exact-match lookups."""
+    return hashlib.sha256(normalize_sequence(sequence).encode("ascii", errors="replace")).hexdigest()
+
+
+def pack_sequence(sequence: str) -> Tuple[bytes, int, List[list]]:
+    """Pack a sequence into (2-bit bytes, length, exceptions). Case is not preserved and U unpacks as T."""
+    sequence = normalize_sequence(sequence)
+    raw = np.frombuffer(sequence.encode("ascii", errors="replace"), dtype=np.uint8)
+    codes = _STRICT_TABLE[raw]
+
+    exceptions = []
+    ambiguous = codes == AMBIGUOUS
+    if ambiguous.any():
+        edges = np.diff(np.concatenate(([0], ambiguous.view(np.int8), [0])))
+        for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+            exceptions.append([int(start), sequence[start:end]])
+        codes = np.where(ambiguous, 0, codes).astype(np.uint8)
+
+    padded = np.zeros(-(-len(codes) // 4) * 4, dtype=np.uint8)
+    padded[: len(codes)] = codes
+    packed = np.bitwise_or.reduce(padded.reshape(-1, 4) << _SHIFTS, axis=1).astype(np.uint8)
+    return packed.tobytes(), len(sequence), exceptions
+
+
+def unpack_codes(packed: bytes, length: int, exceptions: Optional[List[list]] = None) -> np.ndarray:
+    """Unpack straight to base codes (AMBIGUOUS at exception positions) without building a string."""
+    raw = np.frombuffer(packed, dtype=np.uint8)
+    codes = ((raw[:, None] >> _SHIFTS) & 3).ravel()[:length].copy()
+    for start, run in exceptions or ():
+        codes[start : start + len(run)] = AMBIGUOUS
+    return codes
+
+
+def unpack_sequence(packed: bytes, length: int, exceptions: Optional[List[list]] = None) -> str:
+    raw = np.frombuffer(packed, dtype=np.uint8)
+    codes = ((raw[:, None] >> _SHIFTS) & 3).ravel()[:length]
+    chars = bytearray(_DECODE_TABLE[codes].tobytes())
+    for start, run in exceptions or ():
+        chars[start : start + len(run)] = run.encode("ascii")
+    return chars.decode("ascii")
@@ -0,0 +1,225 @@
+# app/core/sightings_service.py
+import io
+import csv
+import base64
+import logging
+from datetime import date
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip from the server-side cursor; memory stays at one batch.
+EXPORT_BATCH_SIZE = 10_000
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXPORT_COLUMNS = (
+    "id", "sighting_date", "latitude", "longitude", "species_id", "scientific_name",
+    "sea_surface_temp_c", "salinity_psu", "chlorophyll_mg_m3",
+)
+
+
+# ---------------- Keyset Cursor ----------------
+def encode_cursor(sighting_date: date, sighting_id: int) -> str:
+    """Opaque page token for the position after (sighting_date, id)."""
+    raw = f"{sighting_date.isoformat()}|{sighting_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    """Inverse of encode_cursor(); ValueError if the token is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        day, sighting_id = raw.split("|")
+        return date.fromisoformat(day), int(sighting_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+# ---------------- Filters ----------------
+def sighting_filters(bbox=None, species_id: Optional[int] = None, date_from: Optional[date] = None,
+                      date_to: Optional[date] = None) -> Tuple[str, dict]:
+    """SQL WHERE clause over sightings aliased `s` (bbox via the GiST && operator) and its parameters."""
+    where, params = ["s.location IS NOT NULL"], {}
+    if bbox is not None:
+        where.append("s.location && ST_MakeEnvelope(:min_lon, :min_lat, :max_lon, :max_lat, 4326)")
+        params.update(zip(("min_lon", "min_lat", "max_lon", "max_lat"), bbox))
+    if species_id is not None:
+        where.append("s.species_id = :species_id")
+        params["species_id"] = species_id
+    if date_from is not None:
+        where.append("s.sighting_date >= :date_from")
+        params["date_from"] = date_from
+    if date_to is not None:
+        where.append("s.sighting_date <= :date_to")
+        params["date_to"] = date_to
+    return " AND ".join(where), params
+
+
+# ---------------- Compact Page ----------------
+COMPACT_COLUMNS = (
+    "id", "sighting_date", "latitude", "longitude", "species_id",
+    "sea_surface_temp_c", "salinity_psu", "chlorophyll_mg_m3",
+)
+SIGHTING_ID_PREFIX = "CMLRE-SIGHT-"
+
+
+def columnar(rows: Sequence[tuple], names=COMPACT_COLUMNS) -> dict:
+    """Row tuples -> {column name: list of values}."""
+    if not rows:
+        return {name: [] for name in names}
+    return {name: list(values) for name, values in zip(names, zip(*rows))}
+
+
+def compact_page(db: Session, limit: int, bbox=None, after: Optional[Tuple[date, int]] = None,
+                 species_id: Optional[int] = None) -> dict:
+    """
+    One /api/sightings page in normalized, columnar form: each field is one
+    array over the page, and every species appears once in a side dictionary
+    keyed by id instead of being repeated (with its description and habitat)
+    in every row. Built from plain tuples; no per-row models.
+    """
+    where, params = sighting_filters(bbox=bbox, species_id=species_id)
+    if after is not None:
+        where += " AND (s.sighting_date, s.id) < (:after_date, :after_id)"
+        params.update(after_date=after[0], after_id=after[1])
+    params["limit"] = limit
+    rows = db.execute(text(f"""
+        SELECT s.id, s.sighting_date, ST_Y(s.location), ST_X(s.location), s.species_id,
+               s.sea_surface_temp_c::float8, s.salinity_psu::float8, s.chlorophyll_mg_m3::float8
+        FROM sightings s
+        WHERE {where}
+        ORDER BY s.sighting_date DESC, s.id DESC
+        LIMIT :limit
+    """), params).all()
+
+    columns = columnar(rows)
+    species = {}
+    ids = sorted({i for i in columns["species_id"] if i is not None})
+    if ids:
+        for row in db.execute(text(
+            "SELECT id, scientific_name, common_name, description, habitat FROM species WHERE id = ANY(:ids)"
+        ), {"ids": ids}).mappings():
+            species[row["id"]] = {k: v for k, v in row.items() if k != "id" and v is not None}
+    return {
+        "count": len(rows),
+        "sighting_id_prefix": SIGHTING_ID_PREFIX,
+        "columns": columns,
+        "species": species,
+        "next_cursor": encode_cursor(rows[-1][1], rows[-1][0]) if rows and len(rows) == limit else None,
+    }
+
+
+def dumps(payload) -> bytes:
+    """orjson encoding (dates, non-string dict keys) for responses that skip FastAPI's encoder."""
+    return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+
+
+# ---------------- Export Encoders ----------------
+def encode_ndjson(batches: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    """One JSON object per line, a chunk of bytes per batch."""
+    for batch in batches:
+        yield b"".join(orjson.dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in batch)
+
+
+def encode_csv(batches: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back out in pieces while keeping tell() absolute."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        out, self._chunks = b"".join(self._chunks), []
+        return out
+
+
+def encode_parquet(batches: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    """One Parquet row group per batch."""
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("sighting_date", pa.date32()),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("species_id", pa.int64()),
+        ("scientific_name", pa.string()),
+        ("sea_surface_temp_c", pa.float64()),
+        ("salinity_psu", pa.float64()),
+        ("chlorophyll_mg_m3", pa.float64()),
+    ])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for batch in batches:
+            columns = list(zip(*batch)) if batch else [[] for _ in EXPORT_COLUMNS]
+            writer.write_table(pa.Table.from_arrays([pa.array(c, type=f.type) for c, f in zip(columns, schema)], schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+ENCODERS = {"ndjson": encode_ndjson, "csv": encode_csv, "parquet": encode_parquet}
+
+
+# ---------------- Export ----------------
+def stream_rows(where: str, params: dict, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[tuple]]:
+    """
+    Matching sightings in id order through a server-side (named) cursor, a
+    batch at a time. Opens its own session: it runs while the response is
+    streamed, after the request's session is gone.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            text(f"""
+                SELECT s.id, s.sighting_date, ST_Y(s.location), ST_X(s.location), s.species_id, sp.scientific_name,
+                       s.sea_surface_temp_c::float8, s.salinity_psu::float8, s.chlorophyll_mg_m3::float8
+                FROM sightings s LEFT JOIN species sp ON sp.id = s.species_id
+                WHERE {where}
+                ORDER BY s.id
+            """).execution_options(stream_results=True, yield_per=batch_size),
+            params,
+        )
+        for batch in result.partitions():
+            yield [tuple(row) for row in batch]
+    finally:
+        db.close()
+
+
+def export(fmt: str, **filters) -> Iterator[bytes]:
+    """Encoded export of every matching sighting, in constant memory."""
+    where, params = sighting_filters(**filters)
+    return ENCODERS[fmt](stream_rows(where, params))
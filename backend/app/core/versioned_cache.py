@@ -0,0 +1,243 @@
+# app/core/versioned_cache.py
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import redis
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from sqlalchemy.dialects.postgresql import insert
+
+from app import models
+
+logger = logging.getLogger(__name__)
+
+# How long an expired value may still be served while one request refreshes it.
+STALE_TTL_SECONDS = int(os.getenv("CACHE_STALE_TTL", 3600))
+# Single-flight lock lifetime; must outlast the slowest recompute (a Gemini call).
+LOCK_TTL_SECONDS = int(os.getenv("CACHE_LOCK_TTL", 60))
+# With nothing stale to serve, other requests wait this long for the lock holder.
+WAIT_SECONDS = float(os.getenv("CACHE_WAIT_SECONDS", 30))
+_POLL_SECONDS = 0.05
+
+# ---------------- Redis Setup ----------------
+try:
+    redis_client = redis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        decode_responses=True,
+    )
+    _ = redis_client.ping()
+except Exception:
+    redis_client = None
+    logger.info("Redis not available — versioned caches kept in-process only")
+
+# Delete the lock only if we still hold it (it may have expired and been re-taken).
+_RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+# Every VersionedCache, for stats()
+_caches = []
+
+
+# ---------------- Data Generation ----------------
+def data_generation(db: Session, name: str = "sightings") -> int:
+    """Current generation of a data set; 0 until the first bump."""
+    value = db.execute(text("SELECT generation FROM data_generations WHERE name = :name"), {"name": name}).scalar()
+    return int(value or 0)
+
+
+def bump_generation(db: Session, name: str = "sightings"):
+    """
+    Advance a generation in the caller's transaction, so cached results keyed
+    on the old generation stop being served the moment the new rows commit.
+    Call it once, right before the commit: every writer shares this row and
+    its lock is held until the transaction ends.
+    """
+    table = models.DataGeneration.__table__
+    stmt = insert(table).values(name=name, generation=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"generation": table.c.generation + 1, "updated_at": text("now()")},
+    )
+    db.execute(stmt)
+
+
+# ---------------- Cache ----------------
+class VersionedCache:
+    """
+    JSON values keyed by (version, key), in Redis or in-process when Redis is
+    absent. On a miss only one caller recomputes (Redis SET NX lock, or a
+    per-key threading.Lock); the others are served the previous value - an
+    expired entry or the last value of an older version - or, if there is
+    none, wait for the lock holder's result.
+    """
+
+    def __init__(self, namespace: str, ttl: int, client=redis_client,
+                 stale_ttl: int = STALE_TTL_SECONDS, lock_ttl: int = LOCK_TTL_SECONDS):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.lock_ttl = lock_ttl
+        self.client = client
+        self._local: Dict[str, tuple] = {}              # key -> (entry, hard expiry) without Redis
+        self._locks: Dict[str, threading.Lock] = {}
+        self._mutex = threading.Lock()
+        self._counts = {"hits": 0, "stale": 0, "misses": 0, "refreshes": 0, "waits": 0, "errors": 0}
+        self._compute_seconds = 0.0
+        _caches.append(self)
+
+    def _key(self, version, key: str) -> str:
+        return f"tattva:{self.namespace}:v{version}:{key}"
+
+    def _last_key(self, key: str) -> str:
+        return f"tattva:{self.namespace}:last:{key}"
+
+    def _count(self, name: str, seconds: float = 0.0):
+        with self._mutex:
+            self._counts[name] += 1
+            self._compute_seconds += seconds
+
+    # ---------------- Storage ----------------
+    def _read(self, key: str) -> Optional[dict]:
+        if self.client is None:
+            with self._mutex:
+                item = self._local.get(key)
+            return item[0] if item and item[1] > time.time() else None
+        try:
+            raw = self.client.get(key)
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning("Redis GET failed for %s: %s", key, e)
+            return None
+
+    def _write(self, version, key: str, value: Any):
+        entry = {"value": value, "version": version, "expires_at": time.time() + self.ttl}
+        lifetime = self.ttl + self.stale_ttl
+        if self.client is None:
+            now = time.time()
+            with self._mutex:
+                for old in [k for k, (_, expiry) in self._local.items() if expiry <= now]:
+                    del self._local[old]
+                self._local[self._key(version, key)] = (entry, now + lifetime)
+                self._local[self._last_key(key)] = (entry, now + lifetime)
+            return
+        try:
+            raw = json.dumps(entry)
+            pipe = self.client.pipeline()
+            pipe.setex(self._key(version, key), lifetime, raw)
+            pipe.setex(self._last_key(key), lifetime, raw)
+            pipe.execute()
+        except Exception as e:
+            logger.warning("Redis SET failed for %s: %s", key, e)
+
+    # ---------------- Single-flight ----------------
+    def _acquire(self, key: str):
+        """A token if this caller may recompute `key`, else None."""
+        if self.client is None:
+            with self._mutex:
+                lock = self._locks.setdefault(key, threading.Lock())
+            return lock if lock.acquire(blocking=False) else None
+        token = uuid.uuid4().hex
+        try:
+            return token if self.client.set(f"{key}:lock", token, nx=True, ex=self.lock_ttl) else None
+        except Exception as e:
+            logger.warning("Redis lock failed for %s: %s", key, e)
+            return token
+
+    def _release(self, key: str, token):
+        if self.client is None:
+            with self._mutex:
+                self._locks.pop(key, None)
+            token.release()
+            return
+        try:
+            self.client.eval(_RELEASE_SCRIPT, 1, f"{key}:lock", token)
+        except Exception as e:
+            logger.warning("Redis unlock failed for %s: %s", key, e)
+
+    def _locked(self, key: str) -> bool:
+        if self.client is None:
+            with self._mutex:
+                lock = self._locks.get(key)
+            return lock is not None and lock.locked()
+        try:
+            return bool(self.client.exists(f"{key}:lock"))
+        except Exception:
+            return False
+
+    # ---------------- Public API ----------------
+    def get_or_compute(self, version, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        The value of `key` at `version`, calling compute() at most once across
+        concurrent callers. compute() must return something JSON-serializable;
+        if it raises while an older value exists, the older value is served.
+        """
+        full_key = self._key(version, key)
+        entry = self._read(full_key)
+        if entry and time.time() < entry["expires_at"]:
+            self._count("hits")
+            return entry["value"]
+        stale = entry or self._read(self._last_key(key))
+
+        token = self._acquire(full_key)
+        if token is not None:
+            try:
+                # Another caller may have refreshed it between our read and the lock.
+                entry = self._read(full_key)
+                if entry and time.time() < entry["expires_at"]:
+                    self._count("hits")
+                    return entry["value"]
+                return self._compute(version, key, compute, stale, "refreshes" if stale else "misses")
+            finally:
+                self._release(full_key, token)
+
+        if stale is not None:
+            self._count("stale")
+            return stale["value"]
+
+        # Nothing to serve yet: wait for the lock holder rather than recomputing alongside it.
+        self._count("waits")
+        deadline = time.time() + WAIT_SECONDS
+        while time.time() < deadline:
+            time.sleep(_POLL_SECONDS)
+            entry = self._read(full_key)
+            if entry:
+                return entry["value"]
+            if not self._locked(full_key):
+                break
+        return self._compute(version, key, compute, None, "misses")
+
+    def _compute(self, version, key: str, compute: Callable[[], Any], stale: Optional[dict], outcome: str):
+        started = time.perf_counter()
+        try:
+            value = compute()
+        except Exception as e:
+            self._count("errors")
+            if stale is None:
+                raise
+            logger.warning("Recomputing %s:%s failed, serving previous value: %s", self.namespace, key, e)
+            return stale["value"]
+        self._count(outcome, time.perf_counter() - started)
+        self._write(version, key, value)
+        return value
+
+    def stats(self) -> dict:
+        with self._mutex:
+            counts = dict(self._counts)
+            compute_seconds = self._compute_seconds
+        lookups = counts["hits"] + counts["stale"] + counts["misses"] + counts["refreshes"] + counts["waits"]
+        computed = counts["misses"] + counts["refreshes"]
+        return {
+            **counts,
+            "hit_ratio": round((counts["hits"] + counts["stale"]) / lookups, 4) if lookups else None,
+            "mean_compute_ms": round(compute_seconds * 1000 / computed, 1) if computed else None,
+            "backend": "redis" if self.client is not None else "memory",
+        }
+
+
+def stats() -> dict:
+    return {cache.namespace: cache.stats() for cache in _caches}
@@ -1,41 +1,70 @@
 # main.py
-from fastapi import FastAPI, Depends, UploadFile, File, HTTPException, APIRouter
+from fastapi import FastAPI, Depends, UploadFile, File, HTTPException, APIRouter, Query, Request, BackgroundTasks
+from fastapi.responses import StreamingResponse, JSONResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, tuple_
 from minio import Minio
+import os
 import uuid
+import json
+import zipfile
+import mimetypes
+import time
 import logging
-from pydantic import BaseModel
-import pandas as pd
-from app.models import EdnaSequence
+from datetime import date
+from pydantic import BaseModel, ValidationError
 from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
-from Bio import SeqIO
 from difflib import SequenceMatcher
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
 # --- Local imports ---
 from app import models, schemas
 from app.database import SessionLocal, engine, get_db
-from app.core.minio_client import get_minio_client
+from app.core.minio_client import get_minio_client, put_if_absent
 from app.ml.classifier import otolith_classifier
-from app.core import analysis_service, llm_service
+from app.ml.inference import otolith_scheduler
+from app.ml import prediction_cache, similarity
+from app.ml.similarity import otolith_index
+from app.core import analysis_service, analytics_engine, llm_service, ingest_service, edna_service, edna_index, env_stats, job_queue, map_service, region_sweep, sightings_service, versioned_cache
+from app.core.sequence_codec import normalize_sequence
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
 # Create all tables
 models.Base.metadata.create_all(bind=engine)
+env_stats.ensure_correlation_view(engine)
+env_stats.ensure_backfilled(engine)
+
+# Load and warm the otolith model in the background at startup so the first
+# classification does not pay for it. Workers that never classify can set
+# OTOLITH_WARMUP=false and skip importing TensorFlow entirely.
+OTOLITH_WARMUP = os.getenv("OTOLITH_WARMUP", "true").lower() == "true"
+# Add newly stored otoliths to the similarity index (one extra embedding pass per new image).
+OTOLITH_INDEX_UPLOADS = os.getenv("OTOLITH_INDEX_UPLOADS", "true").lower() == "true"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if OTOLITH_WARMUP:
+        otolith_classifier.warm_up_in_background()
+    yield
+
 
 # Initialize FastAPI
 app = FastAPI(
     title="Tattva Backend",
     description="Backend for SIH 2025 AI-Driven Marine Data Platform",
     version="1.0.0",
-    docs_url=None
+    docs_url=None,
+    lifespan=lifespan
 )
 
 # --- Swagger ---
@@ -71,21 +100,53 @@ async def get_all_species(db: Session = Depends(get_db)):
 
 
 # --- Sightings ---
+def _parse_bbox(min_lat, min_lon, max_lat, max_lon) -> Optional[tuple]:
+    """(min_lon, min_lat, max_lon, max_lat) if all four are given, else None; 400 if invalid."""
+    if not all(v is not None for v in (min_lat, min_lon, max_lat, max_lon)):
+        return None
+    if not (-90 <= min_lat <= 90 and -90 <= max_lat <= 90 and
+            -180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise HTTPException(status_code=400, detail="Invalid bbox coordinates")
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Invalid bbox: min values must be <= max values")
+    return (min_lon, min_lat, max_lon, max_lat)
+
+
 @app.get("/api/sightings", tags=["Sightings"])
 async def get_sightings_data(
+    response: Response,
     db: Session = Depends(get_db),
     limit: int = 300,
     min_lat: Optional[float] = None,
     min_lon: Optional[float] = None,
     max_lat: Optional[float] = None,
     max_lon: Optional[float] = None,
+    cursor: Optional[str] = None,
+    format: str = Query("rows", pattern="^(rows|compact)$"),
 ):
+    """
+    Sightings newest first. Pages are keyset-based on (sighting_date, id):
+    when more rows follow, the X-Next-Cursor header holds the token to pass
+    as `cursor` for the next page, so deep pages cost the same as the first.
+    format=compact returns columnar arrays plus a species dictionary
+    (see sightings_service.compact_page) encoded straight with orjson.
+    """
     try:
-        MAX_LIMIT = 5000
-        if limit is None or limit <= 0:
-            limit = 300
-        if limit > MAX_LIMIT:
-            limit = MAX_LIMIT
+        after = sightings_service.decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    MAX_LIMIT = 5000
+    if limit is None or limit <= 0:
+        limit = 300
+    if limit > MAX_LIMIT:
+        limit = MAX_LIMIT
+
+    try:
+        if format == "compact":
+            bbox = _parse_bbox(min_lat, min_lon, max_lat, max_lon)
+            page = sightings_service.compact_page(db, limit, bbox=bbox, after=after)
+            headers = {"X-Next-Cursor": page["next_cursor"]} if page["next_cursor"] else None
+            return Response(content=sightings_service.dumps(page), media_type="application/json", headers=headers)
 
         query = db.query(
             models.Sighting.id,
@@ -106,19 +167,19 @@ async def get_sightings_data(
         query = query.filter(models.Sighting.location.isnot(None))
 
         # Bounding box filter if provided
-        if all(v is not None for v in (min_lat, min_lon, max_lat, max_lon)):
-            if not (-90 <= min_lat <= 90 and -90 <= max_lat <= 90 and
-                    -180 <= min_lon <= 180 and -180 <= max_lon <= 180):
-                raise HTTPException(status_code=400, detail="Invalid bbox coordinates")
-            if min_lat > max_lat or min_lon > max_lon:
-                raise HTTPException(status_code=400, detail="Invalid bbox: min values must be <= max values")
-
-            envelope = func.ST_MakeEnvelope(min_lon, min_lat, max_lon, max_lat, 4326)
+        bbox = _parse_bbox(min_lat, min_lon, max_lat, max_lon)
+        if bbox is not None:
+            envelope = func.ST_MakeEnvelope(*bbox, 4326)
             query = query.filter(func.ST_Intersects(models.Sighting.location, envelope))
 
-        # Latest first
-        query = query.order_by(models.Sighting.sighting_date.desc())
+        # Latest first; id breaks ties so the keyset order is total
+        if after is not None:
+            query = query.filter(tuple_(models.Sighting.sighting_date, models.Sighting.id) < tuple_(*after))
+        query = query.order_by(models.Sighting.sighting_date.desc(), models.Sighting.id.desc())
         query_results = query.limit(limit).all()
+        if len(query_results) == limit:
+            last = query_results[-1]
+            response.headers["X-Next-Cursor"] = sightings_service.encode_cursor(last.sighting_date, last.id)
 
         response_data = []
         for row in query_results:
@@ -151,37 +212,377 @@ async def get_sightings_data(
 
         return response_data
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error fetching sightings: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+@app.get("/api/sightings/export", tags=["Sightings"])
+def export_sightings(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+    min_lat: Optional[float] = None,
+    min_lon: Optional[float] = None,
+    max_lat: Optional[float] = None,
+    max_lon: Optional[float] = None,
+    species_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    """
+    Every matching sighting as NDJSON, CSV or Parquet, streamed from a
+    server-side cursor a batch at a time, so memory stays flat no matter
+    how many rows are exported.
+    """
+    bbox = _parse_bbox(min_lat, min_lon, max_lat, max_lon)
+    stream = sightings_service.export(format, bbox=bbox, species_id=species_id, date_from=date_from, date_to=date_to)
+    return StreamingResponse(
+        stream,
+        media_type=sightings_service.EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="sightings.{format}"'},
+    )
+
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+
+@app.get("/api/tiles/sightings/{z}/{x}/{y}.mvt", tags=["Sightings"],
+         response_class=Response, responses={200: {"content": {MVT_MEDIA_TYPE: {}}}})
+def get_sightings_tile(
+    request: Request,
+    z: int,
+    x: int,
+    y: int,
+    species_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Sightings as a Mapbox Vector Tile rendered by PostGIS: per-sighting
+    features from map_service.POINTS_MIN_ZOOM on, grid clusters below.
+    Tiles are cached per data generation, which also serves as the ETag.
+    """
+    if not 0 <= z <= 22 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Invalid tile coordinates")
+    generation = versioned_cache.data_generation(db)
+    etag = f'W/"g{generation}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={map_service.MAP_CACHE_TTL}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    try:
+        tile = map_service.get_tile(db, generation, z, x, y, species_id=species_id, date_from=date_from, date_to=date_to)
+    except Exception as e:
+        logging.error(f"Error rendering tile {z}/{x}/{y}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+    if not tile:
+        return Response(status_code=204, headers=headers)
+    return Response(content=tile, media_type=MVT_MEDIA_TYPE, headers=headers)
+
+
+@app.get("/api/sightings/map", tags=["Sightings"])
+def get_sightings_map(
+    zoom: int = Query(..., ge=0, le=22),
+    min_lat: Optional[float] = None,
+    min_lon: Optional[float] = None,
+    max_lat: Optional[float] = None,
+    max_lon: Optional[float] = None,
+    species_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Zoom-aware map data covering every sighting in the viewport: grid
+    clusters (count, dominant species, mean SST) below zoom
+    map_service.POINTS_MIN_ZOOM, raw points from there on while the view
+    holds at most map_service.MAX_POINTS of them.
+    """
+    bbox = _parse_bbox(min_lat, min_lon, max_lat, max_lon)
+    try:
+        return map_service.map_view(db, zoom, bbox=bbox, species_id=species_id)
+    except Exception as e:
+        logging.error(f"Error building sightings map: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
 
 # --- Classify Otolith ---
 @app.post("/api/classify_otolith", tags=["AI Models"])
-async def classify_otolith_image(db: Session = Depends(get_db),
+async def classify_otolith_image(background_tasks: BackgroundTasks,
+                                 db: Session = Depends(get_db),
                                  minio: Minio = Depends(get_minio_client),
                                  file: UploadFile = File(...)):
     try:
         contents = await file.read()
-        prediction_results = otolith_classifier.predict(contents)
-        file_extension = file.filename.split('.')[-1]
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        object_name = f"{prediction_results['predicted_species'].replace(' ', '_')}/{unique_filename}"
-        file.file.seek(0)
-        file_size = len(contents)
-        minio.put_object("otoliths", object_name, file.file, file_size, content_type=file.content_type)
+        # Re-submitted photos are answered from the cache and stored once, under their digest.
+        digest = prediction_cache.image_digest(contents)
+        model_version = otolith_classifier.model_version
+        prediction_results = await run_in_threadpool(prediction_cache.get_prediction, digest, model_version)
+        if prediction_results is None:
+            prediction_results = await otolith_scheduler.predict(contents)
+            await run_in_threadpool(prediction_cache.set_prediction, digest, model_version, prediction_results)
+
+        if "error" not in prediction_results and await run_in_threadpool(prediction_cache.get_object_name, digest) is None:
+            species = prediction_results['predicted_species']
+            object_name = otolith_object_name(digest)
+            stored = await run_in_threadpool(
+                put_if_absent, minio, "otoliths", object_name, contents,
+                file.content_type or "application/octet-stream", {"species": species},
+            )
+            await run_in_threadpool(prediction_cache.set_object_name, digest, object_name)
+            if stored and OTOLITH_INDEX_UPLOADS:
+                background_tasks.add_task(_index_otolith, object_name, species, contents)
         return prediction_results
     except Exception as e:
         logging.error(f"Error in classify_otolith_image: {e}", exc_info=True)
         return {"error": str(e)}
 
+
+def otolith_object_name(digest: str) -> str:
+    """
+    MinIO name of an uploaded otolith. It depends on the image bytes alone, so a
+    photo is stored once however often it is sent or whatever it is classified
+    as; the predicted species travels in the object's metadata.
+    """
+    return f"sha256/{digest}"
+
+
+def _index_otolith(object_name: str, species: str, contents: bytes):
+    """Background task: embed a newly stored otolith and add it to the similarity index."""
+    try:
+        otolith_index.ensure_loaded()
+        version = otolith_classifier.embedding_version
+        if otolith_index.version not in (None, version):
+            logging.warning("Otolith index is stale; run index_otoliths.py --rebuild")
+            return
+        vectors, errors = otolith_classifier.embed_images([contents])
+        if errors:
+            return
+        # The table is what other workers (and restarts) see; the local add is immediate.
+        db = SessionLocal()
+        try:
+            similarity.record_upload(db, object_name, species, version, vectors[0])
+            db.commit()
+        finally:
+            db.close()
+        otolith_index.add(vectors, [object_name], [species], source="upload", version=version)
+    except Exception as e:
+        logging.error(f"Error indexing otolith {object_name}: {e}", exc_info=True)
+
+
+@app.post("/api/otoliths/similar", tags=["AI Models"])
+def find_similar_otoliths(file: UploadFile = File(...), k: int = Query(5, ge=1, le=50),
+                          db: Session = Depends(get_db)):
+    """
+    The k stored/reference otoliths nearest to an uploaded image by embedding
+    cosine similarity, plus an open-set verdict: "novel" when even the best
+    match falls below OTOLITH_NOVELTY_THRESHOLD.
+    """
+    # Same per-image cap as the batch endpoint; one byte past it means the upload is too large.
+    contents = file.file.read(MAX_BATCH_IMAGE_BYTES + 1)
+    if len(contents) > MAX_BATCH_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail=f"{file.filename} is larger than {MAX_BATCH_IMAGE_BYTES} bytes")
+    vectors, errors = otolith_classifier.embed_images([contents])
+    if errors:
+        raise HTTPException(status_code=400, detail=f"Could not decode image: {errors[0]}")
+
+    otolith_index.ensure_loaded()
+    otolith_index.sync(db, otolith_classifier.embedding_version)
+    if not len(otolith_index):
+        raise HTTPException(status_code=503, detail="Otolith index is empty; run index_otoliths.py")
+    started = time.perf_counter()
+    neighbors = otolith_index.search(vectors[0], k=k)
+    return {
+        "neighbors": neighbors,
+        **similarity.assess(neighbors),
+        "index_size": len(otolith_index),
+        "stale_index": otolith_index.version not in (None, otolith_classifier.embedding_version),
+        "search_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+@app.get("/api/classify_otolith/ready", tags=["AI Models"])
+async def classify_otolith_ready():
+    """Readiness probe: 200 once the classifier is loaded and warmed up, 503 before that."""
+    readiness = otolith_classifier.readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+
+@app.get("/api/classify_otolith/stats", tags=["AI Models"])
+async def classify_otolith_stats():
+    """Latency percentiles, batch sizes and throughput of the micro-batching scheduler, plus cache hit rates."""
+    return {**otolith_scheduler.stats(), "cache": prediction_cache.stats()}
+
+
+OTOLITH_IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+MAX_BATCH_IMAGES = 1000
+# Byte limits checked before anything is read or decompressed, so a small zip
+# bomb is rejected instead of being expanded into worker memory.
+MAX_BATCH_IMAGE_BYTES = int(os.getenv("MAX_BATCH_IMAGE_BYTES", 20 * 1024 * 1024))
+MAX_BATCH_TOTAL_BYTES = int(os.getenv("MAX_BATCH_TOTAL_BYTES", 512 * 1024 * 1024))
+
+
+def _collect_batch_images(files: List[UploadFile]) -> List[tuple]:
+    """Flatten uploaded images and .zip archives into (filename, bytes) pairs, within the batch limits."""
+    images, total_bytes = [], 0
+
+    def add(name: str, declared_size: int, read):
+        nonlocal total_bytes
+        if len(images) >= MAX_BATCH_IMAGES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IMAGES} images per batch")
+        if declared_size > MAX_BATCH_IMAGE_BYTES:
+            raise HTTPException(status_code=413, detail=f"{name} is larger than {MAX_BATCH_IMAGE_BYTES} bytes")
+        if total_bytes + declared_size > MAX_BATCH_TOTAL_BYTES:
+            raise HTTPException(status_code=413, detail=f"Batch is larger than {MAX_BATCH_TOTAL_BYTES} bytes")
+        # Read one byte past the limit so a size that was misreported is still caught.
+        contents = read(MAX_BATCH_IMAGE_BYTES + 1)
+        if len(contents) > MAX_BATCH_IMAGE_BYTES or total_bytes + len(contents) > MAX_BATCH_TOTAL_BYTES:
+            raise HTTPException(status_code=413, detail=f"{name} exceeds the batch size limits")
+        total_bytes += len(contents)
+        images.append((os.path.basename(name), contents))
+
+    for upload in files:
+        if upload.filename.lower().endswith(".zip"):
+            with zipfile.ZipFile(upload.file) as archive:
+                for info in archive.infolist():
+                    name = info.filename
+                    if info.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(OTOLITH_IMAGE_EXTENSIONS):
+                        continue
+                    with archive.open(info) as member:
+                        add(name, info.file_size, member.read)
+        else:
+            add(upload.filename, upload.size or 0, upload.file.read)
+    return images
+
+
+@app.post("/api/classify_otolith/batch", tags=["AI Models"])
+def classify_otolith_batch(minio: Minio = Depends(get_minio_client),
+                           files: List[UploadFile] = File(...)):
+    """
+    Classify many otolith images in one request (individual files and/or .zip archives).
+    Returns per-image predictions in upload order plus throughput.
+    """
+    try:
+        images = _collect_batch_images(files)
+        started = time.perf_counter()
+        digests = [prediction_cache.image_digest(contents) for _, contents in images]
+        model_version = otolith_classifier.model_version
+        predictions = [prediction_cache.get_prediction(digest, model_version) for digest in digests]
+        misses = [i for i, prediction in enumerate(predictions) if prediction is None]
+        if misses:
+            for i, prediction in zip(misses, otolith_classifier.predict_batch([images[i][1] for i in misses])):
+                predictions[i] = prediction
+                prediction_cache.set_prediction(digests[i], model_version, prediction)
+        elapsed = time.perf_counter() - started
+
+        def store(item):
+            (filename, contents), digest, prediction = item
+            if "error" in prediction or prediction_cache.get_object_name(digest) is not None:
+                return
+            object_name = otolith_object_name(digest)
+            content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            put_if_absent(minio, "otoliths", object_name, contents, content_type, {"species": prediction["predicted_species"]})
+            prediction_cache.set_object_name(digest, object_name)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(store, zip(images, digests, predictions)))
+
+        return {
+            "count": len(images),
+            "results": [{"filename": filename, **prediction} for (filename, _), prediction in zip(images, predictions)],
+            "elapsed_seconds": round(elapsed, 3),
+            "images_per_second": round(len(images) / elapsed, 1) if elapsed > 0 else None,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error in classify_otolith_batch: {e}", exc_info=True)
+        return {"error": str(e)}
+
 CORRELATION_THRESHOLD = 0.1
 
+# --- Correlations ---
+@app.get("/api/correlations", tags=["X-Factor"])
+def get_correlations(top: int = Query(20, ge=1, le=1000),
+                     min_count: int = Query(0, ge=0),
+                     variable: Optional[str] = Query(None, pattern="^(sea_surface_temp_c|salinity_psu|chlorophyll_mg_m3)$"),
+                     db: Session = Depends(get_db)):
+    """
+    The full species x environmental variable correlation ranking (point-biserial r,
+    counts, t statistic, p-value), best |r| first. Same table /api/hypotheses picks from.
+    """
+    rows = analysis_service.correlation_table(db, top=top, min_count=min_count, variable=variable)
+    return {"count": len(rows), "correlations": rows}
+
+
+@app.get("/api/analysis/environment", tags=["X-Factor"])
+def get_environment_analysis(species_id: Optional[int] = None,
+                             min_count: int = Query(5, ge=1),
+                             db: Session = Depends(get_db)):
+    """
+    In-process NumPy analysis over a columnar snapshot of all sightings:
+    variable correlation matrix, per-species z-scores and month-of-year
+    (rolling) means, optionally for one species. The snapshot is fetched
+    once per data change and then served from memory / local disk.
+    """
+    return analytics_engine.environment_overview(db, species_id=species_id, min_count=min_count)
+
+
+SCOPE_PATTERN = "^(region|season|region_season)$"
+
+
+@app.post("/api/analysis/sweep", status_code=202, tags=["X-Factor"])
+async def start_correlation_sweep(scope: Optional[List[str]] = Query(None),
+                                  precision: int = Query(region_sweep.GEOHASH_PRECISION, ge=1, le=6)):
+    """
+    Queue the per-region / per-month correlation sweep. Every partition is
+    analysed on a process pool and the ranked findings replace the stored
+    ones; poll GET /api/jobs/{job_id} for progress.
+    """
+    scopes = tuple(scope or region_sweep.SCOPES)
+    unknown = [s for s in scopes if s not in region_sweep.SCOPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown scope(s): {', '.join(unknown)}")
+    job_id = job_queue.submit("correlation_sweep", region_sweep.run_sweep_job, scopes=scopes, precision=precision)
+    return {"success": True, "job_id": job_id, "status": "queued", "scopes": list(scopes)}
+
+
+@app.get("/api/analysis/findings", tags=["X-Factor"])
+def get_correlation_findings(scope: str = Query("region", pattern=SCOPE_PATTERN),
+                             cell: Optional[str] = None,
+                             month: Optional[int] = Query(None, ge=1, le=12),
+                             top: int = Query(50, ge=1, le=1000),
+                             db: Session = Depends(get_db)):
+    """
+    Stored sweep findings for one scope (optionally one cell and/or month):
+    by rank within their partition, then most significant first. The first
+    row is the one /api/hypotheses explains for the same parameters.
+    """
+    rows = region_sweep.list_findings(db, scope, cell=cell, month=month, top=top)
+    return {"count": len(rows), "findings": rows}
+
+
+@app.get("/api/analysis/cache/stats", tags=["X-Factor"])
+async def analysis_cache_stats():
+    """Hit / stale / miss / refresh counts of the versioned caches, plus the vector tile cache."""
+    return {**versioned_cache.stats(), "tiles": map_service.tile_cache.stats()}
+
 # --- Hypotheses ---
 @app.get("/api/hypotheses", response_model=dict, tags=["X-Factor"])
-async def get_ai_hypotheses(db: Session = Depends(get_db)):
-    correlation_finding = analysis_service.find_strongest_correlation(db)
+def get_ai_hypotheses(scope: Optional[str] = Query(None, pattern=SCOPE_PATTERN),
+                            cell: Optional[str] = None,
+                            month: Optional[int] = Query(None, ge=1, le=12),
+                            db: Session = Depends(get_db)):
+    """
+    A hypothesis for the strongest correlation overall or, with `scope`, for
+    the top stored sweep finding of that scope / cell / month. Sync so that
+    waiting on another request's cache refresh never blocks the event loop.
+    """
+    generation = versioned_cache.data_generation(db)
+    if scope:
+        correlation_finding = region_sweep.top_finding(db, scope, cell=cell, month=month) or {}
+    else:
+        correlation_finding = analysis_service.find_strongest_correlation(db)
 
     if not correlation_finding or correlation_finding.get("species_id") is None:
         return {
@@ -190,6 +591,7 @@ async def get_ai_hypotheses(db: Session = Depends(get_db)):
                 "variable": correlation_finding.get("variable"),
                 "species_id": correlation_finding.get("species_id"),
                 "species_name": None,
+                **({"scope": scope, "cell": cell, "month": month} if scope else {}),
             },
         }
 
@@ -204,7 +606,7 @@ async def get_ai_hypotheses(db: Session = Depends(get_db)):
     if "correlation" in correlation_finding:
         correlation_finding.pop("correlation")
 
-    hypothesis_text = llm_service.generate_hypothesis_from_finding(correlation_finding)
+    hypothesis_text = llm_service.generate_hypothesis_from_finding(correlation_finding, generation=generation)
 
     return {"hypothesis": hypothesis_text, "source_finding": correlation_finding}
 
@@ -234,157 +636,125 @@ async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db)):
         return ChatResponse(reply="Sorry, I couldn't generate a response at this time.")
 
 
-@app.post("/api/upload/csv", tags=["Upload"])
-async def upload_combined_csv(
-    db: Session = Depends(get_db),
-    minio: Minio = Depends(get_minio_client),
-    file: UploadFile = File(...),
-):
+@app.post("/api/upload/csv", status_code=202, tags=["Upload"])
+async def upload_combined_csv(file: UploadFile = File(...)):
     if not file.filename.endswith(".csv") and not file.filename.endswith(".tsv"):
         raise HTTPException(status_code=400, detail="Only CSV/TSV files supported")
 
     try:
-        # Save to tmpfile for both Pandas + MinIO
-        tmpfile = tempfile.NamedTemporaryFile(delete=False, suffix=".csv")
-        contents = await file.read()
-        tmpfile.write(contents)
-        tmpfile.close()
-
-        # Upload original file to MinIO for backup
+        # The UploadFile is closed once we respond, so hand the worker a copy on disk
+        path = await run_in_threadpool(job_queue.persist_upload, file.file, suffix=".csv")
         unique_name = f"uploads/{uuid.uuid4()}-{file.filename}"
-        minio.put_object("sightings", unique_name, open(tmpfile.name, "rb"), len(contents), content_type="text/csv")
-
-        # Parse with Pandas
-        df = pd.read_csv(tmpfile.name, sep=None, engine="python")
-        df.columns = [c.strip().lower() for c in df.columns]
-
-        inserted_species = 0
-        inserted_sightings = 0
-
-        for _, row in df.iterrows():
-
-            print({
-                "scientificName": row.get("scientificname"),
-                "taxonRank": row.get("taxonrank"),
-                "eventDate": row.get("eventdate")
-            })
-            # --- Clean rank ---
-            rank = str(row.get("taxonrank", "")).strip().lower()
-            if rank != "species":
-                continue
-
-            # --- Flexible date parsing ---
-            try:
-                sighting_date = pd.to_datetime(str(row.get("eventdate")), dayfirst=True).date()
-            except Exception:
-                logging.warning(f"Skipping row with bad date: {row.get('eventdate')}")
-                continue
-
-            # Ensure species exists
-            species = db.query(models.Species).filter_by(scientific_name=row["scientificname"]).first()
-            if not species:
-                species = models.Species(
-                    scientific_name=row["scientificname"],
-                    common_name=None,
-                    description=None,
-                    habitat=None,
-                )
-                db.add(species)
-                db.flush()
-                inserted_species += 1
-
-            # Insert sighting
-            sighting = models.Sighting(
-                species_id=species.id,
-                sighting_date=sighting_date,
-                sea_surface_temp_c=row.get("sst"),
-                salinity_psu=row.get("sss"),
-                location=f"SRID=4326;POINT({row['decimallongitude']} {row['decimallatitude']})",
-            )
-            db.add(sighting)
-            inserted_sightings += 1
-
-        db.commit()
-
-        return {
-            "success": True,
-            "species_added": inserted_species,
-            "sightings_added": inserted_sightings,
-            "minio_path": unique_name,
-        }
+        job_id = job_queue.submit("sightings_csv", ingest_service.run_csv_upload_job, path, file.filename, unique_name)
+        # minio_path is reported in the job result, once the backup actually exists
+        return {"success": True, "job_id": job_id, "status": "queued"}
 
     except Exception as e:
-        logging.error(f"Error uploading CSV: {e}", exc_info=True)
+        logging.error(f"Error queueing CSV upload: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/upload/edna", tags=["eDNA"])
-async def upload_edna_file(
-    db: Session = Depends(get_db),
-    minio: Minio = Depends(get_minio_client),
-    file: UploadFile = File(...),
-):
-    if not (file.filename.endswith(".fasta") or file.filename.endswith(".fa")):
-        raise HTTPException(status_code=400, detail="Only .fasta/.fa files supported")
+@app.post("/api/upload/edna", status_code=202, tags=["eDNA"])
+async def upload_edna_file(file: UploadFile = File(...)):
+    if not edna_service.is_fasta_filename(file.filename):
+        raise HTTPException(status_code=400, detail="Only .fasta/.fa (optionally .gz) files supported")
 
     try:
-        # Save temp file
-        tmpfile = tempfile.NamedTemporaryFile(delete=False, suffix=".fasta")
-        contents = await file.read()
-        tmpfile.write(contents)
-        tmpfile.close()
-
-        # Upload raw file to MinIO
+        path = await run_in_threadpool(job_queue.persist_upload, file.file, suffix=".fasta")
         unique_name = f"edna/{uuid.uuid4()}-{file.filename}"
-        minio.put_object("edna", unique_name, open(tmpfile.name, "rb"), len(contents), content_type="text/plain")
-
-        # Parse FASTA
-        inserted = 0
-        for record in SeqIO.parse(tmpfile.name, "fasta"):
-            header = record.description
-            seq = str(record.seq)
-
-            # Try to extract species name if header contains "species="
-            species_name = None
-            if "species=" in header:
-                try:
-                    species_name = header.split("species=")[1].split()[0]
-                except Exception:
-                    pass
-
-            metadata = {"id": record.id, "description": record.description}
-
-            new_seq = EdnaSequence(
-                header=header,
-                sequence=seq,
-                species_name=species_name,
-                metadata=metadata,
-            )
-            db.add(new_seq)
-            inserted += 1
-
-        db.commit()
-        return {"success": True, "inserted": inserted, "minio_path": unique_name}
+        job_id = job_queue.submit("edna_fasta", edna_service.run_edna_upload_job, path, file.filename, unique_name)
+        return {"success": True, "job_id": job_id, "status": "queued"}
 
     except Exception as e:
-        logging.error(f"Error uploading eDNA: {e}", exc_info=True)
+        logging.error(f"Error queueing eDNA upload: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# --- Jobs ---
+@app.get("/api/jobs/{job_id}", tags=["Upload"])
+async def get_job_status(job_id: str):
+    job = job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 @app.post("/api/edna/match", response_model=schemas.EdnaMatchResponse, tags=["eDNA"])
 def match_edna_sequence(request: schemas.EdnaMatchRequest, db: Session = Depends(get_db)):
     try:
-        match = db.query(EdnaSequence).filter(EdnaSequence.sequence == request.sequence).first()
+        sequence = normalize_sequence(request.sequence)
+        hits = edna_index.search(db, sequence, top_n=request.top_n, min_identity=request.min_identity)
 
-        if match:
+        if hits:
             return schemas.EdnaMatchResponse(
                 success=True,
                 matched=True,
-                header=match.header
+                header=hits[0]["header"],
+                matches=hits,
             )
         else:
             return schemas.EdnaMatchResponse(success=True, matched=False)
     except Exception as e:
-        import logging
         logging.error(f"Error matching eDNA: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/edna/match/batch", tags=["eDNA"])
+async def match_edna_batch(
+    request: Request,
+    top_n: int = Query(5, ge=1, le=100),
+    min_identity: float = Query(90.0, ge=0, le=100),
+):
+    """
+    Match many reads in one request: either a multipart FASTA upload ("file")
+    or a JSON body ({"reads": [...]} or a bare array of sequences / {id, sequence} objects).
+    Results stream back as NDJSON, one line per read as soon as it is scored,
+    followed by a final summary line.
+    """
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or not edna_service.is_fasta_filename(upload.filename):
+            raise HTTPException(status_code=400, detail="Only .fasta/.fa (optionally .gz) files supported")
+        # The form is closed once we respond, so stream reads from a copy on disk. The
+        # copy is removed after the response even if the stream never started.
+        path = await run_in_threadpool(job_queue.persist_upload, upload.file, suffix=".fasta")
+        reads = edna_service.iter_fasta_reads(path, upload.filename, delete=False)
+        cleanup = BackgroundTask(job_queue.discard_upload, path)
+    else:
+        try:
+            body = await request.json()
+            if isinstance(body, list):
+                body = {"reads": [{"sequence": r} if isinstance(r, str) else r for r in body]}
+            payload = schemas.EdnaBatchMatchRequest.model_validate(body)
+        except (ValueError, ValidationError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        reads = [(r.id or str(i), normalize_sequence(r.sequence)) for i, r in enumerate(payload.reads)]
+        cleanup = None
+
+    def stream():
+        # Our own session: the request-scoped one is closed before streaming starts.
+        db = SessionLocal()
+        started = time.perf_counter()
+        count = matched = 0
+        try:
+            for result in edna_index.batch_search(db, reads, top_n=top_n, min_identity=min_identity):
+                count += 1
+                matched += result["matched"]
+                yield json.dumps(result) + "\n"
+            elapsed = time.perf_counter() - started
+            yield json.dumps({
+                "summary": {
+                    "reads": count,
+                    "matched": matched,
+                    "elapsed_seconds": round(elapsed, 3),
+                    "reads_per_second": round(count / elapsed, 1) if elapsed > 0 else None,
+                }
+            }) + "\n"
+        except Exception as e:
+            logging.error(f"Error in batch eDNA match: {e}", exc_info=True)
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", background=cleanup)
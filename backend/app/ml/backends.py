@@ -0,0 +1,126 @@
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Default artifact for each backend; train_model.py --export writes the non-Keras ones.
+MODEL_FILES = {
+    "keras": "otolith_classifier_model.h5",
+    "tflite": "otolith_classifier_model.tflite",
+    "onnx": "otolith_classifier_model.onnx",
+}
+
+# Which backend OtolithClassifier serves from, and an optional explicit artifact path.
+OTOLITH_BACKEND = os.getenv("OTOLITH_BACKEND", "keras").lower()
+OTOLITH_MODEL_PATH = os.getenv("OTOLITH_MODEL_PATH")
+# Intra-op threads for the TFLite/ONNX runtimes (0 lets the runtime decide).
+OTOLITH_NUM_THREADS = int(os.getenv("OTOLITH_NUM_THREADS", 0))
+
+
+class KerasBackend:
+    """The float32 Keras .h5 model via tf.keras (the original serving path)."""
+    name = "keras"
+
+    def __init__(self, model_path: str):
+        import tensorflow as tf
+        self.model = tf.keras.models.load_model(model_path)
+        self._embedder = None
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return np.asarray(self.model.predict_on_batch(batch))
+
+    def embed(self, batch: np.ndarray) -> np.ndarray:
+        """Penultimate-layer activations (the 512-d head before the softmax)."""
+        if self._embedder is None:
+            import tensorflow as tf
+            self._embedder = tf.keras.Model(self.model.input, self.model.layers[-2].output)
+        return np.asarray(self._embedder.predict_on_batch(batch))
+
+
+class TFLiteBackend:
+    """
+    A converted .tflite model (float32, float16 or int8). Quantized int8 inputs
+    and outputs are (de)quantized here so callers always see float32.
+    Prefers the standalone tflite_runtime package and falls back to tf.lite.
+    An interpreter is not thread-safe, and the scheduler thread, batch
+    handlers and single predictions all share this one, so resize + invoke
+    run under a lock.
+    """
+    name = "tflite"
+
+    def __init__(self, model_path: str, num_threads: int = OTOLITH_NUM_THREADS):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads or None)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size: int):
+        if batch_size != self._batch_size:
+            self.interpreter.resize_tensor_input(self._input["index"], [batch_size, *self._input["shape"][1:]])
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            self._resize(len(batch))
+            dtype = self._input["dtype"]
+            scale, zero_point = self._input["quantization"]
+            if scale:
+                batch = np.round(batch / scale + zero_point)
+                if np.issubdtype(dtype, np.integer):
+                    info = np.iinfo(dtype)
+                    batch = np.clip(batch, info.min, info.max)
+            self.interpreter.set_tensor(self._input["index"], batch.astype(dtype))
+            self.interpreter.invoke()
+            out = self.interpreter.get_tensor(self._output["index"])
+        scale, zero_point = self._output["quantization"]
+        if scale:
+            out = (out.astype(np.float32) - zero_point) * scale
+        return out.astype(np.float32)
+
+
+class OnnxBackend:
+    """An ONNX export served with onnxruntime on CPU; no TensorFlow import needed."""
+    name = "onnx"
+
+    def __init__(self, model_path: str, num_threads: int = OTOLITH_NUM_THREADS):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self._input_name: batch.astype(np.float32)})[0]
+
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "tflite": TFLiteBackend,
+    "onnx": OnnxBackend,
+}
+
+
+def artifact_path(name: str = OTOLITH_BACKEND, model_path: Optional[str] = OTOLITH_MODEL_PATH) -> str:
+    """Model file a backend loads: model_path if given, else its default artifact in app/ml/."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OTOLITH_BACKEND '{name}'. Expected one of: {', '.join(BACKENDS)}")
+    return model_path or os.path.join(ML_DIR, MODEL_FILES[name])
+
+
+def load_backend(name: str = OTOLITH_BACKEND, model_path: Optional[str] = OTOLITH_MODEL_PATH):
+    """Instantiate a backend by name, defaulting to its artifact in app/ml/."""
+    return BACKENDS[name](artifact_path(name, model_path))
@@ -1,71 +1,257 @@
-import tensorflow as tf
-from PIL import Image
 import numpy as np
-import io
 import os
 import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from app.ml import preprocessing
+from app.ml.preprocessing import IMG_SIZE
+from app.ml.backends import OTOLITH_BACKEND, artifact_path, load_backend
+
+# Images per model call in predict_batch. A fixed size keeps a single traced graph.
+INFERENCE_BATCH_SIZE = int(os.getenv("OTOLITH_BATCH_SIZE", 16))
+
+CONFIDENCE_THRESHOLD_HIGH = 67.0
+CONFIDENCE_THRESHOLD_LOW = 50.0
+
+# Decoding/resizing runs here; PIL releases the GIL for most of that work.
+decode_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="otolith-decode")
+
+logger = logging.getLogger(__name__)
+
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def _fingerprint(backend_name: str, model_path: Optional[str] = None) -> str:
+    parts = [backend_name]
+    for path in (model_path or artifact_path(backend_name), os.path.join(os.path.dirname(os.path.abspath(__file__)), 'class_indices.json')):
+        try:
+            stat = os.stat(path)
+            parts.append(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            parts.append(os.path.basename(path))
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
 
 class OtolithClassifier:
-    _model = None
-    _class_names = None
+    """
+    Serves from a pluggable backend (Keras .h5, TFLite or ONNX; see
+    app.ml.backends). TensorFlow is only imported when the model is first loaded, so processes
+    that import the app without classifying anything never pay for it.
+    Status goes cold -> loading -> warming -> ready (or failed).
+    """
+
+    def __init__(self, backend: str = OTOLITH_BACKEND):
+        self.backend_name = backend
+        self._model = None
+        self._class_names = None
+        self._lock = threading.Lock()
+        self.status = "cold"
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._model_version = None
+        self._embedder = None
+
+    @property
+    def model_version(self) -> str:
+        """
+        Short fingerprint of the served artifact (backend, file size and mtime)
+        and the class map. Changes whenever either is replaced, so cached
+        predictions from an older model are never returned.
+        """
+        if self._model_version is None:
+            self._model_version = _fingerprint(self.backend_name)
+        return self._model_version
+
+    @property
+    def embedding_model_path(self) -> str:
+        """
+        The Keras model embeddings come from: the served model when it is
+        Keras, else the default .h5 loaded alongside (OTOLITH_MODEL_PATH then
+        names the TFLite/ONNX export, not this file).
+        """
+        if self.backend_name == "keras":
+            return artifact_path("keras")
+        return artifact_path("keras", None)
+
+    @property
+    def embedding_version(self) -> str:
+        """Fingerprint of the Keras model embeddings come from (see embed)."""
+        return _fingerprint("keras", self.embedding_model_path)
+
+    @property
+    def is_ready(self) -> bool:
+        return self.status == "ready"
 
     def _load_model(self):
         print("--- LOADING TRAINED MODEL ---")
+        started = time.perf_counter()
         current_dir = os.path.dirname(os.path.abspath(__file__))
-        model_path = os.path.join(current_dir, 'otolith_classifier_model.h5')
         class_map_path = os.path.join(current_dir, 'class_indices.json')
 
-        self._model = tf.keras.models.load_model(model_path)
+        model = load_backend(self.backend_name)
         with open(class_map_path, 'r') as f:
             class_indices = json.load(f)
             self._class_names = {v: k for k, v in class_indices.items()}
-        print("--- MODEL LOADED ---")
+        self._model = model
+        self.load_seconds = round(time.perf_counter() - started, 3)
+        print(f"--- MODEL LOADED ({model.name} backend) ---")
 
     def get_model_and_classes(self):
         if self._model is None:
-            self._load_model()
+            # Concurrent callers (warm-up thread, first requests) wait for a single load.
+            with self._lock:
+                if self._model is None:
+                    self.status = "loading"
+                    try:
+                        self._load_model()
+                    except Exception as e:
+                        self.status, self.error = "failed", str(e)
+                        raise
+                    if self.status == "loading":
+                        self.status = "ready"
         return self._model, self._class_names
 
-    def predict(self, image_bytes: bytes, temperature: float = 0.43, logit_boost: float = 0.1) -> dict:
+    def warm_up(self, batch_size: int = INFERENCE_BATCH_SIZE):
         """
-        Predict the species with enhanced confidence using temperature scaling and optional logit boost.
+        Load the model and run a dummy inference at each batch shape the server
+        uses, so graph tracing happens before the first real request.
         """
-        model, class_names = self.get_model_and_classes()
+        try:
+            with self._lock:
+                if self._model is None:
+                    self.status = "loading"
+                    self._load_model()
+                self.status = "warming"
+            started = time.perf_counter()
+            for size in sorted({1, batch_size}):
+                self.infer(np.zeros((size, *IMG_SIZE, 3), dtype=np.float32))
+            self.warmup_seconds = round(time.perf_counter() - started, 3)
+            self.status = "ready"
+            logger.info("Otolith classifier ready (load %.2fs, warm-up %.2fs)", self.load_seconds, self.warmup_seconds)
+        except Exception as e:
+            self.status, self.error = "failed", str(e)
+            logger.error("Otolith classifier warm-up failed: %s", e, exc_info=True)
+
+    def warm_up_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.warm_up, name="otolith-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def readiness(self) -> dict:
+        return {
+            "ready": self.is_ready,
+            "backend": self.backend_name,
+            "model_version": self.model_version,
+            "status": self.status,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+        }
 
-        # --- Preprocess image ---
-        img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-        img = img.resize((224, 224))
-        img_array = tf.keras.utils.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = img_array / 255.0
+    @staticmethod
+    def preprocess(image_bytes: bytes) -> np.ndarray:
+        """Decode one image into a (224, 224, 3) float32 array scaled to [0, 1]."""
+        return preprocessing.preprocess(image_bytes)
 
-        # --- Model prediction ---
-        logits = model.predict(img_array, verbose=0)[0]
+    def _postprocess(self, logits: np.ndarray, temperature: float, logit_boost: float) -> List[dict]:
+        """Temperature scaling + threshold logic for a (batch, classes) array of model outputs."""
+        _, class_names = self.get_model_and_classes()
 
         # --- Optional logit boost for top class ---
-        logits += logit_boost
+        logits = logits + logit_boost
 
         # --- Temperature-scaled softmax ---
         scaled_logits = logits / temperature
-        probabilities = tf.nn.softmax(scaled_logits).numpy()
+        probabilities = _softmax(np.asarray(scaled_logits, dtype=np.float32))
 
-        predicted_index = np.argmax(probabilities)
-        confidence = 100 * probabilities[predicted_index]
+        predicted_indices = np.argmax(probabilities, axis=-1)
+        confidences = 100 * probabilities[np.arange(len(probabilities)), predicted_indices]
 
         # --- Threshold logic ---
-        CONFIDENCE_THRESHOLD_HIGH = 67.0
-        CONFIDENCE_THRESHOLD_LOW = 50.0
+        results = []
+        for predicted_index, confidence in zip(predicted_indices, confidences):
+            if confidence >= CONFIDENCE_THRESHOLD_HIGH:
+                species = class_names[predicted_index].replace("_", " ")
+            elif CONFIDENCE_THRESHOLD_LOW <= confidence < CONFIDENCE_THRESHOLD_HIGH:
+                species = class_names[predicted_index].replace("_", " ") + " (Uncertain)"
+            else:
+                species = "Unknown Species"
+            results.append({
+                "predicted_species": species,
+                "confidence_score": round(float(confidence), 2)
+            })
+        return results
 
-        if confidence >= CONFIDENCE_THRESHOLD_HIGH:
-            species = class_names[predicted_index].replace("_", " ")
-        elif CONFIDENCE_THRESHOLD_LOW <= confidence < CONFIDENCE_THRESHOLD_HIGH:
-            species = class_names[predicted_index].replace("_", " ") + " (Uncertain)"
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        """Raw model outputs for an already-preprocessed (n, 224, 224, 3) batch."""
+        model, _ = self.get_model_and_classes()
+        return model.predict(batch)
+
+    def embed(self, batch: np.ndarray) -> np.ndarray:
+        """
+        L2-normalized penultimate-layer embeddings for a preprocessed batch.
+        Quantized backends only export the softmax, so for them the Keras
+        model is loaded alongside on first use.
+        """
+        model, _ = self.get_model_and_classes()
+        if hasattr(model, "embed"):
+            embedder = model
         else:
-            species = "Unknown Species"
-        return {
-            "predicted_species": species,
-            "confidence_score": round(confidence, 2)
-        }
+            with self._lock:
+                if self._embedder is None:
+                    self._embedder = load_backend("keras", self.embedding_model_path)
+            embedder = self._embedder
+        vectors = embedder.embed(batch).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def embed_images(self, images: List[bytes], batch_size: int = INFERENCE_BATCH_SIZE) -> tuple:
+        """Embed raw image bytes in fixed-size batches. Returns (vectors, {index: error})."""
+        vectors, errors = [], {}
+        batch = np.zeros((batch_size, *IMG_SIZE, 3), dtype=np.float32)
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            _, chunk_errors = preprocessing.decode_batch(chunk, batch[:len(chunk)], pool=decode_pool)
+            batch[len(chunk):] = 0
+            vectors.append(self.embed(batch)[:len(chunk)])
+            errors.update({start + i: e for i, e in chunk_errors.items()})
+        return (np.concatenate(vectors) if vectors else np.empty((0, 0), dtype=np.float32)), errors
+
+    def predict(self, image_bytes: bytes, temperature: float = 0.43, logit_boost: float = 0.1) -> dict:
+        """
+        Predict the species with enhanced confidence using temperature scaling and optional logit boost.
+        """
+        img_array = np.expand_dims(self.preprocess(image_bytes), axis=0)
+        logits = self.infer(img_array)
+        return self._postprocess(logits, temperature, logit_boost)[0]
+
+    def predict_batch(self, images: List[bytes], temperature: float = 0.43, logit_boost: float = 0.1,
+                      batch_size: int = INFERENCE_BATCH_SIZE) -> List[dict]:
+        """
+        Predict many images at once. Each fixed-size chunk is decoded in a thread
+        pool straight into one reused input buffer (the last chunk zero-padded),
+        so memory stays at one batch regardless of how many images are sent.
+        Returns one result per input, in order; undecodable images get {"error": ...}.
+        """
+        results: List[dict] = []
+        batch = np.zeros((batch_size, *IMG_SIZE, 3), dtype=np.float32)
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            _, errors = preprocessing.decode_batch(chunk, batch[:len(chunk)], pool=decode_pool)
+            batch[len(chunk):] = 0
+            logits = self.infer(batch)[:len(chunk)]
+            for i, result in enumerate(self._postprocess(logits, temperature, logit_boost)):
+                results.append({"error": str(errors[i])} if i in errors else result)
+        return results
 
 
 
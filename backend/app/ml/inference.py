@@ -0,0 +1,115 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.ml.classifier import IMG_SIZE, INFERENCE_BATCH_SIZE, OtolithClassifier, decode_pool, otolith_classifier
+
+logger = logging.getLogger(__name__)
+
+# Longest a request waits for others to join its batch before inference starts.
+MAX_BATCH_LATENCY_MS = float(os.getenv("OTOLITH_MAX_LATENCY_MS", 10))
+# Requests kept for the latency percentiles reported by stats().
+STATS_WINDOW = 10_000
+
+
+class MicroBatchScheduler:
+    """
+    Dynamic micro-batching in front of an OtolithClassifier.
+
+    Each request decodes its image on the shared decode pool, then queues the
+    array with a future. A single collector task takes the first queued image,
+    waits up to max_latency_ms for more (or until max_batch_size), runs the
+    whole batch on a dedicated one-thread executor so TensorFlow never runs on
+    the event loop, and resolves every caller's future with its own result.
+    """
+
+    def __init__(self, classifier: OtolithClassifier, max_batch_size: int = INFERENCE_BATCH_SIZE,
+                 max_latency_ms: float = MAX_BATCH_LATENCY_MS):
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="otolith-infer")
+        self._queue = None
+        self._task = None
+        self._loop = None
+        self._latencies = deque(maxlen=STATS_WINDOW)
+        self._completed = deque(maxlen=STATS_WINDOW)
+        self._batches = 0
+        self._images = 0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._collect())
+
+    async def predict(self, image_bytes: bytes, temperature: float = 0.43, logit_boost: float = 0.1) -> dict:
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        image = await loop.run_in_executor(decode_pool, self.classifier.preprocess, image_bytes)
+        future = loop.create_future()
+        await self._queue.put((image, temperature, logit_boost, future))
+        result = await future
+        finished = time.perf_counter()
+        self._latencies.append(finished - submitted)
+        self._completed.append(finished)
+        return result
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = np.zeros((self.max_batch_size, *IMG_SIZE, 3), dtype=np.float32)
+        while True:
+            items = [await self._queue.get()]
+            deadline = loop.time() + self.max_latency
+            while len(items) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            for i, item in enumerate(items):
+                batch[i] = item[0]
+            batch[len(items):] = 0
+            try:
+                logits = await loop.run_in_executor(self._executor, self.classifier.infer, batch)
+                for i, (_, temperature, logit_boost, future) in enumerate(items):
+                    if not future.done():
+                        future.set_result(self.classifier._postprocess(logits[i:i + 1], temperature, logit_boost)[0])
+            except Exception as e:
+                logger.error("Micro-batch inference failed: %s", e, exc_info=True)
+                for *_, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+            self._batches += 1
+            self._images += len(items)
+
+    def stats(self) -> dict:
+        """Latency percentiles (ms), mean batch size and recent throughput."""
+        latencies = np.array(self._latencies) * 1000.0
+        completed = list(self._completed)
+        window = completed[-1] - completed[0] if len(completed) > 1 else 0.0
+        return {
+            "requests": len(latencies),
+            "batches": self._batches,
+            "mean_batch_size": round(self._images / self._batches, 2) if self._batches else None,
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2) if len(latencies) else None,
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2) if len(latencies) else None,
+            "p99_ms": round(float(np.percentile(latencies, 99)), 2) if len(latencies) else None,
+            "throughput_per_second": round((len(completed) - 1) / window, 1) if window > 0 else None,
+            "max_batch_size": self.max_batch_size,
+            "max_latency_ms": self.max_latency * 1000.0,
+        }
+
+
+# Global instance
+otolith_scheduler = MicroBatchScheduler(otolith_classifier)
@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Configuration ----------------
+OTOLITH_CACHE_SIZE = int(os.getenv("OTOLITH_CACHE_SIZE", 4096))          # in-process LRU entries
+OTOLITH_CACHE_TTL = int(os.getenv("OTOLITH_CACHE_TTL", 7 * 24 * 3600))   # Redis TTL, 7 days default
+KEY_PREFIX = "tattva:otolith"
+
+try:
+    redis_client = redis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        decode_responses=True,
+    )
+    _ = redis_client.ping()
+except Exception:
+    redis_client = None
+    logger.info("Redis not available — otolith prediction cache is in-process only")
+
+
+def image_digest(contents: bytes) -> str:
+    """SHA-256 of the uploaded bytes; identical re-uploads share it."""
+    return hashlib.sha256(contents).hexdigest()
+
+
+def prediction_key(digest: str, model_version: str, temperature: float = 0.43, logit_boost: float = 0.1) -> str:
+    # Temperature/boost change the reported confidence, so they are part of the key.
+    return f"{KEY_PREFIX}:pred:{model_version}:{temperature}:{logit_boost}:{digest}"
+
+
+def object_key(digest: str) -> str:
+    # Stored objects do not depend on the model, so one object per image across versions.
+    return f"{KEY_PREFIX}:object:{digest}"
+
+
+class TieredCache:
+    """
+    Two-level JSON cache: a bounded in-process LRU in front of Redis. Redis
+    hits are promoted into the LRU; Redis errors are logged and treated as misses.
+    With raw=True values are bytes stored as-is (the client must not decode responses).
+    """
+
+    def __init__(self, maxsize: int = OTOLITH_CACHE_SIZE, ttl: int = OTOLITH_CACHE_TTL, client=None,
+                 raw: bool = False):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.client = client
+        self.raw = raw
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "redis": 0}
+        self.misses = 0
+
+    def _remember(self, key: str, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits["memory"] += 1
+                return self._entries[key]
+        if self.client:
+            try:
+                raw = self.client.get(key)
+                if raw:
+                    value = raw if self.raw else json.loads(raw)
+                    self._remember(key, value)
+                    self.hits["redis"] += 1
+                    return value
+            except Exception as e:
+                logger.warning("Redis GET failed: %s", e)
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value):
+        self._remember(key, value)
+        if self.client:
+            try:
+                self.client.setex(key, self.ttl, value if self.raw else json.dumps(value))
+            except Exception as e:
+                logger.warning("Redis SET failed: %s", e)
+
+    def stats(self) -> dict:
+        lookups = sum(self.hits.values()) + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits_memory": self.hits["memory"],
+            "hits_redis": self.hits["redis"],
+            "misses": self.misses,
+            "hit_rate": round(sum(self.hits.values()) / lookups, 3) if lookups else None,
+            "redis": self.client is not None,
+        }
+
+
+# Global instances: model predictions, and digest -> MinIO object name
+prediction_cache = TieredCache(client=redis_client)
+object_cache = TieredCache(client=redis_client)
+
+
+def get_prediction(digest: str, model_version: str) -> Optional[dict]:
+    return prediction_cache.get(prediction_key(digest, model_version))
+
+
+def set_prediction(digest: str, model_version: str, prediction: dict):
+    # Error results (undecodable images) are not cached.
+    if "error" not in prediction:
+        prediction_cache.set(prediction_key(digest, model_version), prediction)
+
+
+def get_object_name(digest: str) -> Optional[str]:
+    return object_cache.get(object_key(digest))
+
+
+def set_object_name(digest: str, object_name: str):
+    object_cache.set(object_key(digest), object_name)
+
+
+def stats() -> dict:
+    return {"predictions": prediction_cache.stats(), "objects": object_cache.stats()}
@@ -0,0 +1,73 @@
+import io
+from concurrent.futures import Executor
+from typing import List, Optional
+
+import numpy as np
+from PIL import Image
+
+# Shared by serving (OtolithClassifier) and training (train_model.py) so both see identical inputs.
+IMG_SIZE = (224, 224)
+_SCALE = np.float32(1.0 / 255.0)
+
+
+def load_image(image_bytes: bytes, size=IMG_SIZE) -> Image.Image:
+    """
+    Decode to an RGB image of `size`: a full decode, then one BICUBIC resize.
+    No JPEG draft()/DCT downscaling, which would give serving different
+    pixels from the ones the model was trained on.
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if img.size != size:
+        img = img.resize(size, Image.BICUBIC)
+    return img
+
+
+def decode_into(image_bytes: bytes, out: np.ndarray, size=IMG_SIZE) -> np.ndarray:
+    """
+    Decode one image into a preallocated (h, w, 3) float32 slot. The uint8
+    pixels are copied out of PIL once, then scaled to [0, 1] in a single
+    pass that writes straight into `out` (no intermediate float array).
+    """
+    pixels = np.asarray(load_image(image_bytes, size))
+    np.multiply(pixels, _SCALE, out=out, casting="unsafe")
+    return out
+
+
+def preprocess(image_bytes: bytes, size=IMG_SIZE) -> np.ndarray:
+    """Decode one image into a new (h, w, 3) float32 array scaled to [0, 1]."""
+    return decode_into(image_bytes, np.empty((*size, 3), dtype=np.float32), size)
+
+
+def preprocess_file(path, size=IMG_SIZE) -> np.ndarray:
+    if isinstance(path, bytes):
+        path = path.decode()
+    with open(path, "rb") as f:
+        return preprocess(f.read(), size)
+
+
+def decode_batch(images: List[bytes], out: Optional[np.ndarray] = None, pool: Optional[Executor] = None,
+                 size=IMG_SIZE) -> tuple:
+    """
+    Decode images into rows of `out` (allocated if not given), optionally in
+    parallel. Returns (out, errors) where errors maps row index -> exception;
+    failed rows are zeroed.
+    """
+    if out is None:
+        out = np.empty((len(images), *size, 3), dtype=np.float32)
+    errors = {}
+
+    def decode(i):
+        try:
+            decode_into(images[i], out[i], size)
+        except Exception as e:
+            out[i] = 0
+            errors[i] = e
+
+    if pool is None:
+        for i in range(len(images)):
+            decode(i)
+    else:
+        list(pool.map(decode, range(len(images))))
+    return out, errors
@@ -0,0 +1,278 @@
+import os
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+
+logger = logging.getLogger(__name__)
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.getenv("OTOLITH_INDEX_PATH", os.path.join(ML_DIR, "otolith_index.npz"))
+# Below this many vectors a brute-force scan is already sub-millisecond, so no IVF lists are built.
+IVF_MIN_VECTORS = 4096
+# Clusters probed per query once IVF is built.
+IVF_NPROBE = int(os.getenv("OTOLITH_INDEX_NPROBE", 8))
+# Best cosine similarity below which a query counts as an unseen species.
+NOVELTY_THRESHOLD = float(os.getenv("OTOLITH_NOVELTY_THRESHOLD", 0.6))
+# data_generations counter that numbers otolith_embeddings writes in commit order.
+EMBEDDINGS_GENERATION = "otolith_embeddings"
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over unit vectors; returns (k, d) unit centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        # Re-seed empty clusters from random points so every list stays useful.
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()), replace=False)]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+class OtolithIndex:
+    """
+    In-memory nearest-neighbour index over L2-normalized otolith embeddings
+    (cosine similarity = dot product). Small indexes are scanned exactly;
+    from IVF_MIN_VECTORS on, an inverted-file layout (k-means lists, probe
+    the nprobe closest) keeps queries in the millisecond range.
+    Entries carry the MinIO object name (or dataset path), a species label
+    and a source ("dataset" for labelled references, "upload" otherwise).
+
+    The .npz file is written only by index_otoliths.py. API workers record
+    uploads in the otolith_embeddings table (record_upload) and fold in what
+    any worker recorded with sync(), so no two processes write the file.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._buffer = np.empty((0, 0), dtype=np.float32)  # grows by doubling; vectors is a view of it
+        self._size = 0
+        self.keys: List[str] = []
+        self.labels: List[str] = []
+        self.sources: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self.version: Optional[str] = None
+        self._centroids = None
+        self._lists = None      # IVF list i holds the vector indices in _lists[i]
+        self._synced_generation = 0  # newest otolith_embeddings generation folded in by sync()
+        self.loaded = False
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._buffer[:self._size]
+
+    def _append_vectors(self, vectors: np.ndarray):
+        needed = self._size + len(vectors)
+        if self._size == 0:
+            self._buffer = np.empty((max(needed, 1024), vectors.shape[1]), dtype=np.float32)
+        elif needed > len(self._buffer):
+            grown = np.empty((max(needed, 2 * len(self._buffer)), self._buffer.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._buffer[:self._size]
+            self._buffer = grown
+        self._buffer[self._size:needed] = vectors
+        self._size = needed
+
+    # ---------------- Persistence ----------------
+    def load(self) -> bool:
+        with self._lock:
+            self.loaded = True
+            if not os.path.exists(self.path):
+                return False
+            data = np.load(self.path, allow_pickle=False)
+            self._buffer = data["vectors"].astype(np.float32)
+            self._size = len(self._buffer)
+            self.keys = data["keys"].tolist()
+            self.labels = data["labels"].tolist()
+            self.sources = data["sources"].tolist()
+            self._positions = {key: i for i, key in enumerate(self.keys)}
+            self.version = (str(data["version"]) if "version" in data else "") or None
+            self._build_lists(recluster=True)
+            logger.info("Loaded otolith index with %d vectors", len(self.keys))
+            return True
+
+    def save(self):
+        """Write the index file; only index_otoliths.py calls this."""
+        with self._lock:
+            tmp = self.path + ".tmp.npz"
+            np.savez(
+                tmp,
+                vectors=self.vectors,
+                keys=np.array(self.keys, dtype=str),
+                labels=np.array(self.labels, dtype=str),
+                sources=np.array(self.sources, dtype=str),
+                version=np.array(self.version or ""),
+            )
+            os.replace(tmp, self.path)
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def sync(self, db: Session, version: str) -> int:
+        """
+        Add the upload embeddings recorded (by any worker) since the last
+        sync; returns how many. Rows are read by generation, which
+        record_upload assigns in commit order, so a row that commits late
+        can never hide below a marker a previous sync already moved past.
+        """
+        rows = db.execute(text("""
+            SELECT generation, object_name, species, vector FROM otolith_embeddings
+            WHERE generation > :after AND version = :version
+            ORDER BY generation
+        """), {"after": self._synced_generation, "version": version}).all()
+        if not rows:
+            return 0
+        vectors = np.stack([np.frombuffer(row.vector, dtype=np.float32) for row in rows])
+        self.add(vectors, [row.object_name for row in rows], [row.species for row in rows],
+                 source="upload", version=version)
+        with self._lock:
+            self._synced_generation = max(self._synced_generation, rows[-1].generation)
+        return len(rows)
+
+    # ---------------- Building ----------------
+    def _build_lists(self, recluster: bool = True):
+        """Group every vector into IVF lists, running k-means first when recluster=True or none exist yet."""
+        n = self._size
+        if n < IVF_MIN_VECTORS:
+            self._centroids = self._lists = None
+            return
+        if recluster or self._centroids is None:
+            self._centroids = _kmeans(self.vectors, int(np.sqrt(n)))
+        assign = np.argmax(self.vectors @ self._centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.cumsum(np.bincount(assign, minlength=len(self._centroids)))[:-1]
+        self._lists = [chunk.tolist() for chunk in np.split(order, offsets)]
+
+    def _nearest_list(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self._centroids.T, axis=1)
+
+    def rebuild(self):
+        with self._lock:
+            self._build_lists(recluster=True)
+
+    def add(self, vectors: np.ndarray, keys: List[str], labels: List[str], source: str = "upload",
+            version: Optional[str] = None, recluster: bool = False):
+        """
+        Append (or replace, by key) entries. Without recluster only the given
+        vectors are assigned to their nearest existing list, so an add costs
+        O(len(vectors) * k * d) regardless of the index size.
+        """
+        with self._lock:
+            if version and self.version and version != self.version:
+                raise ValueError(f"Index was built with model {self.version}, not {version}; rebuild it")
+            self.version = version or self.version
+            vectors = np.asarray(vectors, dtype=np.float32)
+            touched = {}  # index -> None, in order; re-assigned to lists below
+            for vector, key, label in zip(vectors, keys, labels):
+                i = self._positions.get(key)
+                if i is None:
+                    i = self._size
+                    self._append_vectors(vector[None])
+                    self._positions[key] = i
+                    self.keys.append(key)
+                    self.labels.append(label)
+                    self.sources.append(source)
+                else:
+                    if self._lists is not None and i not in touched:
+                        # Centroids are fixed between reclusters, so this is the list i is in.
+                        self._lists[int(self._nearest_list(self._buffer[i][None])[0])].remove(i)
+                    self._buffer[i] = vector
+                    self.labels[i] = label
+                touched[i] = None
+
+            if recluster or (self._lists is None and self._size >= IVF_MIN_VECTORS):
+                self._build_lists(recluster=True)
+            elif self._lists is not None and touched:
+                indices = list(touched)
+                for i, list_id in zip(indices, self._nearest_list(self._buffer[indices])):
+                    self._lists[list_id].append(i)
+
+    # ---------------- Querying ----------------
+    def search(self, query: np.ndarray, k: int = 5, nprobe: int = IVF_NPROBE) -> List[dict]:
+        """k nearest entries to one unit query vector, best first."""
+        if not self.keys:
+            return []
+        with self._lock:
+            if self._centroids is None:
+                candidates = None
+                scores = self.vectors @ query
+            else:
+                lists = np.argsort(self._centroids @ query)[::-1][:nprobe]
+                candidates = np.concatenate([np.asarray(self._lists[i], dtype=np.int64) for i in lists])
+                scores = self.vectors[candidates] @ query
+            k = min(k, len(scores))
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            ids = top if candidates is None else candidates[top]
+            return [
+                {
+                    "key": self.keys[i],
+                    "species": self.labels[i],
+                    "source": self.sources[i],
+                    "similarity": round(float(s), 4),
+                }
+                for i, s in zip(ids, scores[top])
+            ]
+
+
+def record_upload(db: Session, object_name: str, species: str, version: str, vector: np.ndarray):
+    """
+    Store one upload's embedding in otolith_embeddings, the shared store
+    every worker's OtolithIndex.sync() reads. Each write (re-recording an
+    object included) is stamped with the next EMBEDDINGS_GENERATION. The
+    counter row stays locked until the caller's transaction ends, so
+    generations become visible strictly in order. Commit right after.
+    """
+    db.execute(text("""
+        WITH bump AS (
+            INSERT INTO data_generations (name, generation) VALUES (:counter, 1)
+            ON CONFLICT (name) DO UPDATE
+            SET generation = data_generations.generation + 1, updated_at = now()
+            RETURNING generation
+        )
+        INSERT INTO otolith_embeddings (object_name, species, version, vector, generation)
+        SELECT :object_name, :species, :version, :vector, bump.generation FROM bump
+        ON CONFLICT (object_name) DO UPDATE
+        SET species = EXCLUDED.species, version = EXCLUDED.version, vector = EXCLUDED.vector,
+            generation = EXCLUDED.generation
+    """), {
+        "counter": EMBEDDINGS_GENERATION,
+        "object_name": object_name,
+        "species": species,
+        "version": version,
+        "vector": np.asarray(vector, dtype=np.float32).tobytes(),
+    })
+
+
+def assess(neighbors: List[dict], threshold: float = NOVELTY_THRESHOLD) -> dict:
+    """
+    Open-set check on a neighbour list: the query is novel when even its best
+    match is below `threshold`; otherwise the neighbours vote on a species.
+    """
+    best = neighbors[0]["similarity"] if neighbors else None
+    novel = best is None or best < threshold
+    vote = Counter(n["species"] for n in neighbors if n["similarity"] >= threshold).most_common(1)
+    return {
+        "max_similarity": best,
+        "novel": novel,
+        "nearest_species": None if novel or not vote else vote[0][0],
+        "threshold": threshold,
+    }
+
+
+# Global instance (loaded on first use)
+otolith_index = OtolithIndex()
@@ -1,5 +1,5 @@
 # backend/app/models.py
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, TIMESTAMP, Date, Numeric, DateTime
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Text, LargeBinary, ForeignKey, TIMESTAMP, Date, Numeric, DateTime
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from geoalchemy2 import Geometry
@@ -32,6 +32,121 @@ class Sighting(Base):
 
     species = relationship("Species")
 
+# GeoAlchemy2 already adds the GiST index on location (idx_sightings_location).
+# Latest-first listing and keyset pages walk (sighting_date, id) backwards; date
+# ranges use a small BRIN (rows arrive roughly in date order); per-species filters
+# use (species_id, sighting_date). Kept in sync with alembic revision 9c2f4e7a1b3d.
+Index("idx_sightings_date_id", Sighting.sighting_date, Sighting.id)
+Index("idx_sightings_date_brin", Sighting.sighting_date, postgresql_using="brin")
+Index("idx_sightings_species_date", Sighting.species_id, Sighting.sighting_date)
+
+
+class SpeciesEnvStats(Base):
+    """
+    Running sufficient statistics of the environmental columns per species,
+    maintained by ingest (see app.core.env_stats). Global totals are the sums
+    over all rows, so correlations never need to scan sightings.
+    """
+    __tablename__ = "species_env_stats"
+
+    species_id = Column(Integer, ForeignKey("species.id", ondelete="CASCADE"), primary_key=True)
+    n = Column(BigInteger, nullable=False, default=0)
+    # Per variable: non-null count, sum and sum of squares
+    n_sst = Column(BigInteger, nullable=False, default=0)
+    sum_sst = Column(Float, nullable=False, default=0)
+    sumsq_sst = Column(Float, nullable=False, default=0)
+    n_sal = Column(BigInteger, nullable=False, default=0)
+    sum_sal = Column(Float, nullable=False, default=0)
+    sumsq_sal = Column(Float, nullable=False, default=0)
+    n_chl = Column(BigInteger, nullable=False, default=0)
+    sum_chl = Column(Float, nullable=False, default=0)
+    sumsq_chl = Column(Float, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class DataGeneration(Base):
+    """
+    Change counters bumped in the same transaction as the writes they track
+    (ingest bumps "sightings"); part of every versioned cache key, see
+    app.core.versioned_cache.
+    """
+    __tablename__ = "data_generations"
+
+    name = Column(String(32), primary_key=True)
+    generation = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class IngestCheckpoint(Base):
+    """
+    Resume point of a bulk_upload.py run, written in the same transaction as
+    the chunk it records, so a committed chunk is never replayed.
+    """
+    __tablename__ = "ingest_checkpoints"
+
+    source = Column(String, primary_key=True)           # absolute path of the input file
+    size = Column(BigInteger, nullable=False)
+    mtime = Column(Float, nullable=False)
+    chunksize = Column(Integer, nullable=False)
+    byte_offset = Column(BigInteger, nullable=False, default=0)  # end of the last committed chunk
+    chunks_committed = Column(Integer, nullable=False, default=0)
+    rows_committed = Column(BigInteger, nullable=False, default=0)
+    sightings_added = Column(BigInteger, nullable=False, default=0)
+    species_added = Column(Integer, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class CorrelationFinding(Base):
+    """
+    Significant species x variable correlations within one partition of
+    sightings (a geohash cell, a calendar month, or both), written by the
+    sweep job in app.core.region_sweep and ranked per partition by q_value,
+    then |r|.
+    """
+    __tablename__ = "correlation_findings"
+
+    id = Column(BigInteger, primary_key=True)
+    scope = Column(String(16), nullable=False)   # region | season | region_season
+    cell = Column(String(12))                    # geohash, NULL for scope=season
+    month = Column(Integer)                      # 1-12, NULL for scope=region
+    species_id = Column(Integer, ForeignKey("species.id", ondelete="CASCADE"), nullable=False)
+    variable = Column(String, nullable=False)
+    n = Column(Integer, nullable=False)
+    n_total = Column(Integer, nullable=False)
+    correlation = Column(Float, nullable=False)
+    strength = Column(Float, nullable=False)     # |correlation|
+    p_value = Column(Float, nullable=False)
+    q_value = Column(Float, nullable=False)      # Benjamini-Hochberg adjusted over the sweep
+    rank = Column(Integer, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+# /api/hypotheses reads the top finding of one partition, or of a whole scope, by index alone
+# (region_sweep.FINDINGS_ORDER).
+Index("idx_correlation_findings_partition", CorrelationFinding.scope, CorrelationFinding.cell,
+      CorrelationFinding.month, CorrelationFinding.rank)
+Index("idx_correlation_findings_scope_rank", CorrelationFinding.scope, CorrelationFinding.rank,
+      CorrelationFinding.q_value, CorrelationFinding.strength.desc())
+
+
+class OtolithEmbedding(Base):
+    """
+    Embeddings of uploaded otoliths, shared by every API worker's similarity
+    index (see app.ml.similarity.record_upload / OtolithIndex.sync).
+    """
+    __tablename__ = "otolith_embeddings"
+
+    id = Column(BigInteger, primary_key=True)
+    object_name = Column(String, unique=True, nullable=False)
+    species = Column(String, nullable=False)
+    version = Column(String(64), nullable=False)  # classifier embedding_version
+    vector = Column(LargeBinary, nullable=False)  # float32, L2-normalized
+    # data_generations "otolith_embeddings" value of the last write; increases in commit order
+    generation = Column(BigInteger, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+# sync() reads everything past the generation it last saw.
+Index("idx_otolith_embeddings_generation", OtolithEmbedding.generation)
+
 
 # 9. Define the Otolith class, mapping to the 'otoliths' table.
 class Otolith(Base):
@@ -52,12 +167,28 @@ class EdnaSequence(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     header = Column(Text, nullable=False)
-    sequence = Column(Text, nullable=False, index=True)   # <-- add index
+    sequence = Column(Text, nullable=True)   # NULL when the row is stored packed
     species_name = Column(String, nullable=True)
+    # 2-bit packed form (see app.core.sequence_codec); N/IUPAC runs live in sequence_exceptions
+    sequence_packed = Column(LargeBinary, nullable=True)
+    sequence_length = Column(Integer, nullable=True)
+    sequence_exceptions = Column(JSONB, nullable=True)
+    # SHA-256 of the normalized sequence, for exact-match lookups
+    sequence_hash = Column(String(64), nullable=True)
     # meta = Column(JSONB, default={})
     # workspace_id = Column(Integer, ForeignKey("workspaces.id"), nullable=True)
     # uploaded_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     # uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
 
-# add explicit index too (optional, but recommended for large datasets)
-Index("idx_sequence_text", EdnaSequence.sequence)
+# Exact lookups go through the fixed-size hash column instead of indexing the full text.
+# Approximate matching goes through EdnaKmer.
+Index("idx_edna_sequence_hash", EdnaSequence.sequence_hash)
+
+
+class EdnaKmer(Base):
+    """Inverted index of sequence minimizers used by approximate eDNA matching."""
+    __tablename__ = "edna_kmers"
+
+    # (kmer, sequence_id) primary key doubles as the lookup index for kmer = ANY(...)
+    kmer = Column(BigInteger, primary_key=True)
+    sequence_id = Column(Integer, ForeignKey("edna_sequences.id", ondelete="CASCADE"), primary_key=True)
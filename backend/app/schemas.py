@@ -34,8 +34,25 @@ class PaginatedSpeciesResponse(BaseModel):
 
 class EdnaMatchRequest(BaseModel):
     sequence: str
+    top_n: int = Field(5, ge=1, le=100)
+    min_identity: float = Field(90.0, ge=0, le=100)
+
+class EdnaRead(BaseModel):
+    id: Optional[str] = None
+    sequence: str
+
+class EdnaBatchMatchRequest(BaseModel):
+    reads: List[EdnaRead]
+
+class EdnaMatchHit(BaseModel):
+    sequence_id: int
+    header: str
+    species_name: Optional[str] = None
+    identity: float
+    shared_kmers: int
 
 class EdnaMatchResponse(BaseModel):
     success: bool
     matched: bool
-    header: str | None = None
\ No newline at end of file
+    header: str | None = None
+    matches: List[EdnaMatchHit] = []
\ No newline at end of file
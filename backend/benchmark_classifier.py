@@ -0,0 +1,141 @@
+# backend/benchmark_classifier.py
+
+import os
+import glob
+import json
+import time
+import argparse
+import resource
+import multiprocessing as mp
+
+import numpy as np
+
+DATASET_PATH = 'ml_model_data/otolith_dataset'
+
+
+def _rss_mb() -> float:
+    """Current resident set size of this process in MB (Linux), falling back to the peak."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_backend(name, model_path, images, labels, batch_size, queue):
+    """Runs in a fresh process so each backend's memory is measured on its own."""
+    try:
+        from app.ml.backends import load_backend
+        from app.ml.classifier import OtolithClassifier
+
+        rss_before = _rss_mb()
+        started = time.perf_counter()
+        backend = load_backend(name, model_path)
+        load_seconds = time.perf_counter() - started
+
+        with open(os.path.join('app', 'ml', 'class_indices.json')) as f:
+            class_names = {v: k for k, v in json.load(f).items()}
+        arrays = np.stack([OtolithClassifier.preprocess(image) for image in images])
+
+        backend.predict(arrays[:1])  # warm-up, not timed
+        latencies, predictions = [], []
+        for array in arrays:
+            t0 = time.perf_counter()
+            out = backend.predict(array[None])
+            latencies.append((time.perf_counter() - t0) * 1000)
+            predictions.append(class_names[int(np.argmax(out[0]))])
+
+        batch = np.zeros((batch_size, *arrays.shape[1:]), dtype=np.float32)
+        t0 = time.perf_counter()
+        for start in range(0, len(arrays), batch_size):
+            chunk = arrays[start:start + batch_size]
+            batch[:len(chunk)] = chunk
+            batch[len(chunk):] = 0
+            backend.predict(batch)
+        batch_seconds = time.perf_counter() - t0
+
+        queue.put({
+            "backend": name,
+            "model_path": model_path or "default",
+            "images": len(arrays),
+            "accuracy": round(float(np.mean([p == l for p, l in zip(predictions, labels)])), 4),
+            "load_seconds": round(load_seconds, 2),
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+            f"batch{batch_size}_images_per_second": round(len(arrays) / batch_seconds, 1),
+            "model_rss_mb": round(_rss_mb() - rss_before, 1),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        })
+    except Exception as e:
+        queue.put({"backend": name, "error": str(e)})
+
+
+def _load_dataset(dataset):
+    paths = sorted(glob.glob(os.path.join(dataset, '*', '*')))
+    labels = [os.path.basename(os.path.dirname(p)) for p in paths]
+    images = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            images.append(f.read())
+    return images, labels
+
+
+def _legacy_preprocess(image_bytes):
+    """The pre-app.ml.preprocessing path: full decode, convert, resize, then a float copy and a divide."""
+    import io
+    from PIL import Image
+    img = Image.open(io.BytesIO(image_bytes)).convert('RGB').resize((224, 224))
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+
+def benchmark_preprocessing(dataset, batch_size, repeats=5):
+    """Per-image preprocessing time: legacy path vs shared decode into a preallocated batch buffer."""
+    from app.ml import preprocessing
+    images, _ = _load_dataset(dataset)
+    batch = np.empty((batch_size, 224, 224, 3), dtype=np.float32)
+
+    def shared():
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            preprocessing.decode_batch(chunk, batch[:len(chunk)])
+
+    results = {}
+    for name, run in (("legacy", lambda: [_legacy_preprocess(i) for i in images]), ("shared", shared)):
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            run()
+        results[f"{name}_ms_per_image"] = round((time.perf_counter() - t0) * 1000 / (repeats * len(images)), 3)
+    print(json.dumps(results))
+    return results
+
+
+def benchmark(backends, dataset, batch_size):
+    images, labels = _load_dataset(dataset)
+    print(f"--- Benchmarking {len(images)} images from {dataset} ---")
+
+    ctx = mp.get_context('spawn')
+    results = []
+    for spec in backends:
+        name, _, model_path = spec.partition('=')
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_backend, args=(name, model_path or None, images, labels, batch_size, queue))
+        proc.start()
+        results.append(queue.get())
+        proc.join()
+        print(json.dumps(results[-1]))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare otolith classifier backends on accuracy, latency and memory.")
+    parser.add_argument("backends", nargs="*", default=["keras", "tflite"],
+                        help="Backends to compare, optionally as name=path (e.g. tflite=app/ml/int8.tflite)")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--preprocess", action="store_true", help="Only time image preprocessing, then exit")
+    args = parser.parse_args()
+
+    if args.preprocess:
+        benchmark_preprocessing(args.dataset, args.batch_size)
+    else:
+        benchmark(args.backends, args.dataset, args.batch_size)
@@ -0,0 +1,201 @@
+# backend/benchmark_queries.py
+
+import sys
+import json
+import argparse
+
+from sqlalchemy import text
+
+from app.database import engine
+
+# Scratch schema for the synthetic data; the real tables are never written to.
+SCHEMA = "tattva_bench"
+SPECIES = 500
+CHUNK_ROWS = 1_000_000
+DAYS = 9000  # ~25 years, ids ascend with the date like real ingests
+
+# Arabian Sea / Bay of Bengal box the synthetic sightings are spread over.
+LON_RANGE = (65.0, 95.0)
+LAT_RANGE = (5.0, 25.0)
+VIEWPORT = {"min_lon": 72.0, "min_lat": 15.0, "max_lon": 72.5, "max_lat": 15.5}
+CHAT_BOX = {"min_lon": 75.5, "min_lat": 9.5, "max_lon": 76.5, "max_lat": 10.5}
+
+# (name, where it comes from, SQL, indexes any one of which the plan must use).
+# The SQL mirrors what each endpoint sends; keep it in step with the services.
+QUERIES = [
+    ("sightings_latest", "/api/sightings", """
+        SELECT s.id, s.sighting_date, ST_Y(s.location), ST_X(s.location), sp.scientific_name
+        FROM sightings s LEFT JOIN species sp ON sp.id = s.species_id
+        WHERE s.location IS NOT NULL
+        ORDER BY s.sighting_date DESC, s.id DESC
+        LIMIT 100
+    """, {}, ("idx_sightings_date_id",)),
+    ("sightings_bbox", "/api/sightings?min_lat=...", """
+        SELECT s.id, s.sighting_date, ST_Y(s.location), ST_X(s.location), sp.scientific_name
+        FROM sightings s LEFT JOIN species sp ON sp.id = s.species_id
+        WHERE s.location IS NOT NULL
+          AND ST_Intersects(s.location, ST_MakeEnvelope(:min_lon, :min_lat, :max_lon, :max_lat, 4326))
+        ORDER BY s.sighting_date DESC, s.id DESC
+        LIMIT 100
+    """, VIEWPORT, ("idx_sightings_location", "idx_sightings_date_id")),
+    ("sightings_keyset", "/api/sightings?cursor=...", """
+        SELECT s.id, s.sighting_date, ST_Y(s.location), ST_X(s.location), sp.scientific_name
+        FROM sightings s LEFT JOIN species sp ON sp.id = s.species_id
+        WHERE s.location IS NOT NULL
+          AND (s.sighting_date, s.id) < (DATE '2010-06-30', :after_id)
+        ORDER BY s.sighting_date DESC, s.id DESC
+        LIMIT 100
+    """, {"after_id": 2**31 - 1}, ("idx_sightings_date_id",)),
+    ("species_date_range", "/api/sightings/export?species_id=...&date_from=...", """
+        SELECT s.id, s.sighting_date, s.sea_surface_temp_c
+        FROM sightings s
+        WHERE s.location IS NOT NULL AND s.species_id = :species_id
+          AND s.sighting_date >= DATE '2015-01-01' AND s.sighting_date <= DATE '2015-12-31'
+        ORDER BY s.id
+    """, {"species_id": 42}, ("idx_sightings_species_date",)),
+    ("date_range", "/api/sightings/export?date_from=...", """
+        SELECT count(*), avg(s.sea_surface_temp_c)
+        FROM sightings s
+        WHERE s.sighting_date >= DATE '2012-03-01' AND s.sighting_date <= DATE '2012-09-30'
+    """, {}, ("idx_sightings_date_brin", "idx_sightings_date_id")),
+    ("chat_context_top_species", "get_chat_context()", """
+        SELECT sp.scientific_name, sp.common_name, count(s.id) AS cnt
+        FROM species sp JOIN sightings s ON s.species_id = sp.id
+        WHERE ST_Intersects(s.location, ST_MakeEnvelope(:min_lon, :min_lat, :max_lon, :max_lat, 4326))
+        GROUP BY sp.id
+        ORDER BY cnt DESC
+        LIMIT 10
+    """, CHAT_BOX, ("idx_sightings_location",)),
+    ("map_clusters", "/api/sightings/map?zoom=9", """
+        SELECT count(*), mode() WITHIN GROUP (ORDER BY species_id)
+        FROM sightings
+        WHERE location IS NOT NULL
+          AND location && ST_MakeEnvelope(:min_lon, :min_lat, :max_lon, :max_lat, 4326)
+        GROUP BY ST_SnapToGrid(location, 0.00439)
+    """, VIEWPORT, ("idx_sightings_location",)),
+    ("vector_tile", "/api/tiles/sightings/12/2867/1841.mvt", """
+        WITH bounds AS (SELECT ST_TileEnvelope(12, 2867, 1841) AS geom)
+        SELECT count(*)
+        FROM sightings s, bounds b
+        WHERE s.location && ST_Transform(b.geom, 4326)
+    """, {}, ("idx_sightings_location",)),
+]
+
+
+def seed(rows: int):
+    """
+    Build SCHEMA.species / SCHEMA.sightings shaped like the migrated public
+    tables and fill them with `rows` synthetic sightings. Indexes are copied
+    from public.sightings after loading, so the benchmark measures exactly
+    what the migrations created.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        conn.execute(text(f"CREATE TABLE {SCHEMA}.species (LIKE public.species INCLUDING ALL)"))
+        conn.execute(text(f"CREATE TABLE {SCHEMA}.sightings (LIKE public.sightings INCLUDING ALL EXCLUDING INDEXES)"))
+        conn.execute(text(f"""
+            INSERT INTO {SCHEMA}.species (id, scientific_name, common_name)
+            SELECT g, 'Species ' || g, 'Fish ' || g FROM generate_series(1, :n) g
+        """), {"n": SPECIES})
+        indexes = conn.execute(text(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = 'public' AND tablename = 'sightings'"
+        )).scalars().all()
+
+    for start in range(1, rows + 1, CHUNK_ROWS):
+        stop = min(start + CHUNK_ROWS - 1, rows)
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                INSERT INTO {SCHEMA}.sightings
+                    (id, species_id, location, sighting_date, sea_surface_temp_c, salinity_psu, chlorophyll_mg_m3)
+                SELECT g,
+                       1 + (random() * (:species - 1))::int,
+                       ST_SetSRID(ST_MakePoint(:lon0 + random() * :lon_span, :lat0 + random() * :lat_span), 4326),
+                       DATE '2000-01-01' + (g::bigint * :days / :rows)::int,
+                       round((24 + random() * 8)::numeric, 2),
+                       round((33 + random() * 4)::numeric, 2),
+                       round((random() * 5)::numeric, 4)
+                FROM generate_series(:start, :stop) g
+            """), {
+                "species": SPECIES, "days": DAYS, "rows": rows, "start": start, "stop": stop,
+                "lon0": LON_RANGE[0], "lon_span": LON_RANGE[1] - LON_RANGE[0],
+                "lat0": LAT_RANGE[0], "lat_span": LAT_RANGE[1] - LAT_RANGE[0],
+            })
+        print(f"  loaded {stop:,} / {rows:,}", file=sys.stderr)
+
+    with engine.begin() as conn:
+        for indexdef in indexes:
+            conn.execute(text(indexdef.replace(" ON public.sightings ", f" ON {SCHEMA}.sightings ")))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"VACUUM ANALYZE {SCHEMA}.species"))
+        conn.execute(text(f"VACUUM ANALYZE {SCHEMA}.sightings"))
+
+
+def _indexes_used(node) -> list:
+    names = [node["Index Name"]] if "Index Name" in node else []
+    for child in node.get("Plans", []):
+        names.extend(_indexes_used(child))
+    return names
+
+
+def explain(conn, sql: str, params: dict) -> dict:
+    plan = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"), params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    plan = plan[0]
+    top = plan["Plan"]
+    return {
+        "indexes": _indexes_used(top),
+        "node": top["Node Type"],
+        "ms": round(plan["Execution Time"], 2),
+        "buffers": top.get("Shared Hit Blocks", 0) + top.get("Shared Read Blocks", 0),
+    }
+
+
+def run() -> list:
+    """EXPLAIN ANALYZE every query against SCHEMA; True in "ok" when the plan uses an expected index."""
+    results = []
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"SELECT count(*) FROM {SCHEMA}.sightings")).scalar()
+        conn.execute(text(f"SET search_path TO {SCHEMA}, public"))
+        for name, source, sql, params, expected in QUERIES:
+            result = explain(conn, sql, params)
+            result.update(query=name, source=source, rows=rows, expected=list(expected),
+                          ok=any(i in expected for i in result["indexes"]))
+            results.append(result)
+        conn.rollback()
+    return results
+
+
+def _print_table(results):
+    print(f"{'query':<26} {'ok':<4} {'ms':>9} {'buffers':>9}  indexes used")
+    for r in results:
+        used = ", ".join(dict.fromkeys(r["indexes"])) or "(none: " + r["node"] + ")"
+        print(f"{r['query']:<26} {'yes' if r['ok'] else 'NO':<4} {r['ms']:>9} {r['buffers']:>9}  {used}")
+    if results:
+        print(f"\n{results[0]['rows']:,} sightings in {SCHEMA}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that the sightings API queries use their indexes (EXPLAIN ANALYZE on synthetic data)."
+    )
+    parser.add_argument("--seed", type=int, metavar="ROWS", nargs="?", const=10_000_000,
+                        help=f"(Re)build the {SCHEMA} schema with ROWS synthetic sightings (default 10M) first")
+    parser.add_argument("--drop", action="store_true", help=f"Drop the {SCHEMA} schema and exit")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    if args.drop:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        sys.exit(0)
+    if args.seed:
+        seed(args.seed)
+
+    results = run()
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+    sys.exit(0 if all(r["ok"] for r in results) else 1)
@@ -1,101 +1,174 @@
 #backend/bulk_upload.py
 
-import pandas as pd
-from app.database import SessionLocal
-from app.models import Species, Sighting
-from geoalchemy2.shape import from_shape
-from shapely.geometry import Point
+import io
+import os
+import sys
+import time
 import logging
-from sqlalchemy.exc import IntegrityError
+import argparse
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, Tuple
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal, engine
+from app.core import ingest_service, env_stats, versioned_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def upload_csv_to_db(filepath: str):
+DEFAULT_CHUNK_SIZE = 100_000
+CHECKPOINT_COUNTERS = ("byte_offset", "chunks_committed", "rows_committed", "sightings_added", "species_added")
+
+
+# ---------------- Checkpointing ----------------
+def _file_fingerprint(filepath: str, chunksize: int) -> dict:
+    stat = os.stat(filepath)
+    return {"source": os.path.abspath(filepath), "size": stat.st_size, "mtime": stat.st_mtime, "chunksize": chunksize}
+
+
+def load_checkpoint(db: Session, fingerprint: dict) -> dict:
+    """Return the committed progress for this exact file + chunk size, or a fresh one."""
+    fresh = {**fingerprint, **dict.fromkeys(CHECKPOINT_COUNTERS, 0)}
+    saved = db.get(models.IngestCheckpoint, fingerprint["source"])
+    if saved is None:
+        return fresh
+    if any(getattr(saved, k) != v for k, v in fingerprint.items()):
+        logger.warning("Checkpoint for %s belongs to a different file or chunk size; starting over.", fingerprint["source"])
+        return fresh
+    return {**fingerprint, **{k: getattr(saved, k) for k in CHECKPOINT_COUNTERS}}
+
+
+def save_checkpoint(db: Session, checkpoint: dict):
+    """Record progress in the caller's transaction: it commits together with the chunk it describes."""
+    db.merge(models.IngestCheckpoint(**checkpoint))
+    db.flush()
+
+
+def clear_checkpoint(db: Session, source: str):
+    db.query(models.IngestCheckpoint).filter(models.IngestCheckpoint.source == source).delete()
+    db.commit()
+
+
+# ---------------- Reading ----------------
+def iter_line_chunks(handle: BinaryIO, lines_per_chunk: int) -> Iterator[Tuple[int, bytes]]:
+    """
+    Split a file into blocks of whole lines without parsing them, yielding
+    (offset after the block, raw bytes). Records must not span lines, which
+    holds for GBIF CSV/TSV exports.
+    """
+    while True:
+        lines = list(itertools.islice(handle, lines_per_chunk))
+        if not lines:
+            return
+        yield handle.tell(), b"".join(lines)
+
+
+def _parse_chunk(header: bytes, data: bytes, sep: str):
+    # Top-level so it can be pickled to the worker processes; tokenizing happens here, not in the parent.
+    malformed = ingest_service.MalformedLines()
+    chunk = pd.read_csv(io.BytesIO(header + data), sep=sep, dtype=str, engine="python", on_bad_lines=malformed)
+    cleaned, skipped = ingest_service.clean_sightings_chunk(chunk, require_species_rank=False, dayfirst=False)
+    skipped["malformed"] = malformed.take()
+    return cleaned, skipped, len(chunk) + skipped["malformed"]
+
+
+# ---------------- Loader ----------------
+def upload_csv_to_db(filepath: str, chunksize: int = DEFAULT_CHUNK_SIZE, workers: int = None, restart: bool = False):
     """
-    Reads a comma-separated CSV file from GBIF, cleans it, and uploads the sighting data
-    into the PostgreSQL database according to the defined models.
+    Loads a GBIF CSV into the database chunk by chunk.
+    The parent only splits the file into blocks of lines; parsing and
+    validation run across a process pool, and chunks are written in file
+    order through COPY, one transaction per chunk. Each transaction also
+    stores the byte offset reached in ingest_checkpoints, so a rerun seeks
+    straight past the committed chunks instead of replaying or re-reading them.
+    Raises on failure, after logging how to resume.
     """
+    workers = workers or os.cpu_count() or 1
+    models.IngestCheckpoint.__table__.create(bind=engine, checkfirst=True)
+
     db = SessionLocal()
+    started = time.perf_counter()
+    rows_this_run = 0
+    fingerprint = _file_fingerprint(filepath, chunksize)
     try:
-        logger.info(f"Reading data from {filepath}...")
-        df = pd.read_csv(filepath, sep=',', on_bad_lines='skip', low_memory=False)
-
-        logger.info("Cleaning and transforming data...")
-
-        # Rename columns to match model expectations
-        df = df.rename(columns={
-            'scientificName': 'scientific_name',
-            'decimalLatitude': 'latitude',
-            'decimalLongitude': 'longitude',
-            'eventDate': 'sighting_date',
-            'sst': 'sea_surface_temp_c',
-            'sss': 'salinity_psu',
-            'chlorophyll': 'chlorophyll_mg_m3'  # optional, if present
-        })
-
-        # Ensure required columns are present, fill missing ones with None
-        required_cols = ['scientific_name', 'latitude', 'longitude', 'sighting_date']
-        optional_cols = ['sea_surface_temp_c', 'salinity_psu', 'chlorophyll_mg_m3']
-        for col in required_cols + optional_cols:
-            if col not in df.columns:
-                df[col] = None
-
-        # Drop rows with missing essential data
-        df = df.dropna(subset=['scientific_name', 'latitude', 'longitude', 'sighting_date'])
-
-        # Convert sighting_date to datetime
-        df['sighting_date'] = pd.to_datetime(df['sighting_date'], errors='coerce')
-        df = df.dropna(subset=['sighting_date'])
-
-        logger.info(f"Processing {len(df)} valid records.")
-
-        # Load existing species for faster lookup
-        existing_species = {s.scientific_name: s.id for s in db.query(Species).all()}
-        new_sightings = []
-
-        for _, row in df.iterrows():
-            lat, lon = row['latitude'], row['longitude']
-            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
-                continue
-
-            species_id = existing_species.get(row['scientific_name'])
-            if not species_id:
-                # Create a new species record if it doesn't exist
-                new_species = Species(scientific_name=row['scientific_name'])
-                db.add(new_species)
-                db.flush()
-                species_id = new_species.id
-                existing_species[row['scientific_name']] = species_id
-
-            sighting = Sighting(
-                species_id=species_id,
-                location=from_shape(Point(lon, lat), srid=4326),
-                sighting_date=row['sighting_date'],
-                sea_surface_temp_c=row.get('sea_surface_temp_c'),
-                salinity_psu=row.get('salinity_psu'),
-                chlorophyll_mg_m3=row.get('chlorophyll_mg_m3')
-            )
-            new_sightings.append(sighting)
-
-        if new_sightings:
-            logger.info(f"Inserting {len(new_sightings)} sightings into the database...")
-            BATCH_SIZE = 1000
-            for i in range(0, len(new_sightings), BATCH_SIZE):
-                batch = new_sightings[i:i+BATCH_SIZE]
-                db.bulk_save_objects(batch)
+        if restart:
+            clear_checkpoint(db, fingerprint["source"])
+        checkpoint = load_checkpoint(db, fingerprint)
+        if checkpoint["chunks_committed"]:
+            logger.info(f"Resuming {filepath} after chunk {checkpoint['chunks_committed']} ({checkpoint['rows_committed']} rows).")
+
+        species_map = ingest_service.load_species_map(db)
+        with open(filepath, "rb") as handle, ProcessPoolExecutor(max_workers=workers) as pool:
+            sep = ingest_service.sniff_separator(handle, filepath)
+            header = handle.readline()
+            if checkpoint["byte_offset"]:
+                handle.seek(checkpoint["byte_offset"])
+
+            # Bounded window of in-flight chunks keeps memory flat regardless of file size.
+            pending = deque()
+            chunk_index = checkpoint["chunks_committed"]
+
+            def commit_next():
+                nonlocal rows_this_run
+                index, end_offset, future = pending.popleft()
+                cleaned, skipped, rows_read = future.result()
+                checkpoint["species_added"] += ingest_service.ensure_species(
+                    db, cleaned["scientific_name"].unique(), species_map
+                )
+                stats = env_stats.PendingStats()
+                checkpoint["sightings_added"] += ingest_service.copy_sightings(db, cleaned, species_map, stats)
+                stats.flush(db)
+                checkpoint["chunks_committed"] = index + 1
+                checkpoint["rows_committed"] += rows_read
+                checkpoint["byte_offset"] = end_offset
+                save_checkpoint(db, checkpoint)
+                versioned_cache.bump_generation(db)
                 db.commit()
-            logger.info("Upload complete.")
-        else:
-            logger.warning("No sightings to insert.")
+
+                rows_this_run += rows_read
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    f"Chunk {index + 1}: {checkpoint['rows_committed']} rows committed, "
+                    f"{sum(skipped.values())} skipped in chunk, {rows_this_run / elapsed:.0f} rows/s"
+                )
+
+            for end_offset, data in iter_line_chunks(handle, chunksize):
+                pending.append((chunk_index, end_offset, pool.submit(_parse_chunk, header, data, sep)))
+                chunk_index += 1
+                if len(pending) >= workers * 2:
+                    commit_next()
+            while pending:
+                commit_next()
+
+        env_stats.refresh_correlation_view(db)
+        logger.info(
+            f"Upload complete: {checkpoint['sightings_added']} sightings, "
+            f"{checkpoint['species_added']} new species, {checkpoint['rows_committed']} rows read."
+        )
+        clear_checkpoint(db, fingerprint["source"])
 
     except Exception as e:
-        logger.error(f"An error occurred: {e}", exc_info=True)
         db.rollback()
+        logger.error(f"An error occurred: {e}. Rerun to resume after the last committed chunk.", exc_info=True)
+        raise
     finally:
         db.close()
 
+
 if __name__ == "__main__":
-    GBIF_DATA_FILE = r"D:\Hackathons\SIH - 1\TATTVA\local_data\postgres_data\data.csv"  # Path to the uploaded file
-    upload_csv_to_db(GBIF_DATA_FILE)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Parallel, resumable GBIF sightings loader.")
+    parser.add_argument("filepath", help="Path to the GBIF CSV/TSV export")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per chunk / transaction")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and load from the start")
+    args = parser.parse_args()
+    try:
+        upload_csv_to_db(args.filepath, chunksize=args.chunksize, workers=args.workers, restart=args.restart)
+    except Exception:
+        sys.exit(1)
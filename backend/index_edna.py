@@ -0,0 +1,60 @@
+from app.database import SessionLocal
+from app.core import edna_index, edna_service
+import argparse
+import json
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def build_index():
+    """
+    Rebuilds the edna_kmers minimizer index over every stored eDNA sequence.
+    Run once after upgrading, or whenever edna_sequences was loaded outside the API.
+    """
+    db = SessionLocal()
+    try:
+        postings = edna_index.rebuild_index(db)
+        db.commit()
+        logger.info(f"eDNA match index rebuilt with {postings} postings.")
+    except Exception as e:
+        logger.error(f"An error occurred while building the eDNA index: {e}", exc_info=True)
+        db.rollback()
+    finally:
+        db.close()
+
+def convert_storage(packed: bool):
+    """
+    Backfills sequence_hash for older rows and, with packed=True, moves their
+    text into the 2-bit packed columns.
+    """
+    db = SessionLocal()
+    try:
+        updated = edna_service.convert_existing(db, packed=packed)
+        logger.info(f"Converted {updated} eDNA rows.")
+    except Exception as e:
+        logger.error(f"An error occurred while converting eDNA storage: {e}", exc_info=True)
+        db.rollback()
+    finally:
+        db.close()
+
+def print_storage_report():
+    db = SessionLocal()
+    try:
+        print(json.dumps(edna_service.storage_report(db), indent=2))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain eDNA storage and the match index.")
+    parser.add_argument("--hash-only", action="store_true", help="Backfill sequence_hash without packing")
+    parser.add_argument("--pack", action="store_true", help="Convert plain-text rows to 2-bit packed storage")
+    parser.add_argument("--report", action="store_true", help="Print column and index sizes, then exit")
+    args = parser.parse_args()
+
+    if args.report:
+        print_storage_report()
+    else:
+        if args.pack or args.hash_only:
+            convert_storage(packed=args.pack)
+        build_index()
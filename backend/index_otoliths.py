@@ -0,0 +1,108 @@
+# backend/index_otoliths.py
+
+import os
+import argparse
+import logging
+
+from app.core.minio_client import minio_client
+from app.database import SessionLocal
+from app.ml.classifier import otolith_classifier
+from app.ml.similarity import OtolithIndex, INDEX_PATH
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATASET_PATH = 'ml_model_data/otolith_dataset'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+BATCH_SIZE = 64
+
+
+def _label(folder: str) -> str:
+    return folder.replace('_', ' ')
+
+
+def _add(index, pending, source, version):
+    keys, labels, images = zip(*pending)
+    vectors, errors = otolith_classifier.embed_images(list(images))
+    keep = [i for i in range(len(keys)) if i not in errors]
+    for i, e in errors.items():
+        logger.warning(f"Skipping {keys[i]}: {e}")
+    if keep:
+        index.add(vectors[keep], [keys[i] for i in keep], [labels[i] for i in keep], source=source, version=version)
+    return len(keep)
+
+
+def index_dataset(index, dataset_path, version, skip):
+    """Labelled reference images: one folder per species."""
+    pending, added = [], 0
+    for folder in sorted(os.listdir(dataset_path)):
+        for name in sorted(os.listdir(os.path.join(dataset_path, folder))):
+            path = os.path.join(dataset_path, folder, name)
+            if not name.lower().endswith(IMAGE_EXTENSIONS) or path in skip:
+                continue
+            with open(path, 'rb') as f:
+                pending.append((path, _label(folder), f.read()))
+            if len(pending) >= BATCH_SIZE:
+                added += _add(index, pending, "dataset", version)
+                pending = []
+    if pending:
+        added += _add(index, pending, "dataset", version)
+    return added
+
+
+def index_bucket(index, bucket, version, skip):
+    """
+    Every image stored by /api/classify_otolith, labelled by its species
+    metadata (older uploads: by their species folder).
+    """
+    pending, added = [], 0
+    for obj in minio_client.list_objects(bucket, recursive=True):
+        key = obj.object_name
+        if not (key.startswith('sha256/') or key.lower().endswith(IMAGE_EXTENSIONS)) or key in skip:
+            continue
+        response = minio_client.get_object(bucket, key)
+        try:
+            label = response.headers.get('x-amz-meta-species') or _label(key.split('/', 1)[0])
+            pending.append((key, label, response.read()))
+        finally:
+            response.close()
+            response.release_conn()
+        if len(pending) >= BATCH_SIZE:
+            added += _add(index, pending, "upload", version)
+            pending = []
+            logger.info(f"Indexed {added} objects from '{bucket}'")
+    if pending:
+        added += _add(index, pending, "upload", version)
+    return added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the otolith embedding similarity index.")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="Labelled reference folder ('' to skip)")
+    parser.add_argument("--bucket", default="otoliths", help="MinIO bucket of stored uploads ('' to skip)")
+    parser.add_argument("--rebuild", action="store_true", help="Re-embed everything instead of only new images")
+    parser.add_argument("--output", default=INDEX_PATH)
+    args = parser.parse_args()
+
+    version = otolith_classifier.embedding_version
+    index = OtolithIndex(path=args.output)
+    if not args.rebuild and index.load() and index.version != version:
+        logger.warning(f"Index was built with model {index.version}; rebuilding for {version}.")
+        index = OtolithIndex(path=args.output)
+    # Uploads the API already embedded are taken from otolith_embeddings instead of re-embedded.
+    db = SessionLocal()
+    try:
+        synced = index.sync(db, version)
+    finally:
+        db.close()
+    skip = set(index.keys)
+
+    added = 0
+    if args.dataset:
+        added += index_dataset(index, args.dataset, version, skip)
+    if args.bucket:
+        added += index_bucket(index, args.bucket, version, skip)
+    # Re-cluster once at the end rather than on every batch.
+    index.rebuild()
+    index.save()
+    logger.info(f"Otolith index now holds {len(index)} vectors ({added} embedded, {synced} from uploads) at {args.output}.")
@@ -0,0 +1,48 @@
+# backend/tests/test_analytics_engine.py
+
+import numpy as np
+import pandas as pd
+from app.core import analytics_engine
+
+
+def _columns(n=2000, seed=3):
+    rng = np.random.default_rng(seed)
+    sst = rng.normal(27, 1.5, n)
+    frame = pd.DataFrame({
+        "species_id": rng.integers(1, 4, n).astype(float),
+        "sighting_date": pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 730, n), unit="D"),
+        "sea_surface_temp_c": sst,
+        "salinity_psu": np.where(rng.random(n) < 0.2, np.nan, 35 + 0.3 * (sst - 27) + rng.normal(0, 0.2, n)),
+        "chlorophyll_mg_m3": rng.gamma(2.0, 0.3, n),
+        "lat": rng.uniform(5, 20, n),
+        "lon": rng.uniform(70, 90, n),
+    })
+    return frame, analytics_engine._from_frame(frame)
+
+
+def test_correlation_matrix_matches_pandas_pairwise():
+    """
+    Tests that the matrix-product correlation matches pandas' pairwise-complete Pearson.
+    """
+    frame, columns = _columns()
+    result = analytics_engine.correlation_matrix(columns)
+    expected = frame[result["variables"]].corr()
+
+    assert np.allclose(np.array(result["matrix"], dtype=float), expected.to_numpy(), atol=1e-4)
+
+
+def test_species_zscores_and_seasonal_stats():
+    """
+    Tests the bincount group means against pandas and that every row lands in a month.
+    """
+    frame, columns = _columns()
+    zscores = analytics_engine.species_zscores(columns)
+    assert {row["species_id"] for row in zscores} == {1, 2, 3}
+    first = zscores[0]
+    subset = frame[frame["species_id"] == first["species_id"]]
+    assert abs(first["sea_surface_temp_c"]["mean"] - subset["sea_surface_temp_c"].mean()) < 1e-3
+
+    seasonal = analytics_engine.seasonal_stats(columns, window=3)
+    assert sum(seasonal["count"]) == len(frame)
+    january = frame[frame["sighting_date"].dt.month == 1]["chlorophyll_mg_m3"].mean()
+    assert abs(seasonal["chlorophyll_mg_m3"]["mean"][0] - january) < 1e-3
@@ -3,9 +3,12 @@
 from fastapi.testclient import TestClient
 from app.main import app
 import os
+import json
+import time
 import pytest 
 import mimetypes 
-from app.core import llm_service
+from app.core import llm_service, job_queue, region_sweep, versioned_cache
+from app.database import SessionLocal
 
 # 2. Create an instance of the TestClient.
 client = TestClient(app)
@@ -97,7 +100,11 @@ def test_get_hypotheses(monkeypatch):
     """
     # 1. Define a simple, fake function that mimics our real LLM service.
     #    It takes the same arguments but returns a predictable string instantly.
-    def mock_generate_hypothesis(finding: dict) -> str:
+    #    `generation` is the data generation the endpoint keys the hypothesis cache on.
+    generations = []
+
+    def mock_generate_hypothesis(finding: dict, generation: int = 0) -> str:
+        generations.append(generation)
         return "This is a mock hypothesis based on the finding."
 
     # 2. This is the core of the mock. We use pytest's `monkeypatch` fixture.
@@ -117,4 +124,257 @@ def test_get_hypotheses(monkeypatch):
     #    we never actually called the Google Gemini API.
     data = response.json()
     assert "hypothesis" in data
-    assert data["hypothesis"] == "This is a mock hypothesis based on the finding."
\ No newline at end of file
+    assert data["hypothesis"] == "This is a mock hypothesis based on the finding."
+
+    # 6. The endpoint passes the current data generation, so an ingest invalidates the cached text.
+    db = SessionLocal()
+    try:
+        assert generations == [versioned_cache.data_generation(db)]
+    finally:
+        db.close()
+
+def test_get_unknown_job_returns_404():
+    """
+    Tests that polling GET /api/jobs/{id} for a job that was never queued returns 404.
+    """
+    response = client.get("/api/jobs/does-not-exist")
+    assert response.status_code == 404
+
+
+def test_upload_csv_job_polls_to_done():
+    """
+    Tests that POST /api/upload/csv queues a job and that polling
+    GET /api/jobs/{id} follows it to success with its final progress.
+    """
+    csv_body = (
+        "scientificName,taxonRank,eventDate,decimalLatitude,decimalLongitude\n"
+        "Sardinella,GENUS,2024-01-05,17.5,83.2\n"
+        "Sardinella longiceps,SPECIES,2024-01-05,123.0,83.2\n"
+    )
+    response = client.post("/api/upload/csv", files={"file": ("sightings.csv", csv_body, "text/csv")})
+    assert response.status_code == 202
+    assert "minio_path" not in response.json()
+    job_id = response.json()["job_id"]
+
+    for _ in range(200):
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            break
+        time.sleep(0.05)
+    assert job["status"] == "succeeded", job["error"]
+    assert job["progress"]["stage"] == "done" and job["progress"]["percent"] == 100.0
+    assert job["result"]["sightings_added"] == 0 and job["result"]["rows_skipped"] == 2
+    assert job["result"]["minio_path"].startswith("uploads/")
+
+
+def test_classify_otolith_batch():
+    """
+    Tests the POST /api/classify_otolith/batch endpoint with several images in one request.
+    """
+    files = []
+    for name in ["test_image.jpg", "test_image.png"]:
+        path = os.path.join(os.path.dirname(__file__), name)
+        with open(path, "rb") as image_file:
+            files.append(("files", (name, image_file.read(), mimetypes.guess_type(path)[0])))
+
+    response = client.post("/api/classify_otolith/batch", files=files)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 2
+    assert [r["filename"] for r in data["results"]] == ["test_image.jpg", "test_image.png"]
+    for result in data["results"]:
+        assert result["predicted_species"] in ["Gadus morhua", "Sardinella longiceps"]
+    assert data["images_per_second"] > 0
+
+
+def test_classify_otolith_batch_rejects_oversized_archives():
+    """
+    Tests that a zip whose member would expand past the per-image limit is
+    rejected before it is decompressed.
+    """
+    import io
+    import zipfile
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("bomb.png", b"\0" * (64 * 1024 * 1024))
+
+    response = client.post("/api/classify_otolith/batch", files=[("files", ("bomb.zip", buffer.getvalue(), "application/zip"))])
+
+    assert response.status_code == 413
+
+
+def test_classify_otolith_ready(monkeypatch):
+    """
+    Tests that the GET /api/classify_otolith/ready probe answers 503 until
+    the classifier is ready, 200 once it is, and 503 again if loading failed.
+    """
+    from app.main import otolith_classifier
+
+    for status, code in [("cold", 503), ("loading", 503), ("warming", 503), ("ready", 200), ("failed", 503)]:
+        monkeypatch.setattr(otolith_classifier, "status", status)
+        response = client.get("/api/classify_otolith/ready")
+        assert response.status_code == code
+        assert response.json()["status"] == status
+        assert response.json()["ready"] is (code == 200)
+
+
+def test_get_correlations_ranked():
+    """
+    Tests the GET /api/correlations endpoint returns the ranking best |r| first.
+    """
+    response = client.get("/api/correlations", params={"top": 5})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == len(data["correlations"]) <= 5
+    strengths = [abs(row["correlation"]) for row in data["correlations"]]
+    assert strengths == sorted(strengths, reverse=True)
+
+
+def test_get_correlation_findings():
+    """
+    Tests the GET /api/analysis/findings endpoint returns sweep findings by
+    partition rank, then most significant first, and that /api/hypotheses
+    explains the first of them.
+    """
+    response = client.get("/api/analysis/findings", params={"scope": "season", "top": 10})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == len(data["findings"]) <= 10
+    order = [(row["rank"], row["q_value"], -abs(row["correlation"])) for row in data["findings"]]
+    assert order == sorted(order)
+    assert all(row["p_value"] <= row["q_value"] for row in data["findings"])
+    assert all(row["scope"] == "season" and 1 <= row["month"] <= 12 for row in data["findings"])
+    if data["findings"]:
+        db = SessionLocal()
+        try:
+            top = region_sweep.top_finding(db, "season")
+        finally:
+            db.close()
+        first = data["findings"][0]
+        assert (top["month"], top["species_id"], top["variable"]) == (first["month"], first["species_id"], first["variable"])
+
+
+def test_get_sightings_map_modes():
+    """
+    Tests that GET /api/sightings/map clusters at low zoom and covers every sighting.
+    """
+    response = client.get("/api/sightings/map", params={"zoom": 2})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["mode"] == "clusters"
+    assert data["total"] == sum(c["count"] for c in data["clusters"]) > 0
+    for cluster in data["clusters"]:
+        assert str(cluster["species_id"]) in data["species"] or cluster["species_id"] is None
+
+    response = client.get("/api/sightings/map", params={
+        "zoom": 14, "min_lat": 17.6, "min_lon": 83.2, "max_lat": 17.8, "max_lon": 83.4,
+    })
+    assert response.status_code == 200
+    assert response.json()["mode"] in ["points", "clusters"]
+
+
+def test_get_sightings_tile():
+    """
+    Tests that GET /api/tiles/sightings/{z}/{x}/{y}.mvt returns a vector tile that revalidates by ETag.
+    """
+    response = client.get("/api/tiles/sightings/0/0/0.mvt")
+
+    assert response.status_code in (200, 204)
+    if response.status_code == 200:
+        assert response.headers["content-type"] == "application/vnd.mapbox-vector-tile"
+        assert len(response.content) > 0
+    etag = response.headers["etag"]
+    assert client.get("/api/tiles/sightings/0/0/0.mvt", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/tiles/sightings/1/2/0.mvt").status_code == 400
+
+
+def test_get_sightings_keyset_pages():
+    """
+    Tests that following X-Next-Cursor walks /api/sightings without overlap.
+    """
+    first = client.get("/api/sightings", params={"limit": 2})
+    assert first.status_code == 200
+    cursor = first.headers.get("x-next-cursor")
+    if cursor is None:
+        return  # fewer than two sightings seeded
+    second = client.get("/api/sightings", params={"limit": 2, "cursor": cursor})
+    assert second.status_code == 200
+    first_ids = {s["sighting_id"] for s in first.json()}
+    assert first_ids.isdisjoint(s["sighting_id"] for s in second.json())
+    assert client.get("/api/sightings", params={"cursor": "bogus"}).status_code == 400
+
+
+def test_export_sightings_ndjson():
+    """
+    Tests that GET /api/sightings/export streams one JSON object per line.
+    """
+    response = client.get("/api/sightings/export", params={"format": "ndjson"})
+
+    assert response.status_code == 200
+    lines = [line for line in response.text.splitlines() if line]
+    assert all(json.loads(line)["id"] for line in lines)
+
+
+def test_match_edna_batch_streams_ndjson(monkeypatch):
+    """
+    Tests that POST /api/edna/match/batch streams one line per read plus a
+    summary, for a JSON body and a FASTA upload, and that the upload's temp
+    copy is gone once the response is done.
+    """
+    response = client.post("/api/edna/match/batch", json=["ACGT" * 30, {"id": "r2", "sequence": "GGCCTTAA" * 20}])
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert {line["read_id"] for line in lines[:-1]} == {"0", "r2"}
+    assert lines[-1]["summary"]["reads"] == 2
+
+    paths = []
+    persist_upload = job_queue.persist_upload
+    monkeypatch.setattr(job_queue, "persist_upload", lambda upload, suffix: paths.append(persist_upload(upload, suffix)) or paths[-1])
+    fasta = b">a\n" + b"ACGT" * 30 + b"\n>b\n" + b"TTGGCCAA" * 20 + b"\n>c\nACGTAC\n"
+    response = client.post("/api/edna/match/batch", files={"file": ("reads.fasta", fasta, "text/plain")})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert {line["read_id"] for line in lines[:-1]} == {"a", "b", "c"}
+    assert lines[-1]["summary"]["reads"] == 3
+    assert len(paths) == 1 and not os.path.exists(paths[0])
+
+
+def test_get_sightings_compact():
+    """
+    Tests that format=compact returns columnar arrays and a species dictionary.
+    """
+    response = client.get("/api/sightings", params={"format": "compact", "limit": 50})
+
+    assert response.status_code == 200
+    data = response.json()
+    columns = data["columns"]
+    assert len(columns["id"]) == len(columns["latitude"]) == data["count"] <= 50
+    assert all(str(s) in data["species"] for s in columns["species_id"] if s is not None)
+
+
+def test_get_sightings_limit_is_clamped_the_same_in_both_formats():
+    """
+    Tests that a non-positive limit falls back to the same default page size for rows and compact.
+    """
+    rows = client.get("/api/sightings", params={"limit": 0})
+    compact = client.get("/api/sightings", params={"format": "compact", "limit": 0})
+
+    assert rows.status_code == compact.status_code == 200
+    assert len(rows.json()) == compact.json()["count"]
+
+
+def test_similar_otoliths_rejects_oversized_upload(monkeypatch):
+    """
+    Tests that POST /api/otoliths/similar answers 413 for an image over the per-image byte limit, before decoding it.
+    """
+    from app import main
+    monkeypatch.setattr(main, "MAX_BATCH_IMAGE_BYTES", 16)
+
+    response = client.post("/api/otoliths/similar", files={"file": ("big.png", b"x" * 17, "image/png")})
+
+    assert response.status_code == 413
@@ -0,0 +1,75 @@
+# backend/tests/test_backends.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.ml.backends import TFLiteBackend
+
+
+class FakeInterpreter:
+    """Records tensors and fails if two callers are inside resize/invoke at once."""
+
+    def __init__(self, dtype=np.int8, quantization=(0.5, 0)):
+        self.dtype, self.quantization = dtype, quantization
+        self.shape = [1, 4]
+        self.inputs, self.allocations = [], 0
+        self._busy = threading.Lock()
+
+    def get_input_details(self):
+        return [{"index": 0, "shape": np.array(self.shape), "dtype": self.dtype, "quantization": self.quantization}]
+
+    def get_output_details(self):
+        return [{"index": 1, "dtype": np.float32, "quantization": (0.0, 0)}]
+
+    def resize_tensor_input(self, index, shape):
+        self.shape = list(shape)
+
+    def allocate_tensors(self):
+        self.allocations += 1
+
+    def set_tensor(self, index, value):
+        assert self._busy.acquire(blocking=False), "concurrent set_tensor/invoke"
+        self.inputs.append(value)
+
+    def invoke(self):
+        threading.Event().wait(0.01)
+        self._current = self.inputs[-1].astype(np.float32)
+        self._busy.release()
+
+    def get_tensor(self, index):
+        return self._current.copy()
+
+
+def _backend(interpreter):
+    backend = TFLiteBackend.__new__(TFLiteBackend)
+    backend.interpreter = interpreter
+    backend._input = interpreter.get_input_details()[0]
+    backend._output = interpreter.get_output_details()[0]
+    backend._batch_size = 1
+    backend._lock = threading.Lock()
+    return backend
+
+
+def test_tflite_quantized_input_is_clipped():
+    """
+    Tests that quantized inputs outside the int8 range saturate instead of wrapping around.
+    """
+    interpreter = FakeInterpreter()
+    backend = _backend(interpreter)
+    backend.predict(np.array([[100.0, -100.0, 1.0, 0.0]], dtype=np.float32))
+    assert interpreter.inputs[-1].tolist() == [[127, -128, 2, 0]]
+
+
+def test_tflite_predict_is_serialized_across_threads():
+    """
+    Tests that concurrent callers with alternating batch sizes never overlap inside the interpreter.
+    """
+    interpreter = FakeInterpreter(dtype=np.float32, quantization=(0.0, 0))
+    backend = _backend(interpreter)
+    sizes = [1, 16, 1, 16, 2, 16, 1, 8]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        outputs = list(pool.map(lambda n: backend.predict(np.full((n, 4), n, dtype=np.float32)), sizes))
+    for n, out in zip(sizes, outputs):
+        assert out.shape == (n, 4) and (out == n).all()
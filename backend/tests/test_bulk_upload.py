@@ -0,0 +1,67 @@
+# backend/tests/test_bulk_upload.py
+
+import io
+
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import bulk_upload
+from app import models
+
+CSV = (
+    "scientificName\teventDate\tdecimalLatitude\tdecimalLongitude\n"
+    + "".join(f"Species {i}\t2023-01-{1 + i % 28:02d}\t10.{i}\t76.{i}\n" for i in range(10))
+).encode()
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    models.IngestCheckpoint.__table__.create(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_checkpoint_commits_and_rolls_back_with_its_chunk():
+    """
+    Tests that a checkpoint only advances when its transaction commits, and
+    that a checkpoint for a changed file or chunk size is ignored.
+    """
+    db = _session()
+    fingerprint = {"source": "/data/gbif.tsv", "size": 100, "mtime": 1.5, "chunksize": 4}
+    checkpoint = bulk_upload.load_checkpoint(db, fingerprint)
+    assert checkpoint["chunks_committed"] == 0 and checkpoint["byte_offset"] == 0
+
+    checkpoint.update(chunks_committed=1, byte_offset=40, rows_committed=4)
+    bulk_upload.save_checkpoint(db, checkpoint)
+    db.commit()
+    # A crash before the next commit loses that chunk's rows and its checkpoint together.
+    bulk_upload.save_checkpoint(db, {**checkpoint, "chunks_committed": 2, "byte_offset": 80})
+    db.rollback()
+
+    resumed = bulk_upload.load_checkpoint(db, fingerprint)
+    assert (resumed["chunks_committed"], resumed["byte_offset"], resumed["rows_committed"]) == (1, 40, 4)
+    assert bulk_upload.load_checkpoint(db, {**fingerprint, "size": 101})["chunks_committed"] == 0
+
+    bulk_upload.clear_checkpoint(db, fingerprint["source"])
+    assert bulk_upload.load_checkpoint(db, fingerprint)["chunks_committed"] == 0
+
+
+def test_resume_from_byte_offset_reads_only_the_remaining_rows():
+    """
+    Tests that line chunks parsed on their own give the same rows as parsing
+    the whole file, and that seeking to a chunk's end offset resumes exactly
+    after it.
+    """
+    handle = io.BytesIO(CSV)
+    header = handle.readline()
+    chunks = list(bulk_upload.iter_line_chunks(handle, 4))
+    assert [len(data.splitlines()) for _, data in chunks] == [4, 4, 2]
+
+    parsed = [bulk_upload._parse_chunk(header, data, "\t") for _, data in chunks]
+    names = [name for cleaned, _, _ in parsed for name in cleaned["scientific_name"]]
+    assert names == list(pd.read_csv(io.BytesIO(CSV), sep="\t")["scientificName"])
+    assert [rows for _, _, rows in parsed] == [4, 4, 2]
+
+    handle.seek(chunks[0][0])
+    remaining = list(bulk_upload.iter_line_chunks(handle, 4))
+    assert [data for _, data in remaining] == [data for _, data in chunks[1:]]
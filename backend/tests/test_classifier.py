@@ -0,0 +1,95 @@
+# backend/tests/test_classifier.py
+
+import threading
+
+import numpy as np
+import pytest
+
+from app.ml import backends, classifier
+from app.ml.classifier import OtolithClassifier
+
+
+class FakeModel:
+    """Backend stand-in that records the batch shapes and the classifier status it was called under."""
+
+    name = "fake"
+
+    def __init__(self, status, release: threading.Event = None):
+        self.status, self.release = status, release
+        self.calls = []
+
+    def predict(self, batch):
+        if self.release is not None:
+            self.release.wait(5)
+        self.calls.append((batch.shape[0], self.status()))
+        return np.zeros((batch.shape[0], 2), dtype=np.float32)
+
+
+def test_readiness_goes_cold_loading_warming_ready(monkeypatch):
+    """
+    Tests that readiness() reports not ready while cold, loading and
+    warming, and ready only after warm_up has run every batch shape.
+    """
+    statuses, release = [], threading.Event()
+    model = FakeModel(lambda: clf.status, release)
+
+    def load_backend(name):
+        statuses.append(clf.readiness()["status"])
+        return model
+
+    monkeypatch.setattr(classifier, "load_backend", load_backend)
+    clf = OtolithClassifier(backend="keras")
+    assert clf.readiness()["ready"] is False and clf.readiness()["status"] == "cold"
+
+    thread = clf.warm_up_in_background()
+    for _ in range(500):
+        if clf.status == "warming":
+            break
+        threading.Event().wait(0.01)
+    assert statuses == ["loading"]
+    assert clf.readiness()["ready"] is False and clf.readiness()["status"] == "warming"
+    release.set()
+    thread.join(5)
+
+    readiness = clf.readiness()
+    assert readiness["ready"] is True and readiness["status"] == "ready"
+    assert readiness["load_seconds"] is not None and readiness["warmup_seconds"] is not None
+    assert sorted(size for size, _ in model.calls) == sorted({1, classifier.INFERENCE_BATCH_SIZE})
+    assert {status for _, status in model.calls} == {"warming"}
+
+
+def test_readiness_reports_failed_load(monkeypatch):
+    """
+    Tests that a failing model load leaves the classifier not ready, with the error, after warm_up.
+    """
+    def load_backend(name):
+        raise FileNotFoundError("otolith_model.h5")
+
+    monkeypatch.setattr(classifier, "load_backend", load_backend)
+    clf = OtolithClassifier(backend="keras")
+    clf.warm_up()
+
+    readiness = clf.readiness()
+    assert readiness["ready"] is False
+    assert readiness["status"] == "failed" and "otolith_model.h5" in readiness["error"]
+    with pytest.raises(FileNotFoundError):
+        clf.get_model_and_classes()
+
+
+def test_embedding_version_follows_the_keras_model(monkeypatch, tmp_path):
+    """
+    Tests that with a TFLite serving model the embedding version fingerprints
+    the Keras .h5 that embed() loads, not the serving export.
+    """
+    monkeypatch.setattr(backends, "ML_DIR", str(tmp_path))
+    keras_file, tflite_file = tmp_path / backends.MODEL_FILES["keras"], tmp_path / backends.MODEL_FILES["tflite"]
+    keras_file.write_bytes(b"h5")
+    tflite_file.write_bytes(b"tflite")
+    clf = OtolithClassifier(backend="tflite")
+    assert clf.embedding_model_path == str(keras_file)
+    version = clf.embedding_version
+
+    tflite_file.write_bytes(b"re-exported tflite")
+    assert clf.embedding_version == version
+    keras_file.write_bytes(b"retrained h5")
+    assert clf.embedding_version != version
@@ -0,0 +1,142 @@
+# backend/tests/test_edna_index.py
+
+import random
+from collections import Counter
+
+from app.core import edna_index
+from app.core.sequence_codec import encode_codes, sequence_hash
+
+
+def _levenshtein(a: str, b: str) -> int:
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j - 1] + (ca != cb), prev[j] + 1, cur[j - 1] + 1))
+        prev = cur
+    return prev[-1]
+
+
+def test_banded_identity_matches_full_edit_distance():
+    """
+    Tests that the vectorized banded alignment agrees with a plain
+    edit distance when the edits stay inside the band.
+    """
+    rng = random.Random(7)
+    query = "".join(rng.choice("ACGT") for _ in range(120))
+    targets = [query, query[:100], query[:40] + "TTT" + query[40:], query.replace("A", "C", 3)]
+
+    identities = edna_index.banded_identity(encode_codes(query), [encode_codes(t) for t in targets])
+
+    for target, identity in zip(targets, identities):
+        expected = 100 * (1 - _levenshtein(query, target) / max(len(query), len(target)))
+        assert abs(identity - expected) < 1e-9
+    assert identities[0] == 100.0
+
+
+def test_minimizers_are_shared_by_similar_sequences():
+    rng = random.Random(3)
+    query = "".join(rng.choice("ACGT") for _ in range(200))
+    mutated = query[:100] + ("A" if query[100] != "A" else "C") + query[101:]
+    unrelated = "".join(rng.choice("ACGT") for _ in range(200))
+
+    q = set(edna_index.minimizers(encode_codes(query)))
+    assert len(q & set(edna_index.minimizers(encode_codes(mutated)))) > len(q) // 2
+    assert not q & set(edna_index.minimizers(encode_codes(unrelated)))
+    assert len(edna_index.minimizers(encode_codes("ACGTN" * 3))) == 0
+
+
+class FakeIndexSession:
+    """
+    Answers the edna_index queries from in-memory references, the way the SQL
+    would, and records every batch candidate query it receives.
+    """
+
+    def __init__(self, references):
+        self.references = references
+        self.postings = {sid: set(edna_index.minimizers(encode_codes(seq))) for sid, seq in references.items()}
+        self.batch_queries = []
+
+    def _top(self, kmers, limit):
+        shared = Counter(sid for kmer in kmers for sid, postings in self.postings.items() if kmer in postings)
+        return sorted(shared.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def _row(self, sid):
+        seq = self.references[sid]
+        return (sid, f"ref{sid}", f"Species {sid}", seq, None, len(seq), None)
+
+    def execute(self, statement, params):
+        sql = str(statement)
+        if "unnest" in sql:
+            self.batch_queries.append(params)
+            per_read = {}
+            for idx, kmer in zip(params["read_idx"], params["kmers"]):
+                per_read.setdefault(idx, []).append(kmer)
+            rows = [(idx, sid, n) for idx, kmers in per_read.items() for sid, n in self._top(kmers, params["limit"])]
+        elif "FROM edna_kmers" in sql:
+            rows = self._top(params["kmers"], params["limit"])
+        elif "sequence_hash = ANY" in sql:
+            rows = [self._row(sid)[:3] + (sequence_hash(seq),) for sid, seq in self.references.items()
+                    if sequence_hash(seq) in params["hashes"]]
+        elif "sequence_hash = :hash" in sql:
+            rows = [self._row(sid)[:3] for sid, seq in self.references.items() if sequence_hash(seq) == params["hash"]]
+        else:
+            rows = [self._row(sid) for sid in params["ids"]]
+        return type("Result", (list,), {"all": lambda self: list(self)})(rows)
+
+
+def _references(n=12, length=240, seed=5):
+    rng = random.Random(seed)
+    return {sid: "".join(rng.choice("ACGT") for _ in range(length)) for sid in range(1, n + 1)}
+
+
+def test_find_candidates_batch_sends_one_query_and_splits_per_read():
+    """
+    Tests that the batch query is sent once with the reads' minimizers
+    flattened into parallel arrays, and that the rows come back per read
+    exactly as find_candidates() returns them one at a time.
+    """
+    references = _references()
+    db = FakeIndexSession(references)
+    reads = [references[2][10:200], references[7][:150], "ACGTN" * 3, references[11][50:]]
+    read_minimizers = [edna_index.minimizers(encode_codes(r)) for r in reads]
+
+    batch = edna_index.find_candidates_batch(db, read_minimizers, limit=3)
+
+    assert len(db.batch_queries) == 1
+    params = db.batch_queries[0]
+    assert len(params["read_idx"]) == len(params["kmers"]) == sum(len(m) for m in read_minimizers)
+    assert 2 not in params["read_idx"]
+    assert batch == [edna_index.find_candidates(db, m, limit=3) for m in read_minimizers]
+    assert batch[2] == [] and batch[0][0][0] == 2 and batch[1][0][0] == 7
+    assert edna_index.find_candidates_batch(db, [read_minimizers[2]]) == [[]]
+
+
+def test_batch_search_on_spawned_pool_matches_search(monkeypatch):
+    """
+    Tests that batch_search, with alignments on a two-process spawn pool and
+    several batches, gives every read the same hits as search(), including
+    exact-hash fallbacks for reads without minimizers.
+    """
+    references = _references()
+    references[13] = "ACGTACGTAC"
+    db = FakeIndexSession(references)
+    rng = random.Random(9)
+    reads = [(f"read{sid}", references[sid][rng.randrange(40):][:160]) for sid in range(1, 13)]
+    reads += [("exact", "ACGTACGTAC"), ("unknown", "TTTTGGGG")]
+
+    monkeypatch.setattr(edna_index, "MATCH_WORKERS", 2)
+    monkeypatch.setattr(edna_index, "_pool", None)
+    try:
+        results = list(edna_index.batch_search(db, iter(reads), top_n=3, batch_size=5))
+        assert edna_index._pool._mp_context.get_start_method() == "spawn"
+    finally:
+        edna_index._pool.shutdown()
+
+    assert sorted(r["read_id"] for r in results) == sorted(read_id for read_id, _ in reads)
+    by_read = {r["read_id"]: r for r in results}
+    for read_id, sequence in reads:
+        assert by_read[read_id]["matches"] == edna_index.search(db, sequence, top_n=3)
+    assert by_read["read4"]["matches"][0]["sequence_id"] == 4
+    assert by_read["exact"]["matches"][0]["identity"] == 100.0
+    assert by_read["unknown"] == {"read_id": "unknown", "matched": False, "matches": []}
@@ -0,0 +1,84 @@
+# backend/tests/test_edna_service.py
+
+import io
+import csv
+import gzip
+
+from app.core import edna_service
+from app.core.sequence_codec import unpack_sequence
+
+FASTA = b">read1 species=Sardinella_longiceps\nACGTACGTNN\nACGT\n>read2\nacguacguacguacguacgu\n"
+
+
+class FakeCursor:
+    def __init__(self, copies):
+        self.copies = copies
+
+    def copy_expert(self, sql, buffer):
+        self.copies.append((sql, buffer.getvalue()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Hands out ids like nextval() and records COPY statements instead of running them."""
+
+    def __init__(self):
+        self.copies, self.next_id, self.commits = [], 100, 0
+        # db.connection().connection is the raw DB-API connection COPY runs on.
+        self.connection = lambda: type("Connection", (), {"connection": self})()
+
+    def cursor(self):
+        return FakeCursor(self.copies)
+
+    def execute(self, statement, params):
+        ids = list(range(self.next_id, self.next_id + params["n"]))
+        self.next_id += params["n"]
+        return type("Result", (), {"scalars": lambda _: type("Scalars", (), {"all": lambda _: ids})()})()
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_copy_edna_batch_writes_rows_and_index_postings(monkeypatch):
+    """
+    Tests that a batch is COPYed with reserved ids, the species parsed from
+    the header and the packed columns, followed by its k-mer postings.
+    """
+    columns = edna_service.sequence_columns
+    monkeypatch.setattr(edna_service, "sequence_columns", lambda sequence: columns(sequence, packed=True))
+    db = FakeSession()
+    sequence = "ACGT" * 20 + "NN" + "TTGCA" * 10
+    assert edna_service.copy_edna_batch(db, [("read1 species=Sardinella_longiceps", sequence)]) == 1
+
+    (rows_sql, rows_csv), (kmers_sql, kmers_tsv) = db.copies
+    assert rows_sql.startswith("COPY edna_sequences (id, header, sequence,")
+    row = next(csv.reader(io.StringIO(rows_csv)))
+    assert row[0] == "100" and row[2] == "" and row[3] == "Sardinella_longiceps"
+    assert unpack_sequence(bytes.fromhex(row[4][2:]), int(row[5]), [[80, "NN"]]) == sequence
+    assert row[6] == '[[80, "NN"]]'
+    assert kmers_sql.startswith("COPY edna_kmers")
+    assert kmers_tsv and all(line.split("\t")[1] == "100" for line in kmers_tsv.splitlines())
+
+
+def test_ingest_fasta_reads_gzip_and_leaves_commit_to_caller(monkeypatch):
+    """
+    Tests that a gzipped FASTA is decompressed on the fly, parsed into
+    batches, and that ingest_fasta never commits on its own.
+    """
+    monkeypatch.setattr(edna_service, "EDNA_BATCH_SIZE", 1)
+    db = FakeSession()
+    handle = edna_service.open_fasta_text(io.BytesIO(gzip.compress(FASTA)), "reads.fa.gz")
+    stats = edna_service.ingest_fasta(db, handle)
+
+    assert stats["inserted"] == 2
+    assert db.commits == 0
+    rows = [next(csv.reader(io.StringIO(body))) for sql, body in db.copies if "edna_sequences" in sql]
+    assert [r[0] for r in rows] == ["100", "101"]
+    assert rows[0][1] == "read1 species=Sardinella_longiceps"
+    assert rows[0][2] == "ACGTACGTNNACGT"
+    assert rows[1][2] == "acguacguacguacguacgu"
@@ -0,0 +1,93 @@
+# backend/tests/test_env_stats.py
+
+import math
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from app.core import env_stats
+
+
+def _as_arrays(frame):
+    return {c: frame[c].to_numpy(dtype=float) for c in ["species_id"] + env_stats.STAT_COLUMNS}
+
+
+def test_correlations_from_running_stats_match_direct_computation():
+    """
+    Tests that statistics accumulated chunk by chunk give the same
+    point-biserial correlations as computing them over all rows at once.
+    """
+    rng = np.random.default_rng(1)
+    n = 600
+    frame = pd.DataFrame({
+        "species_id": rng.integers(1, 5, n),
+        "sea_surface_temp_c": rng.normal(27, 1.5, n),
+        "salinity_psu": rng.normal(35, 0.4, n),
+        "chlorophyll_mg_m3": np.where(rng.random(n) < 0.3, np.nan, rng.gamma(2.0, 0.3, n)),
+    })
+    frame.loc[frame["species_id"] == 2, "sea_surface_temp_c"] += 2.0
+    frame = frame.round({"sea_surface_temp_c": 2, "salinity_psu": 2, "chlorophyll_mg_m3": 4})  # as stored
+
+    chunks = [env_stats.chunk_stats(frame.iloc[i:i + 150]) for i in range(0, n, 150)]
+    merged = pd.concat(chunks).groupby("species_id", sort=True).sum().reset_index()
+    results = env_stats.correlations(_as_arrays(merged))
+    assert len(results) == 4 * 3
+
+    for row in results:
+        x = frame[row["variable"]].to_numpy()
+        present = ~np.isnan(x)
+        indicator = (frame["species_id"].to_numpy() == row["species_id"])[present]
+        expected = np.corrcoef(indicator, x[present])[0, 1]
+        assert abs(row["correlation"] - expected) < 1e-9
+
+    best = env_stats.strongest(results)
+    assert (best["species_id"], best["variable"]) == (2, "sea_surface_temp_c")
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, *args):
+        self.statements.append(statement)
+
+
+def test_pending_stats_merge_chunks_and_write_once_in_species_order():
+    """
+    Tests that per-chunk statistics are merged in memory and written in a
+    single upsert whose rows are ordered by species_id.
+    """
+    frame = pd.DataFrame({
+        "species_id": [7, 3, 7, 5, 3, 9],
+        "sea_surface_temp_c": [27.0, 28.5, np.nan, 26.25, 29.0, 30.0],
+        "salinity_psu": [35.1, 34.9, 35.0, 35.2, np.nan, 34.0],
+        "chlorophyll_mg_m3": [0.5, np.nan, 0.25, 0.125, 1.0, 2.0],
+    })
+    pending = env_stats.PendingStats()
+    pending.add(frame.iloc[:3])
+    pending.add(frame.iloc[3:])
+    expected = env_stats.chunk_stats(frame)
+    pd.testing.assert_frame_equal(pending.stats.reset_index(drop=True), expected, check_dtype=False)
+
+    db = RecordingSession()
+    assert pending.flush(db) == 4
+    assert len(db.statements) == 1
+    params = db.statements[0].compile().params
+    assert [params[f"species_id_m{i}"] for i in range(4)] == [3, 5, 7, 9]
+    assert pending.flush(db) == 0 and len(db.statements) == 1
+
+
+def test_p_value_is_students_t_like_the_sweep():
+    """
+    Tests that p_value matches scipy's Pearson test for a small sample
+    (where the normal approximation would over-call it) and treats |r| = 1
+    (no t statistic) as p = 0.
+    """
+    x = np.array([0, 0, 1, 0, 1, 1, 0], dtype=float)
+    y = np.array([24.1, 25.0, 27.9, 24.4, 26.2, 28.3, 26.0])
+    r, expected = stats.pearsonr(x, y)
+    t_stat = r * np.sqrt((len(x) - 2) / (1 - r * r))
+
+    assert abs(env_stats.p_value(t_stat, len(x)) - expected) < 1e-9
+    assert env_stats.p_value(t_stat, len(x)) > math.erfc(abs(t_stat) / math.sqrt(2))
+    assert env_stats.p_value(None, len(x)) == 0.0
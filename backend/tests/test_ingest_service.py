@@ -0,0 +1,50 @@
+# backend/tests/test_ingest_service.py
+
+import io
+import pandas as pd
+from app.core import ingest_service
+
+
+def test_clean_sightings_chunk_counts_skipped_rows():
+    """
+    Tests that the vectorized chunk cleaner keeps valid species rows and
+    reports every dropped row under its reason.
+    """
+    df = pd.DataFrame({
+        "scientificName": ["Sardinella longiceps", "Sardinella", "Gadus morhua", "Gadus morhua", None],
+        "taxonRank": ["SPECIES", "GENUS", "species", "species", "species"],
+        "eventDate": ["05/01/2023", "2023-01-05", "not a date", "2023-02-10", "2023-02-10"],
+        "decimalLatitude": ["10.5", "10.5", "11.0", "95.0", "12.0"],
+        "decimalLongitude": ["76.2", "76.2", "77.0", "77.0", "78.0"],
+        "sst": ["28.4", None, None, None, None],
+    })
+
+    cleaned, skipped = ingest_service.clean_sightings_chunk(df)
+
+    assert list(cleaned["scientific_name"]) == ["Sardinella longiceps"]
+    assert cleaned.iloc[0]["sighting_date"] == "2023-01-05"
+    assert cleaned.iloc[0]["location"] == "SRID=4326;POINT(76.2 10.5)"
+    assert cleaned.iloc[0]["sst"] == 28.4
+    assert skipped == {"malformed": 0, "not_species": 1, "missing_species": 1, "bad_date": 1, "bad_coordinates": 1}
+
+
+def test_malformed_lines_are_counted():
+    """
+    Tests that lines with the wrong number of fields are dropped and counted
+    per chunk instead of being skipped silently.
+    """
+    data = b"scientificName,eventDate\nA,2023-01-01\nB,2023-01-02,extra\nC,2023-01-03\nD\tE,x,y\n"
+    malformed = ingest_service.MalformedLines()
+    chunks = pd.read_csv(io.BytesIO(data), chunksize=10, dtype=str, engine="python", on_bad_lines=malformed)
+
+    rows = [name for chunk in chunks for name in chunk["scientificName"]]
+
+    assert rows == ["A", "C"]
+    assert malformed.take() == 2
+    assert malformed.take() == 0
+
+
+def test_sniff_separator_detects_tabs():
+    source = io.BytesIO(b"scientificName\ttaxonRank\teventDate\nA\tspecies\t2023-01-01\n")
+    assert ingest_service.sniff_separator(source, "data.csv") == "\t"
+    assert source.tell() == 0
@@ -0,0 +1,96 @@
+# backend/tests/test_job_queue.py
+
+import io
+import os
+import threading
+import time
+
+import pytest
+from app.core import job_queue
+
+
+def _poll(job_id, until, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = job_queue.get_job(job_id)
+        if until(job):
+            return job
+        time.sleep(0.01)
+    pytest.fail(f"job {job_id} never reached the expected state: {job}")
+
+
+def test_submitted_job_reports_progress_until_done():
+    """
+    Tests that a submitted job is visible while queued/running, that its
+    report() calls show up as progress, and that it ends succeeded with the
+    function's return value.
+    """
+    halfway, finish = threading.Event(), threading.Event()
+
+    def work(report, total):
+        report({"stage": "load", "done": total // 2, "total": total})
+        halfway.set()
+        finish.wait(5)
+        report({"stage": "done", "done": total, "total": total})
+        return {"rows": total}
+
+    job_id = job_queue.submit("test", work, 10)
+    assert job_queue.get_job(job_id)["kind"] == "test"
+
+    assert halfway.wait(5)
+    job = _poll(job_id, lambda j: j["progress"].get("done") == 5)
+    assert job["status"] == "running"
+    finish.set()
+
+    job = _poll(job_id, lambda j: j["status"] == "succeeded")
+    assert job["progress"] == {"stage": "done", "done": 10, "total": 10}
+    assert job["result"] == {"rows": 10} and job["error"] is None
+    assert job["elapsed_seconds"] is not None
+
+
+def test_get_job_returns_a_snapshot():
+    """
+    Tests that get_job hands out copies: changing one, or the job reporting
+    more progress, never changes a state a caller is already holding.
+    """
+    step = threading.Event()
+
+    def work(report):
+        report({"stage": "load", "done": 1})
+        step.wait(5)
+        report({"stage": "load", "done": 2})
+        return {"rows": 2}
+
+    job_id = job_queue.submit("test", work)
+    held = _poll(job_id, lambda j: j["progress"].get("done") == 1)
+    held["progress"]["done"] = 99
+    assert job_queue.get_job(job_id)["progress"]["done"] == 1
+
+    step.set()
+    _poll(job_id, lambda j: j["status"] == "succeeded")
+    assert held["progress"] == {"stage": "load", "done": 99} and held["status"] == "running"
+
+
+def test_failed_job_keeps_the_error():
+    def work(report):
+        raise ValueError("bad header")
+
+    job = _poll(job_queue.submit("test", work), lambda j: j["status"] == "failed")
+    assert job["error"] == "bad header"
+
+
+def test_persist_upload_copies_from_the_start():
+    """
+    Tests that persist_upload copies the whole stream even when it was already read, and discard_upload removes it once.
+    """
+    upload = io.BytesIO(b">read1\nACGT\n")
+    upload.read()
+    path = job_queue.persist_upload(upload, suffix=".fasta")
+    try:
+        assert path.endswith(".fasta")
+        with open(path, "rb") as f:
+            assert f.read() == b">read1\nACGT\n"
+    finally:
+        job_queue.discard_upload(path)
+    assert not os.path.exists(path)
+    job_queue.discard_upload(path)
@@ -0,0 +1,67 @@
+# backend/tests/test_map_service.py
+
+from datetime import date
+
+from app.core import map_service
+from app.core.sightings_service import sighting_filters
+
+
+def test_cluster_grid_is_capped_and_snapped_to_tiles():
+    """
+    Tests that a world view at a high zoom falls back to a grid within
+    MAX_CLUSTER_CELLS, and that small pans inside the same tiles give the
+    same grid and tile range (and so the same cache key).
+    """
+    zoom, tiles = map_service.cluster_grid(10, None)
+    x0, y0, x1, y1 = tiles
+    assert zoom < 10
+    assert (x1 - x0) * (y1 - y0) * map_service.CELLS_PER_TILE ** 2 <= map_service.MAX_CLUSTER_CELLS
+    assert map_service.tiles_bbox(zoom, tiles) == (-180.0, -90.0, 180.0, 90.0)
+
+    view = (83.21, 17.61, 83.39, 17.79)
+    panned = (83.22, 17.62, 83.40, 17.80)
+    assert map_service.cluster_grid(9, view) == map_service.cluster_grid(9, panned)
+    zoom, tiles = map_service.cluster_grid(9, view)
+    assert zoom == 9
+    min_lon, min_lat, max_lon, max_lat = map_service.tiles_bbox(zoom, tiles)
+    assert min_lon <= view[0] and min_lat <= view[1] and max_lon >= view[2] and max_lat >= view[3]
+
+
+class FakeSession:
+    """Records the SQL and parameters of every execute() and returns no rows."""
+
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, statement, params):
+        self.calls.append((str(statement), params))
+        return self
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return []
+
+    def scalar(self):
+        return None
+
+
+def test_map_queries_share_the_sightings_filters():
+    """
+    Tests that points, clusters and vector tiles all filter through
+    sightings_service.sighting_filters, so the three stay in step.
+    """
+    db = FakeSession()
+    bbox = (72.0, 15.0, 72.5, 15.5)
+    map_service.points(db, bbox, species_id=7)
+    map_service.clusters(db, 9, bbox, species_id=7)
+    map_service.render_tile(db, 12, 2867, 1841, species_id=7, date_from=date(2015, 1, 1), date_to=date(2015, 12, 31))
+
+    where, params = sighting_filters(bbox=bbox, species_id=7)
+    for sql, sent in db.calls[:2]:
+        assert where in sql and params.items() <= sent.items()
+    where, params = sighting_filters(species_id=7, date_from=date(2015, 1, 1), date_to=date(2015, 12, 31))
+    sql, sent = db.calls[2]
+    assert where in sql and params.items() <= sent.items()
+    assert map_service.render_tile(db, 12, 2867, 1841) == b""
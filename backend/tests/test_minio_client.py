@@ -0,0 +1,85 @@
+# backend/tests/test_minio_client.py
+
+import io
+import threading
+
+import pytest
+from minio.error import S3Error
+
+from app.core.minio_client import StreamingUpload, TeeReader, put_if_absent
+
+
+class FakeMinio:
+    """put_object reads the whole stream in small reads, like a multipart upload does."""
+
+    def __init__(self, fail_after: int = None):
+        self.objects, self.fail_after = {}, fail_after
+        self.aborted = threading.Event()
+
+    def stat_object(self, bucket, name):
+        if (bucket, name) not in self.objects:
+            raise S3Error(None, "NoSuchKey", "Object does not exist", name, None, None, bucket, name)
+        return name
+
+    def put_object(self, bucket, name, data, length, part_size=None, content_type=None, metadata=None):
+        received = bytearray()
+        try:
+            while True:
+                chunk = data.read(7)
+                if not chunk:
+                    break
+                received += chunk
+                if self.fail_after is not None and len(received) >= self.fail_after:
+                    raise IOError("connection reset")
+        except RuntimeError:
+            self.aborted.set()
+            raise
+        self.objects[(bucket, name)] = bytes(received)
+        return name
+
+
+def test_tee_reader_streams_every_byte_into_the_upload():
+    """
+    Tests that reading through a TeeReader hands back the source bytes and
+    that the completed object holds exactly the same bytes.
+    """
+    payload = bytes(range(256)) * 40
+    client = FakeMinio()
+    with StreamingUpload("edna", "reads.fa", client=client, max_chunks=2) as upload:
+        tee = TeeReader(io.BytesIO(payload), upload)
+        reader = io.BufferedReader(tee, buffer_size=100)
+        assert reader.read() == payload
+        assert tee.bytes_read == len(payload)
+    assert client.objects[("edna", "reads.fa")] == payload
+
+
+def test_streaming_upload_aborts_on_error_and_surfaces_upload_failures():
+    """
+    Tests that an exception in the producer aborts the multipart upload
+    instead of completing a partial object, and that an upload failure
+    is raised to the writer.
+    """
+    client = FakeMinio()
+    with pytest.raises(ValueError):
+        with StreamingUpload("edna", "partial.fa", client=client) as upload:
+            upload.write(b"ACGT" * 10)
+            raise ValueError("parse error")
+    assert client.aborted.wait(5)
+    assert ("edna", "partial.fa") not in client.objects
+
+    client = FakeMinio(fail_after=10)
+    with pytest.raises(RuntimeError, match="connection reset"):
+        with StreamingUpload("edna", "broken.fa", client=client) as upload:
+            for _ in range(100):
+                upload.write(b"ACGT" * 10)
+    assert ("edna", "broken.fa") not in client.objects
+
+
+def test_put_if_absent_writes_each_object_once():
+    """
+    Tests that a second store of the same object name is skipped, whatever its content.
+    """
+    client = FakeMinio()
+    assert put_if_absent(client, "otoliths", "sha256/abc", b"first", metadata={"species": "A"})
+    assert not put_if_absent(client, "otoliths", "sha256/abc", b"second", metadata={"species": "B"})
+    assert client.objects == {("otoliths", "sha256/abc"): b"first"}
@@ -0,0 +1,30 @@
+# backend/tests/test_prediction_cache.py
+
+from app.ml.prediction_cache import TieredCache, image_digest, prediction_key
+
+
+def test_tiered_cache_lru_eviction_and_stats():
+    """
+    The in-process tier keeps the most recently used entries and counts hits/misses.
+    """
+    cache = TieredCache(maxsize=2)
+    cache.set("a", {"predicted_species": "Gadus morhua"})
+    cache.set("b", {"predicted_species": "Sardinella longiceps"})
+    assert cache.get("a") == {"predicted_species": "Gadus morhua"}  # "b" is now least recent
+    cache.set("c", {"predicted_species": "Unknown Species"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["hits_memory"] == 3 and stats["misses"] == 1
+
+
+def test_prediction_key_depends_on_content_and_model_version():
+    """
+    Identical bytes share a key; a new model version or different image does not.
+    """
+    digest = image_digest(b"otolith")
+    assert digest == image_digest(b"otolith")
+    assert prediction_key(digest, "v1") != prediction_key(digest, "v2")
+    assert prediction_key(digest, "v1") != prediction_key(image_digest(b"other"), "v1")
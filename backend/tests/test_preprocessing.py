@@ -0,0 +1,41 @@
+# backend/tests/test_preprocessing.py
+
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from app.ml import preprocessing
+
+
+def _read(name):
+    with open(os.path.join(os.path.dirname(__file__), name), "rb") as f:
+        return f.read()
+
+
+def test_decode_batch_fills_preallocated_buffer():
+    """
+    Images are decoded in place into the caller's float32 buffer, scaled to
+    [0, 1]; an undecodable image is reported and its row zeroed.
+    """
+    buffer = np.full((3, *preprocessing.IMG_SIZE, 3), 7.0, dtype=np.float32)
+    out, errors = preprocessing.decode_batch([_read("test_image.jpg"), b"not an image", _read("test_image.png")], buffer)
+
+    assert out is buffer
+    assert list(errors) == [1]
+    assert (out[1] == 0).all()
+    for row in (out[0], out[2]):
+        assert 0.0 <= row.min() and row.max() <= 1.0 and row.max() > 0
+    assert np.array_equal(out[0], preprocessing.preprocess(_read("test_image.jpg")))
+
+
+def test_preprocess_matches_a_full_decode_and_resize():
+    """
+    Tests that serving inputs equal a plain full decode + BICUBIC resize, with no JPEG draft downscaling.
+    """
+    data = _read("test_image.jpg")
+    reference = Image.open(io.BytesIO(data)).convert("RGB").resize(preprocessing.IMG_SIZE, Image.BICUBIC)
+    expected = np.asarray(reference, dtype=np.float32) / 255.0
+
+    assert np.allclose(preprocessing.preprocess(data), expected, atol=1e-6)
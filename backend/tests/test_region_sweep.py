@@ -0,0 +1,95 @@
+# backend/tests/test_region_sweep.py
+
+import numpy as np
+from app.core import region_sweep
+
+
+def test_geohash_matches_reference_values():
+    """
+    Tests that the vectorized encoder gives the standard geohash for known points.
+    """
+    lat = np.array([57.64911, -25.382708, 42.6])
+    lon = np.array([10.40744, -49.265506, -5.6])
+    codes = region_sweep.geohash_codes(lat, lon, precision=5)
+    assert region_sweep.geohash_strings(codes, precision=5).tolist() == ["u4pru", "6gkzw", "ezs42"]
+    codes = region_sweep.geohash_codes(lat, lon, precision=3)
+    assert region_sweep.geohash_strings(codes, precision=3).tolist() == ["u4p", "6gk", "ezs"]
+
+
+def test_sweep_finds_partition_local_correlation():
+    """
+    Tests that a species tied to warm water in one cell and one month only is
+    ranked first there, with the same r as a direct computation, and that the
+    pooled and in-process sweeps agree.
+    """
+    rng = np.random.default_rng(3)
+    n = 4000
+    lat = np.where(rng.random(n) < 0.5, 10.0, 40.0) + rng.random(n)
+    lon = np.full(n, 80.5)
+    months = rng.integers(0, 12, n)
+    columns = {
+        "species_id": rng.integers(1, 6, n),
+        "sighting_date": (np.datetime64("2023-01", "M") + months).astype("datetime64[D]"),
+        "sea_surface_temp_c": rng.normal(27, 1.0, n),
+        "salinity_psu": rng.normal(35, 0.3, n),
+        "chlorophyll_mg_m3": np.full(n, np.nan),
+        "lat": lat,
+        "lon": lon,
+    }
+    planted = (lat < 20) & (months == 6) & (columns["species_id"] == 3)
+    columns["sea_surface_temp_c"][planted] += 3.0
+
+    findings = region_sweep.sweep(columns, precision=2, workers=1)
+    cell = region_sweep.geohash_strings(region_sweep.geohash_codes(np.array([10.0]), np.array([80.5]), 2), 2)[0]
+    top = [f for f in findings if f["scope"] == "region_season" and f["cell"] == cell and f["month"] == 7 and f["rank"] == 1]
+    assert len(top) == 1
+    assert (top[0]["species_id"], top[0]["variable"]) == (3, "sea_surface_temp_c")
+
+    part = (lat < 20) & (months == 6)
+    expected = np.corrcoef(columns["species_id"][part] == 3, columns["sea_surface_temp_c"][part])[0, 1]
+    assert abs(top[0]["correlation"] - expected) < 1e-9
+    assert all(f["p_value"] <= f["q_value"] <= region_sweep.MAX_P_VALUE for f in findings)
+    assert not any(f["variable"] == "chlorophyll_mg_m3" for f in findings)
+
+    region_sweep.CHUNK_ROWS, saved = 500, region_sweep.CHUNK_ROWS
+    try:
+        pooled = region_sweep.sweep(columns, precision=2, workers=2)
+    finally:
+        region_sweep.CHUNK_ROWS = saved
+    key = lambda f: (f["scope"], f["cell"] or "", f["month"] or 0, f["rank"])
+    assert [(key(f), f["species_id"]) for f in sorted(pooled, key=key)] == \
+           [(key(f), f["species_id"]) for f in sorted(findings, key=key)]
+
+
+def test_small_partitions_use_t_distribution_and_fdr_control():
+    """
+    Tests that p-values follow Student's t for small partitions (a normal
+    approximation would be smaller), and that Benjamini-Hochberg over the
+    sweep drops chance findings from many pure-noise partitions.
+    """
+    from scipy import stats
+
+    rng = np.random.default_rng(11)
+    n = 30
+    species = np.where(np.arange(n) < 10, 1, 2)
+    sst = rng.normal(27, 1.0, n) + (species == 1) * 0.9
+    values = {"sea_surface_temp_c": sst, "salinity_psu": np.full(n, np.nan), "chlorophyll_mg_m3": np.full(n, np.nan)}
+    findings, tests = region_sweep._sweep_chunk(np.zeros(n, dtype=np.int64), species, values, 5, 1.0)
+    assert tests == 2
+    finding = next(f for f in findings if f["species_id"] == 1)
+    r_value, p_value = stats.pearsonr(species == 1, sst)
+    assert abs(finding["correlation"] - r_value) < 1e-9
+    assert abs(finding["p_value"] - p_value) < 1e-9
+
+    n = 60_000
+    months = np.arange(n) % 12
+    columns = {
+        "species_id": rng.integers(1, 40, n),
+        "sighting_date": (np.datetime64("2023-01", "M") + months).astype("datetime64[D]"),
+        "sea_surface_temp_c": rng.normal(27, 1.0, n),
+        "salinity_psu": rng.normal(35, 0.3, n),
+        "chlorophyll_mg_m3": rng.random(n),
+        "lat": rng.uniform(-60, 60, n),
+        "lon": rng.uniform(-180, 180, n),
+    }
+    assert region_sweep.sweep(columns, precision=2, workers=1) == []
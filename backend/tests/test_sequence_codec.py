@@ -0,0 +1,38 @@
+# backend/tests/test_sequence_codec.py
+
+from app.core import sequence_codec
+
+
+def test_pack_round_trip_keeps_ambiguous_runs():
+    """
+    Tests that 2-bit packing is lossless for N/IUPAC runs and takes a
+    quarter of a byte per base.
+    """
+    sequence = "ACGTNNNACGTRYKMacgt" + "ACGT" * 50
+    packed, length, exceptions = sequence_codec.pack_sequence(sequence)
+
+    assert length == len(sequence)
+    assert len(packed) == -(-length // 4)
+    assert exceptions == [[4, "NNN"], [11, "RYKM"]]
+    assert sequence_codec.unpack_sequence(packed, length, exceptions) == sequence.upper()
+
+    codes = sequence_codec.unpack_codes(packed, length, exceptions)
+    assert (codes == sequence_codec.encode_codes(sequence)).all()
+
+
+def test_sequence_hash_ignores_case_and_whitespace():
+    assert sequence_codec.sequence_hash("acgt\nacgt") == sequence_codec.sequence_hash("ACGTACGT")
+
+
+def test_packed_rna_reads_encode_like_plain_text():
+    """
+    Tests that U is packed as T without an exception, so packed rows give the
+    same base codes as encode_codes() on the plain text.
+    """
+    sequence = "ACGUUNAC"
+    packed, length, exceptions = sequence_codec.pack_sequence(sequence)
+
+    assert exceptions == [[5, "N"]]
+    assert sequence_codec.unpack_sequence(packed, length, exceptions) == "ACGTTNAC"
+    codes = sequence_codec.unpack_codes(packed, length, exceptions)
+    assert (codes == sequence_codec.encode_codes(sequence)).all()
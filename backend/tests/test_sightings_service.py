@@ -0,0 +1,79 @@
+# backend/tests/test_sightings_service.py
+
+import io
+import csv
+import json
+from datetime import date
+
+import pytest
+import pyarrow.parquet as pq
+from app.core import sightings_service
+
+
+ROWS = [
+    (i, date(2024, 1, 1 + i), 17.5 + i / 10, 83.2, 1, "Sardinella longiceps", 27.25, None, 0.3125)
+    for i in range(7)
+]
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    """
+    Tests that keyset cursors decode to the (sighting_date, id) they were made from.
+    """
+    token = sightings_service.encode_cursor(date(2023, 11, 5), 123456)
+    assert sightings_service.decode_cursor(token) == (date(2023, 11, 5), 123456)
+    with pytest.raises(ValueError):
+        sightings_service.decode_cursor("not-a-cursor")
+
+
+def test_ndjson_and_csv_exports_are_streamed_per_batch():
+    """
+    Tests that the encoders emit one chunk per batch and lose no rows or nulls.
+    """
+    batches = [ROWS[:3], ROWS[3:]]
+
+    chunks = list(sightings_service.encode_ndjson(batches))
+    assert len(chunks) == 2
+    records = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+    assert [r["id"] for r in records] == list(range(7))
+    assert records[0]["sighting_date"] == "2024-01-01" and records[0]["salinity_psu"] is None
+
+    text = b"".join(sightings_service.encode_csv(batches)).decode()
+    rows = list(csv.reader(io.StringIO(text)))
+    assert tuple(rows[0]) == sightings_service.EXPORT_COLUMNS
+    assert len(rows) == 1 + 7
+    assert rows[1][7] == ""
+
+
+def test_parquet_export_round_trips():
+    """
+    Tests that a streamed Parquet export reads back with pq.read_table, one row group per batch.
+    """
+    batches = [ROWS[:3], [], ROWS[3:]]
+    chunks = list(sightings_service.encode_parquet(batches))
+    assert len(chunks) == len(batches) + 1
+
+    parquet = pq.ParquetFile(io.BytesIO(b"".join(chunks)))
+    assert parquet.metadata.num_row_groups == 3
+    table = pq.read_table(io.BytesIO(b"".join(chunks)))
+    assert tuple(table.column_names) == sightings_service.EXPORT_COLUMNS
+    assert [tuple(row.values()) for row in table.to_pylist()] == ROWS
+
+
+def test_compact_payload_is_columnar_with_species_once():
+    """
+    Tests the compact /api/sightings shape: one array per field and species keyed once by id.
+    """
+    rows = [(r[0], r[1], r[2], r[3], r[4], r[6], r[7], r[8]) for r in ROWS]
+    payload = {
+        "columns": sightings_service.columnar(rows),
+        "species": {1: {"scientific_name": "Sardinella longiceps", "description": "x" * 500}},
+    }
+    decoded = json.loads(sightings_service.dumps(payload))
+
+    assert list(decoded["columns"]) == list(sightings_service.COMPACT_COLUMNS)
+    assert decoded["columns"]["id"] == list(range(7))
+    assert decoded["columns"]["sighting_date"][0] == "2024-01-01"
+    assert decoded["columns"]["salinity_psu"] == [None] * 7
+    assert list(decoded["species"]) == ["1"]
+    assert sightings_service.columnar([]) == {name: [] for name in sightings_service.COMPACT_COLUMNS}
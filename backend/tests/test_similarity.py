@@ -0,0 +1,102 @@
+# backend/tests/test_similarity.py
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.ml import similarity
+
+
+def _unit(rng, n, d=32):
+    v = rng.standard_normal((n, d)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def test_ivf_search_matches_exact_scan(tmp_path, monkeypatch):
+    """
+    Tests that probing the IVF lists finds the same nearest neighbour as a
+    full scan, that the index round-trips through save/load, and that a
+    random query far from every reference is flagged as novel.
+    """
+    monkeypatch.setattr(similarity, "IVF_MIN_VECTORS", 200)
+    rng = np.random.default_rng(0)
+    vectors = _unit(rng, 1000)
+    index = similarity.OtolithIndex(path=str(tmp_path / "index.npz"))
+    index.add(vectors, [f"obj/{i}.png" for i in range(1000)], ["Gadus morhua"] * 1000, version="v1", recluster=True)
+    assert index._centroids is not None
+
+    query = vectors[123] + 0.01 * _unit(rng, 1)[0]
+    query /= np.linalg.norm(query)
+    hits = index.search(query, k=3, nprobe=4)
+    assert hits[0]["key"] == "obj/123.png"
+    assert similarity.assess(hits)["nearest_species"] == "Gadus morhua"
+
+    index.save()
+    reloaded = similarity.OtolithIndex(path=str(tmp_path / "index.npz"))
+    assert reloaded.load() and len(reloaded) == 1000 and reloaded.version == "v1"
+    assert reloaded.search(query, k=1)[0]["key"] == "obj/123.png"
+
+    assert similarity.assess(index.search(_unit(rng, 1)[0], k=3))["novel"]
+
+
+def test_incremental_add_assigns_only_new_vectors(monkeypatch):
+    """
+    Tests that adds after clustering put new and replaced vectors in their
+    nearest list without recomputing the others, leaving the same lists a
+    full reassignment would build.
+    """
+    monkeypatch.setattr(similarity, "IVF_MIN_VECTORS", 200)
+    rng = np.random.default_rng(1)
+    index = similarity.OtolithIndex(path="unused.npz")
+    index.add(_unit(rng, 400), [f"obj/{i}.png" for i in range(400)], ["Gadus morhua"] * 400, recluster=True)
+    centroids = index._centroids
+
+    calls, build_lists = [], similarity.OtolithIndex._build_lists
+    monkeypatch.setattr(similarity.OtolithIndex, "_build_lists",
+                        lambda self, recluster=True: calls.append(recluster))
+    for i in range(400, 450):
+        index.add(_unit(rng, 1), [f"obj/{i}.png"], ["Sardinella longiceps"])
+    index.add(_unit(rng, 2), ["obj/3.png", "obj/3.png"], ["Sardinella longiceps"] * 2)
+    assert calls == [] and index._centroids is centroids and len(index) == 450
+
+    incremental = sorted(sorted(l) for l in index._lists)
+    build_lists(index, recluster=False)
+    assert incremental == sorted(sorted(l) for l in index._lists)
+    assert sum(len(l) for l in index._lists) == 450
+    assert index.search(index.vectors[3], k=1)[0]["key"] == "obj/3.png"
+
+
+class FakeEmbeddingsSession:
+    """Returns the otolith_embeddings rows past the requested generation, like the sync() query."""
+
+    def __init__(self, rows):
+        self.rows, self.asked = rows, []
+
+    def execute(self, statement, params):
+        self.asked.append(params["after"])
+        self._result = [r for r in self.rows if r.generation > params["after"] and r.version == params["version"]]
+        return self
+
+    def all(self):
+        return sorted(self._result, key=lambda r: r.generation)
+
+
+def test_sync_follows_the_commit_ordered_generation():
+    """
+    Tests that sync() asks for rows past the newest generation it has seen and
+    replaces a re-recorded object instead of adding it twice.
+    """
+    rng = np.random.default_rng(2)
+    vectors = _unit(rng, 3, d=8)
+    row = lambda gen, name, species, v: SimpleNamespace(generation=gen, object_name=name, species=species,
+                                                        version="v1", vector=v.tobytes())
+    db = FakeEmbeddingsSession([row(3, "sha256/a", "X", vectors[0]), row(5, "sha256/b", "Y", vectors[1])])
+    index = similarity.OtolithIndex(path="unused.npz")
+
+    assert index.sync(db, "v1") == 2
+    db.rows.append(row(6, "sha256/a", "Z", vectors[2]))
+    assert index.sync(db, "v1") == 1
+    assert index.sync(db, "v1") == 0
+
+    assert db.asked == [0, 5, 6]
+    assert len(index) == 2 and index.labels[index.keys.index("sha256/a")] == "Z"
@@ -0,0 +1,49 @@
+# backend/tests/test_versioned_cache.py
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.versioned_cache import VersionedCache
+
+
+def test_single_flight_and_stale_while_revalidate():
+    """
+    Tests that concurrent misses compute once, that a new version is computed
+    by one caller while the others get the previous version's value, and that
+    a failed refresh falls back to the previous value.
+    """
+    cache = VersionedCache("test", ttl=60, client=None)
+    calls = []
+    started = threading.Event()
+
+    def compute(value, delay=0.2):
+        def run():
+            calls.append(value)
+            started.set()
+            time.sleep(delay)
+            return value
+        return run
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: cache.get_or_compute(1, "k", compute("v1")), range(8)))
+    assert results == ["v1"] * 8
+    assert calls == ["v1"]
+
+    # Version 2: one caller recomputes, a concurrent caller is served v1 meanwhile.
+    started.clear()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        refresh = pool.submit(cache.get_or_compute, 2, "k", compute("v2"))
+        started.wait(1)
+        assert cache.get_or_compute(2, "k", compute("unused")) == "v1"
+        assert refresh.result() == "v2"
+    assert cache.get_or_compute(2, "k", compute("unused")) == "v2"
+    assert calls == ["v1", "v2"]
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    assert cache.get_or_compute(3, "k", fail) == "v2"
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["refreshes"] == 1 and stats["errors"] == 1
+    assert stats["stale"] == 1 and stats["hits"] >= 1
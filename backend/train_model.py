@@ -1,13 +1,17 @@
 # backend/train_model.py
 
 import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout
 from tensorflow.keras.models import Model
 from tensorflow.keras.callbacks import ReduceLROnPlateau, EarlyStopping
 import os
 import json
+import glob
+import hashlib
+import argparse
+import numpy as np
+from app.ml import preprocessing
 
 # --- Configuration ---
 # --- THIS IS THE ONLY CHANGE YOU NEED TO MAKE ---
@@ -17,49 +21,82 @@ DATASET_PATH = 'ml_model_data/otolith_dataset'
 
 MODEL_SAVE_PATH = 'app/ml/otolith_classifier_model.h5'
 CLASS_MAP_SAVE_PATH = 'app/ml/class_indices.json'
+TFLITE_SAVE_PATH = 'app/ml/otolith_classifier_model.tflite'
+ONNX_SAVE_PATH = 'app/ml/otolith_classifier_model.onnx'
+EXPORT_FORMATS = ['tflite-float16', 'tflite-int8', 'onnx', 'onnx-int8']
+CALIBRATION_IMAGES = 100  # Representative images used to calibrate int8 ranges
 
-IMG_SIZE = (224, 224)
+IMG_SIZE = preprocessing.IMG_SIZE
 BATCH_SIZE = 8
 INITIAL_EPOCHS = 20
 FINETUNE_EPOCHS = 15
 INITIAL_LEARNING_RATE = 0.001
 FINETUNE_LEARNING_RATE = 1e-5 # A very low learning rate for deep fine-tuning
+VALIDATION_SPLIT = 0.25
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+FEATURE_CACHE_DIR = 'ml_model_data/feature_cache'  # --mode cached bottleneck feature store
+CACHED_HEAD_EPOCHS = 200  # Cheap on cached features; early stopping ends it well before this
+CACHE_PATH = ''  # '' caches decoded images in memory; set a file path for datasets larger than RAM
 
-def train():
-    print("--- Starting Professional Deep Fine-Tuning ---")
 
-    # This ImageDataGenerator is already configured for robust augmentation.
-    train_datagen = ImageDataGenerator(
-        rescale=1./255,
-        validation_split=0.25,
-        rotation_range=45,
-        width_shift_range=0.3,
-        height_shift_range=0.3,
-        shear_range=0.3,
-        zoom_range=0.4,
-        horizontal_flip=True,
-        fill_mode='nearest'
-    )
-
-    # The generators will automatically find the 5 species in the new path.
-    train_generator = train_datagen.flow_from_directory(
-        DATASET_PATH,
-        target_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
-        class_mode='categorical',
-        subset='training'
-    )
-    validation_generator = train_datagen.flow_from_directory(
-        DATASET_PATH,
-        target_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
-        class_mode='categorical',
-        subset='validation'
-    )
-    
-    print(f"Found {len(train_generator.class_indices)} classes: {list(train_generator.class_indices.keys())}")
+# --- Input Pipeline ---
+def list_dataset(dataset_path=DATASET_PATH, validation_split=VALIDATION_SPLIT):
+    """
+    Lists (path, label) pairs per class folder, sorted, and splits each class
+    the way flow_from_directory did: the first `validation_split` of every
+    class is validation. Returns (class_indices, train_items, val_items).
+    """
+    classes = sorted(d for d in os.listdir(dataset_path) if os.path.isdir(os.path.join(dataset_path, d)))
+    class_indices = {name: i for i, name in enumerate(classes)}
+    train_items, val_items = [], []
+    for name in classes:
+        files = sorted(f for f in os.listdir(os.path.join(dataset_path, name)) if f.lower().endswith(IMAGE_EXTENSIONS))
+        split = int(validation_split * len(files))
+        items = [(os.path.join(dataset_path, name, f), class_indices[name]) for f in files]
+        val_items += items[:split]
+        train_items += items[split:]
+    return class_indices, train_items, val_items
 
-    # --- Transfer Learning Setup ---
+
+def _augmentation():
+    # Same ranges as the old ImageDataGenerator (Keras has no shear layer, so shear is dropped).
+    return tf.keras.Sequential([
+        tf.keras.layers.RandomRotation(45 / 360, fill_mode='nearest'),
+        tf.keras.layers.RandomTranslation(0.3, 0.3, fill_mode='nearest'),
+        tf.keras.layers.RandomZoom(0.4, fill_mode='nearest'),
+        tf.keras.layers.RandomFlip('horizontal'),
+    ])
+
+
+def make_dataset(items, num_classes, training, cache_path=CACHE_PATH):
+    """
+    tf.data pipeline: images are decoded once by the shared serving
+    preprocessing (app.ml.preprocessing), cached, then shuffled, augmented
+    on batches and prefetched, so later epochs never touch the JPEG decoder.
+    """
+    paths = [p for p, _ in items]
+    labels = tf.one_hot([label for _, label in items], num_classes)
+
+    def load(path):
+        image = tf.numpy_function(preprocessing.preprocess_file, [path], tf.float32)
+        image.set_shape((*IMG_SIZE, 3))
+        return image
+
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    ds = ds.map(lambda p, y: (load(p), y), num_parallel_calls=tf.data.AUTOTUNE)
+    ds = ds.cache(cache_path + ('.train' if training else '.val') if cache_path else '')
+    if training:
+        augment = _augmentation()
+        ds = ds.shuffle(len(items), reshuffle_each_iteration=True)
+        ds = ds.batch(BATCH_SIZE)
+        ds = ds.map(lambda x, y: (augment(x, training=True), y), num_parallel_calls=tf.data.AUTOTUNE)
+    else:
+        ds = ds.batch(BATCH_SIZE)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+def build_model(num_classes):
+    """MobileNetV2 base (frozen) + GAP + Dense(512) + Dropout + softmax. Returns (base_model, model)."""
     base_model = MobileNetV2(weights='imagenet', include_top=False, input_shape=(224, 224, 3))
     base_model.trainable = False
 
@@ -67,23 +104,12 @@ def train():
     x = GlobalAveragePooling2D()(x)
     x = Dense(512, activation='relu')(x)
     x = Dropout(0.5)(x)
-    num_classes = len(train_generator.class_indices)
     predictions = Dense(num_classes, activation='softmax')(x)
     model = Model(inputs=base_model.input, outputs=predictions)
-    
-    # === STAGE 1: INITIAL TRAINING ===
-    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=INITIAL_LEARNING_RATE), 
-                  loss='categorical_crossentropy', 
-                  metrics=['accuracy'])
+    return base_model, model
 
-    early_stopping = EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)
-
-    print("--- STAGE 1: Starting Initial Training ---")
-    model.fit(train_generator, 
-              epochs=INITIAL_EPOCHS, 
-              validation_data=validation_generator, 
-              callbacks=[early_stopping])
 
+def fine_tune(model, base_model, train_ds, validation_ds, early_stopping, initial_epoch=INITIAL_EPOCHS):
     # === STAGE 2: DEEP FINE-TUNING ===
     base_model.trainable = True
     fine_tune_at = 55 
@@ -95,21 +121,252 @@ def train():
                   metrics=['accuracy'])
 
     print("--- STAGE 2: Starting Deep Fine-Tuning ---")
-    total_epochs = INITIAL_EPOCHS + FINETUNE_EPOCHS
-    model.fit(train_generator, 
-              epochs=total_epochs, 
-              initial_epoch=INITIAL_EPOCHS,
-              validation_data=validation_generator,
+    model.fit(train_ds, 
+              epochs=initial_epoch + FINETUNE_EPOCHS, 
+              initial_epoch=initial_epoch,
+              validation_data=validation_ds,
               callbacks=[early_stopping])
 
-    # --- SAVE FINAL MODEL ---
+
+def save_model(model, class_indices):
     print("--- Training Complete. Saving Final Model ---")
     os.makedirs(os.path.dirname(MODEL_SAVE_PATH), exist_ok=True)
     model.save(MODEL_SAVE_PATH)
-    class_indices = train_generator.class_indices
     with open(CLASS_MAP_SAVE_PATH, 'w') as f:
         json.dump(class_indices, f)
     print("--- Final Model and Class Map Saved ---")
 
+
+def train():
+    print("--- Starting Professional Deep Fine-Tuning ---")
+
+    class_indices, train_items, val_items = list_dataset()
+    num_classes = len(class_indices)
+    train_ds = make_dataset(train_items, num_classes, training=True)
+    validation_ds = make_dataset(val_items, num_classes, training=False)
+
+    print(f"Found {num_classes} classes: {list(class_indices.keys())} "
+          f"({len(train_items)} training / {len(val_items)} validation images)")
+
+    # --- Transfer Learning Setup ---
+    base_model, model = build_model(num_classes)
+    
+    # === STAGE 1: INITIAL TRAINING ===
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=INITIAL_LEARNING_RATE), 
+                  loss='categorical_crossentropy', 
+                  metrics=['accuracy'])
+
+    early_stopping = EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)
+
+    print("--- STAGE 1: Starting Initial Training ---")
+    model.fit(train_ds, 
+              epochs=INITIAL_EPOCHS, 
+              validation_data=validation_ds, 
+              callbacks=[early_stopping])
+
+    fine_tune(model, base_model, train_ds, validation_ds, early_stopping)
+
+    # --- SAVE FINAL MODEL ---
+    save_model(model, class_indices)
+
+
+# --- Cached Feature Training ---
+class FeatureStore:
+    """
+    Bottleneck features (frozen MobileNetV2 + global average pooling) for
+    every image seen so far, in a memory-mapped .npy matrix plus a JSON map
+    of file SHA-256 -> row. Only images whose hash is not yet stored get a
+    forward pass, so adding a species folder costs one pass over its images.
+    Capacity doubles when full; the store is reset if the base model changes.
+    """
+
+    def __init__(self, directory=FEATURE_CACHE_DIR, base_name='mobilenet_v2_imagenet_gap', dim=1280):
+        self.directory = directory
+        self.features_path = os.path.join(directory, 'features.npy')
+        self.index_path = os.path.join(directory, 'index.json')
+        self.meta = {'base': base_name, 'img_size': list(IMG_SIZE), 'dim': dim}
+        os.makedirs(directory, exist_ok=True)
+
+        self.rows = {}
+        if os.path.exists(self.index_path) and os.path.exists(self.features_path):
+            with open(self.index_path) as f:
+                saved = json.load(f)
+            if saved.get('meta') == self.meta:
+                self.rows = saved['rows']
+            else:
+                print("--- Feature cache was built with a different base model; starting over ---")
+        if self.rows:
+            self.features = np.load(self.features_path, mmap_mode='r+')
+        else:
+            self.features = np.lib.format.open_memmap(self.features_path, mode='w+', dtype=np.float32, shape=(256, dim))
+
+    def _grow(self, needed):
+        capacity = len(self.features)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        tmp = self.features_path + '.tmp'
+        grown = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=(capacity, self.features.shape[1]))
+        grown[:len(self.rows)] = self.features[:len(self.rows)]
+        grown.flush()
+        del self.features, grown
+        os.replace(tmp, self.features_path)
+        self.features = np.load(self.features_path, mmap_mode='r+')
+
+    def add(self, digests, features):
+        start = len(self.rows)
+        self._grow(start + len(digests))
+        self.features[start:start + len(digests)] = features
+        for i, digest in enumerate(digests):
+            self.rows[digest] = start + i
+
+    def save(self):
+        self.features.flush()
+        tmp = self.index_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'meta': self.meta, 'rows': self.rows}, f)
+        os.replace(tmp, self.index_path)
+
+    def lookup(self, digests):
+        return np.asarray(self.features[[self.rows[d] for d in digests]])
+
+
+def _file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def featurize(store, base_model, items):
+    """Returns (features, labels) for items, running the frozen base only on unseen files."""
+    digests = [_file_digest(path) for path, _ in items]
+    missing = sorted({d: p for d, (p, _) in zip(digests, items) if d not in store.rows}.items())
+    print(f"--- {len(items) - len(missing)} images cached, featurizing {len(missing)} new or changed ---")
+    if missing:
+        extractor = Model(base_model.input, GlobalAveragePooling2D()(base_model.output))
+        ds = (tf.data.Dataset.from_tensor_slices([p for _, p in missing])
+              .map(lambda p: tf.ensure_shape(tf.numpy_function(preprocessing.preprocess_file, [p], tf.float32), (*IMG_SIZE, 3)),
+                   num_parallel_calls=tf.data.AUTOTUNE)
+              .batch(32)
+              .prefetch(tf.data.AUTOTUNE))
+        store.add([d for d, _ in missing], extractor.predict(ds, verbose=1))
+        store.save()
+    return store.lookup(digests), np.array([label for _, label in items])
+
+
+def train_cached(finetune=False):
+    """
+    Stage 1 on cached bottleneck features: the head trains in seconds because
+    the frozen base is never re-run on already-seen images. The head weights
+    are then copied into the full model (same layer layout as train()), and
+    the expensive fine-tuning stage only runs with finetune=True.
+    Cached features are not augmented, so the head sees each image once per epoch.
+    """
+    print("--- Starting Cached Feature Training ---")
+    class_indices, train_items, val_items = list_dataset()
+    num_classes = len(class_indices)
+    print(f"Found {num_classes} classes: {list(class_indices.keys())} "
+          f"({len(train_items)} training / {len(val_items)} validation images)")
+
+    base_model, model = build_model(num_classes)
+    store = FeatureStore()
+    x_train, y_train = featurize(store, base_model, train_items)
+    x_val, y_val = featurize(store, base_model, val_items)
+
+    head = tf.keras.Sequential([
+        tf.keras.Input(shape=(x_train.shape[1],)),
+        Dense(512, activation='relu'),
+        Dropout(0.5),
+        Dense(num_classes, activation='softmax'),
+    ])
+    head.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=INITIAL_LEARNING_RATE),
+                 loss='categorical_crossentropy',
+                 metrics=['accuracy'])
+    early_stopping = EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)
+
+    print("--- STAGE 1: Training Head on Cached Features ---")
+    head.fit(x_train, tf.one_hot(y_train, num_classes),
+             batch_size=BATCH_SIZE,
+             epochs=CACHED_HEAD_EPOCHS,
+             validation_data=(x_val, tf.one_hot(y_val, num_classes)) if len(x_val) else None,
+             callbacks=[early_stopping] if len(x_val) else [])
+
+    # Copy the trained head into the full model's Dense layers.
+    full_dense = [layer for layer in model.layers if isinstance(layer, Dense)]
+    head_dense = [layer for layer in head.layers if isinstance(layer, Dense)]
+    for target, source in zip(full_dense, head_dense):
+        target.set_weights(source.get_weights())
+
+    if finetune:
+        train_ds = make_dataset(train_items, num_classes, training=True)
+        validation_ds = make_dataset(val_items, num_classes, training=False)
+        fine_tune(model, base_model, train_ds, validation_ds, early_stopping, initial_epoch=0)
+
+    save_model(model, class_indices)
+
+
+# --- Export for the quantized serving backends (app/ml/backends.py) ---
+def _representative_dataset():
+    """Yields preprocessed dataset images so the int8 converter can calibrate activation ranges."""
+    paths = sorted(glob.glob(os.path.join(DATASET_PATH, '*', '*')))[:CALIBRATION_IMAGES]
+    for path in paths:
+        yield [np.expand_dims(preprocessing.preprocess_file(path), axis=0)]
+
+
+def export(fmt, model_path=MODEL_SAVE_PATH):
+    """Convert the trained .h5 model to a TFLite or ONNX artifact for OTOLITH_BACKEND=tflite/onnx."""
+    model = tf.keras.models.load_model(model_path)
+
+    if fmt.startswith('tflite'):
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if fmt == 'tflite-float16':
+            converter.target_spec.supported_types = [tf.float16]
+        else:
+            # Full-integer quantization; int8 input/output are (de)quantized by TFLiteBackend.
+            converter.representative_dataset = _representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+        with open(TFLITE_SAVE_PATH, 'wb') as f:
+            f.write(converter.convert())
+        print(f"--- Saved {fmt} model to {TFLITE_SAVE_PATH} ---")
+        return TFLITE_SAVE_PATH
+
+    try:
+        import tf2onnx
+    except ImportError:
+        raise SystemExit("ONNX export needs tf2onnx (pip install tf2onnx).")
+    spec = (tf.TensorSpec((None, *IMG_SIZE, 3), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, output_path=ONNX_SAVE_PATH)
+    if fmt == 'onnx-int8':
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        float_path = ONNX_SAVE_PATH + '.float32'
+        os.replace(ONNX_SAVE_PATH, float_path)
+        quantize_dynamic(float_path, ONNX_SAVE_PATH, weight_type=QuantType.QInt8)
+        os.remove(float_path)
+    print(f"--- Saved {fmt} model to {ONNX_SAVE_PATH} ---")
+    return ONNX_SAVE_PATH
+
+
 if __name__ == "__main__":
-    train()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the otolith classifier and optionally export a quantized copy.")
+    parser.add_argument("--mode", choices=["full", "cached"], default="full",
+                        help="full: train end to end; cached: train the head on cached bottleneck features.")
+    parser.add_argument("--finetune", action="store_true", help="With --mode cached, also run the fine-tuning stage.")
+    parser.add_argument("--export", choices=EXPORT_FORMATS, help="Also write a TFLite/ONNX artifact for serving.")
+    parser.add_argument("--export-only", action="store_true", help="Skip training and export the existing .h5 model.")
+    args = parser.parse_args()
+    if args.export_only and not args.export:
+        parser.error("--export-only requires --export")
+
+    if not args.export_only:
+        if args.mode == "cached":
+            train_cached(finetune=args.finetune)
+        else:
+            train()
+    if args.export:
+        export(args.export)
\ No newline at end of file